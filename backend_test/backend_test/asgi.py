@@ -13,4 +13,10 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend_test.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Needs Django set up first
+from shopping.push import ShoppingListEvents  # noqa: E402
+
+# Shopping list event streams, everything else goes to Django
+application = ShoppingListEvents(django_application)
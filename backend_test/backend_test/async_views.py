@@ -0,0 +1,25 @@
+"""
+Helpers for the apps' async views, which run outside Django REST framework.
+"""
+
+import functools
+
+from django.core.exceptions import PermissionDenied
+from django.http import Http404, JsonResponse
+from rest_framework import exceptions
+
+
+def json_errors(view):
+    """Respond to Http404 and PermissionDenied with JSON, as DRF views do."""
+
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        try:
+            return await view(request, *args, **kwargs)
+        except Http404:
+            error = exceptions.NotFound()
+        except PermissionDenied:
+            error = exceptions.PermissionDenied()
+        return JsonResponse({"detail": error.detail}, status=error.status_code)
+
+    return wrapper
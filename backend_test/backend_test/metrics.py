@@ -0,0 +1,283 @@
+"""
+Per-request metrics: query count, database time, serializer time and total
+time of every view action.
+
+MetricsMiddleware logs a JSON line per request to the "backend_test.metrics"
+logger and adds it to this process's totals, which metrics_view serves in the
+Prometheus text format to staff, or to scrapers sending METRICS_TOKEN as a
+bearer token. Views declare a query budget per action in a
+``query_budgets`` dict (function views in a ``query_budget`` attribute).
+Requests over budget are logged as warnings, and assert_within_query_budget()
+fails a test on them.
+"""
+
+import asyncio
+import hmac
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse, HttpResponseForbidden
+
+logger = logging.getLogger(__name__)
+
+current_metrics = ContextVar("current_metrics", default=None)
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self.in_serializer = False
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - start
+            self.queries += 1
+
+
+def count_query(execute, sql, params, many, context):
+    # Installed on every connection, and counts the queries of the request
+    # being measured, in whichever thread sync_to_async() runs them
+    metrics = current_metrics.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    return metrics(execute, sql, params, many, context)
+
+
+def install_query_counter(connection, **kwargs):
+    if count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_query)
+
+
+connection_created.connect(install_query_counter)
+# Connections set up before this module was imported
+for connection in connections.all():
+    install_query_counter(connection)
+
+
+@contextmanager
+def serializer_timer():
+    """Add the time spent inside the block to the request's serializer time."""
+    metrics = current_metrics.get()
+    if metrics is None or metrics.in_serializer:
+        # Nested serializers are already inside the outer one's time
+        yield
+        return
+    metrics.in_serializer = True
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.serializer_time += time.perf_counter() - start
+        metrics.in_serializer = False
+
+
+class TimedSerializerMixin:
+    """Count a serializer's reads and writes as serializer time."""
+
+    def to_representation(self, instance):
+        with serializer_timer():
+            return super().to_representation(instance)
+
+    def to_internal_value(self, data):
+        with serializer_timer():
+            return super().to_internal_value(data)
+
+
+def describe_view(request):
+    """Return the view action that handled the request and its query budget."""
+    match = request.resolver_match
+    if match is None:
+        return "unresolved", None
+    view = match.func
+    cls = getattr(view, "cls", None)
+    if cls is None:
+        return (
+            "%s.%s" % (view.__module__, view.__name__),
+            getattr(view, "query_budget", None),
+        )
+    # Viewsets map methods to actions, plain API views handle the method
+    method = request.method.lower()
+    action = (getattr(view, "actions", None) or {}).get(method, method)
+    budgets = getattr(cls, "query_budgets", {})
+    return "%s.%s" % (cls.__name__, action), budgets.get(action)
+
+
+class MetricsRegistry:
+    """Request totals of this process, by view action, method and status."""
+
+    METRICS = [
+        ("http_requests_total", "counter", "requests", "Requests handled."),
+        (
+            "http_request_query_budget_exceeded_total",
+            "counter",
+            "over_budget",
+            "Requests that ran more queries than their budget.",
+        ),
+        (
+            "http_request_duration_seconds",
+            "summary",
+            "total_s",
+            "Time to handle requests.",
+        ),
+        (
+            "http_request_db_duration_seconds",
+            "summary",
+            "db_s",
+            "Time spent in the database.",
+        ),
+        (
+            "http_request_serializer_duration_seconds",
+            "summary",
+            "serializer_s",
+            "Time spent in serializers.",
+        ),
+        ("http_request_db_queries", "summary", "queries", "Database queries run."),
+    ]
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._totals = defaultdict(lambda: defaultdict(float))
+
+    def observe(self, record):
+        key = (record["view"], record["method"], str(record["status"]))
+        with self._lock:
+            totals = self._totals[key]
+            totals["requests"] += 1
+            totals["over_budget"] += record["over_budget"]
+            totals["total_s"] += record["total_ms"] / 1000
+            totals["db_s"] += record["db_ms"] / 1000
+            totals["serializer_s"] += record["serializer_ms"] / 1000
+            totals["queries"] += record["queries"]
+
+    def reset(self):
+        with self._lock:
+            self._totals.clear()
+
+    def render(self):
+        with self._lock:
+            totals = [
+                (labels, dict(values))
+                for labels, values in sorted(self._totals.items())
+            ]
+        lines = []
+        for name, kind, field, help_text in self.METRICS:
+            lines.append("# HELP %s %s" % (name, help_text))
+            lines.append("# TYPE %s %s" % (name, kind))
+            for labels, values in totals:
+                labels = 'view="%s",method="%s",status="%s"' % tuple(
+                    map(escape, labels)
+                )
+                if kind == "counter":
+                    lines.append("%s{%s} %s" % (name, labels, values[field]))
+                else:
+                    lines.append("%s_sum{%s} %s" % (name, labels, values[field]))
+                    lines.append("%s_count{%s} %s" % (name, labels, values["requests"]))
+        return "\n".join(lines) + "\n"
+
+
+def escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+registry = MetricsRegistry()
+
+
+class MetricsMiddleware:
+    """
+    Measure every request. Goes first, to count the other middleware's queries
+    too, and runs async under ASGI so async views keep to the event loop.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # Tells Django to call us as a coroutine, see __call__
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = current_metrics.set(metrics)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+        return self.record(request, response, metrics, start)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = current_metrics.set(metrics)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+        return self.record(request, response, metrics, start)
+
+    def record(self, request, response, metrics, start):
+        total_time = time.perf_counter() - start
+        view, query_budget = describe_view(request)
+        over_budget = query_budget is not None and metrics.queries > query_budget
+        record = {
+            "view": view,
+            "method": request.method,
+            "status": response.status_code,
+            "queries": metrics.queries,
+            "query_budget": query_budget,
+            "over_budget": over_budget,
+            "db_ms": round(metrics.db_time * 1000, 3),
+            "serializer_ms": round(metrics.serializer_time * 1000, 3),
+            "total_ms": round(total_time * 1000, 3),
+        }
+        registry.observe(record)
+        if over_budget:
+            logger.warning(json.dumps(record))
+        else:
+            logger.info(json.dumps(record))
+        # Read back by assert_within_query_budget() in tests
+        response.metrics = record
+        return response
+
+
+def has_metrics_token(request):
+    token = getattr(settings, "METRICS_TOKEN", None)
+    if not token:
+        return False
+    return hmac.compare_digest(
+        request.headers.get("Authorization", "").encode(),
+        ("Bearer %s" % token).encode(),
+    )
+
+
+def metrics_view(request):
+    """Serve the totals in the Prometheus text format."""
+    if not (request.user.is_staff or has_metrics_token(request)):
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type="text/plain; version=0.0.4")
+
+
+def assert_within_query_budget(response):
+    """Fail unless the request behind a test client response stayed within budget."""
+    record = response.metrics
+    assert record["query_budget"] is not None, "%(view)s has no query budget" % record
+    assert not record["over_budget"], (
+        "%(view)s ran %(queries)d queries, over its budget of %(query_budget)d" % record
+    )
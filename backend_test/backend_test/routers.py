@@ -0,0 +1,51 @@
+"""
+Routing of reads to an optional read replica.
+
+Reads only go to the "replica" database (see DATABASE_REPLICA_URL in
+settings) inside use_replica(), which views wrap around reads that may lag
+behind the last write. Everything else, and anything inside a transaction,
+uses the primary.
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+REPLICA = "replica"
+
+reading_from_replica = ContextVar("reading_from_replica", default=False)
+
+
+@contextmanager
+def use_replica():
+    """Send the reads in the block to the replica, when there is one."""
+    token = reading_from_replica.set(True)
+    try:
+        yield
+    finally:
+        reading_from_replica.reset(token)
+
+
+class ReplicaRouter:
+    replica = REPLICA
+
+    def db_for_read(self, model, **hints):
+        if (
+            reading_from_replica.get()
+            and self.replica in settings.DATABASES
+            and not connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            return self.replica
+        return None
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both databases hold the same rows
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db != self.replica
@@ -13,11 +13,18 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+
 from django.contrib import admin
 from django.urls import path, include
 
+from .metrics import metrics_view
+
 urlpatterns = [
     path("admin/", admin.site.urls),
+    # Prometheus scrape target, see METRICS_TOKEN
+    path("metrics", metrics_view),
     path("", include("ingredient.urls")),
     path("", include("shopping.urls")),
+    path("", include("changefeed.urls")),
+    path("", include("jobs.urls")),
 ]
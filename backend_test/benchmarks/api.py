@@ -0,0 +1,148 @@
+"""
+Latency of the API hot paths on synthetic data, and of loading the seed data.
+
+    python -m benchmarks.api --ingredients 10000 --lists 1000 \
+        --items-per-list 20 --output results.json
+    python -m benchmarks.compare baseline.json results.json
+"""
+
+import argparse
+import datetime
+import itertools
+import json
+import platform
+import random
+
+from .utils import measure, setup_django, test_database
+
+
+def benchmark_load_data(repeat):
+    from io import StringIO
+
+    from django.contrib.auth import get_user_model
+    from django.core.management import call_command
+
+    from changefeed.models import Change
+    from ingredient.models import Ingredient
+    from shopping.models import ShoppingList
+
+    def clear():
+        ShoppingList.objects.all().delete()
+        Ingredient.objects.all().delete()
+        get_user_model().objects.all().delete()
+        Change.objects.all().delete()
+
+    def load():
+        call_command("load_data", stdout=StringIO())
+
+    result = measure(load, repeat, setup=clear)
+    clear()
+    return result
+
+
+def benchmark_api(names, shopping_lists, repeat, seed):
+    from django.contrib.auth import get_user_model
+    from django.core.cache import cache
+    from django.test import Client
+
+    rng = random.Random(seed)
+    username = shopping_lists[0][0]
+    titles = [title for owner, title in shopping_lists if owner == username]
+    client = Client()
+    client.force_login(get_user_model().objects.get(username=username))
+
+    def check(response):
+        assert response.status_code < 400, response.content
+
+    new_names = ("benchmark ingredient %07d" % i for i in itertools.count())
+
+    def create_ingredient():
+        check(
+            client.post(
+                "/ingredient/",
+                {
+                    "name": next(new_names),
+                    "category": "fresh",
+                    "unit": "g",
+                    "cost_per_unit": 1,
+                    "available": True,
+                },
+            )
+        )
+
+    def update_price():
+        check(
+            client.patch(
+                "/ingredient/%s/new_cost_per_unit/?price=%s"
+                % (rng.choice(names), round(rng.uniform(0.01, 20), 2))
+            )
+        )
+
+    # Each ingredient is only flagged once
+    names_to_flag = iter(rng.sample(names, len(names)))
+
+    def flag_unavailable():
+        check(client.patch("/ingredient/%s/flag_unavailable/" % next(names_to_flag)))
+
+    def retrieve_shopping_list():
+        check(client.get("/shopping/%s/" % rng.choice(titles)))
+
+    return {
+        "ingredient_create": measure(create_ingredient, repeat),
+        "ingredient_price_update": measure(update_price, repeat),
+        "ingredient_flag_unavailable": measure(
+            flag_unavailable, min(repeat, len(names))
+        ),
+        "shopping_list_retrieve": measure(
+            retrieve_shopping_list, repeat, setup=cache.clear
+        ),
+        "shopping_list_retrieve_cached": measure(retrieve_shopping_list, repeat),
+    }
+
+
+def run(ingredients, lists, items_per_list, repeat, seed=0):
+    import django
+
+    from .data import generate
+
+    with test_database():
+        results = {"load_data": benchmark_load_data(max(1, repeat // 100))}
+        names, shopping_lists = generate(ingredients, lists, items_per_list, seed=seed)
+        results.update(benchmark_api(names, shopping_lists, repeat, seed))
+    return {
+        "meta": {
+            "date": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "ingredients": ingredients,
+            "lists": lists,
+            "items_per_list": items_per_list,
+            "repeat": repeat,
+            "seed": seed,
+        },
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--ingredients", type=int, default=10_000)
+    parser.add_argument("--lists", type=int, default=1000)
+    parser.add_argument("--items-per-list", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="File to save the results to.")
+    args = parser.parse_args()
+    setup_django()
+    results = run(
+        args.ingredients, args.lists, args.items_per_list, args.repeat, args.seed
+    )
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as output_file:
+            output_file.write(output + "\n")
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Shopping list retrieval throughput, WSGI views versus the async ASGI path.
+
+    python -m benchmarks.asgi_vs_wsgi --concurrency 1 10 50 --requests 500
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from io import StringIO
+from concurrent.futures import ThreadPoolExecutor
+
+from .utils import setup_django, test_database
+
+PATHS = {
+    "wsgi": "/shopping/Benchmark List/",
+    "asgi": "/async/shopping/Benchmark List/",
+}
+
+
+def populate(User, ShoppingList, ShoppingListItem, Ingredient):
+    from django.core.management import call_command
+
+    # The seed catalog, which migrations no longer load
+    call_command("load_data", stdout=StringIO())
+    user = User.objects.create_user(username="benchmark", password="benchmark")
+    shopping_list = ShoppingList.objects.create(user=user, title="Benchmark List")
+    ShoppingListItem.objects.bulk_create(
+        ShoppingListItem(shopping_list=shopping_list, ingredient=ingredient, quantity=1)
+        for ingredient in Ingredient.objects.all()[:50]
+    )
+    return user
+
+
+def summarise(timings, elapsed):
+    timings.sort()
+    return {
+        "requests": len(timings),
+        "requests_per_s": round(len(timings) / elapsed, 1),
+        "p50_ms": round(timings[len(timings) // 2], 4),
+        "p99_ms": round(timings[min(len(timings) - 1, int(len(timings) * 0.99))], 4),
+    }
+
+
+def run_wsgi(user, concurrency, requests):
+    from django.test import Client
+
+    clients = [Client() for _ in range(concurrency)]
+    for client in clients:
+        client.force_login(user)
+
+    def worker(client):
+        timings = []
+        for _ in range(requests // concurrency):
+            start = time.perf_counter()
+            assert client.get(PATHS["wsgi"]).status_code == 200
+            timings.append((time.perf_counter() - start) * 1000)
+        return timings
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        timings = sum(executor.map(worker, clients), [])
+    return summarise(timings, time.perf_counter() - start)
+
+
+def run_asgi(user, concurrency, requests):
+    from django.test import AsyncClient, Client
+
+    # AsyncClient.force_login is not available in Django 3.2, so borrow the
+    # session cookie from a sync login.
+    login = Client()
+    login.force_login(user)
+    clients = [AsyncClient() for _ in range(concurrency)]
+    for client in clients:
+        client.cookies = login.cookies
+
+    async def worker(client):
+        timings = []
+        for _ in range(requests // concurrency):
+            start = time.perf_counter()
+            response = await client.get(PATHS["asgi"])
+            assert response.status_code == 200
+            timings.append((time.perf_counter() - start) * 1000)
+        return timings
+
+    async def main():
+        return await asyncio.gather(*(worker(client) for client in clients))
+
+    start = time.perf_counter()
+    timings = sum(asyncio.run(main()), [])
+    return summarise(timings, time.perf_counter() - start)
+
+
+def run(concurrency_levels, requests):
+    from django.contrib.auth.models import User
+
+    from ingredient.models import Ingredient
+    from shopping.models import ShoppingList, ShoppingListItem
+
+    results = []
+    with test_database():
+        user = populate(User, ShoppingList, ShoppingListItem, Ingredient)
+        for concurrency in sorted(concurrency_levels):
+            results.append(
+                {
+                    "concurrency": concurrency,
+                    "wsgi": run_wsgi(user, concurrency, requests),
+                    "asgi": run_asgi(user, concurrency, requests),
+                }
+            )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--requests", type=int, default=500)
+    args = parser.parse_args()
+    setup_django()
+    print(json.dumps(run(args.concurrency, args.requests), indent=2))
+
+
+if __name__ == "__main__":
+    main()
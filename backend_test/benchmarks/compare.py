@@ -0,0 +1,67 @@
+"""
+Compare two benchmark result files and flag regressions.
+
+    python -m benchmarks.compare baseline.json results.json --threshold 0.1
+
+Exits with status 1 when any benchmark got slower than the threshold.
+"""
+
+import argparse
+import json
+import sys
+
+
+def compare(baseline, candidate, metric="p50_ms", threshold=0.1):
+    """Return a row per benchmark present in both, with its relative change."""
+    rows = []
+    for name in sorted(set(baseline["results"]) & set(candidate["results"])):
+        before = baseline["results"][name][metric]
+        after = candidate["results"][name][metric]
+        change = (after - before) / before if before else 0
+        rows.append(
+            {
+                "benchmark": name,
+                "baseline": before,
+                "candidate": after,
+                "change": round(change, 4),
+                "regression": change > threshold,
+            }
+        )
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument(
+        "--metric", default="p50_ms", choices=["mean_ms", "p50_ms", "p99_ms"]
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="Relative slowdown counted as a regression, 0.1 for 10%%.",
+    )
+    args = parser.parse_args()
+    with open(args.baseline) as baseline, open(args.candidate) as candidate:
+        rows = compare(
+            json.load(baseline), json.load(candidate), args.metric, args.threshold
+        )
+    for row in rows:
+        print(
+            "%-32s %10.3f %10.3f %+8.1f%%%s"
+            % (
+                row["benchmark"],
+                row["baseline"],
+                row["candidate"],
+                row["change"] * 100,
+                "  REGRESSION" if row["regression"] else "",
+            )
+        )
+    if any(row["regression"] for row in rows):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Synthetic ingredients, shopping lists and items for benchmarks.
+"""
+
+import random
+
+
+def generate(ingredients, lists, items_per_list, users=10, seed=0, batch_size=5000):
+    """
+    Add a reproducible data set of the given size to the database, and
+    return the names of the ingredients and the (username, title) of the
+    lists created.
+    """
+    from django.contrib.auth import get_user_model
+    from django.db.models import QuerySet
+
+    from ingredient.models import CATEGORIES, UNITS, Ingredient
+    from shopping.models import ShoppingList, ShoppingListItem
+
+    rng = random.Random(seed)
+    User = get_user_model()
+    User.objects.bulk_create(User(username="benchmark %03d" % i) for i in range(users))
+    user_ids = list(
+        User.objects.filter(username__startswith="benchmark ")
+        .order_by("username")
+        .values_list("pk", "username")
+    )
+
+    Ingredient.objects.bulk_create(
+        (
+            Ingredient(
+                name="synthetic %07d" % i,
+                category=rng.choice(CATEGORIES)[0],
+                unit=rng.choice(UNITS)[0],
+                cost_per_unit=round(rng.uniform(0.01, 20), 2),
+                available=rng.random() > 0.05,
+            )
+            for i in range(ingredients)
+        ),
+        batch_size=batch_size,
+    )
+    ingredient_ids = dict(
+        Ingredient.objects.filter(name__startswith="synthetic ").values_list(
+            "pk", "name"
+        )
+    )
+
+    ShoppingList.objects.bulk_create(
+        (
+            ShoppingList(user_id=user_ids[i % users][0], title="list %07d" % i)
+            for i in range(lists)
+        ),
+        batch_size=batch_size,
+    )
+    shopping_lists = list(
+        ShoppingList.objects.filter(title__startswith="list ").values_list(
+            "pk", "user__username", "title"
+        )
+    )
+
+    # A plain QuerySet skips the per-batch total refresh of the item manager
+    pks = list(ingredient_ids)
+    QuerySet(ShoppingListItem).bulk_create(
+        (
+            ShoppingListItem(
+                shopping_list_id=shopping_list_id,
+                ingredient_id=ingredient_id,
+                quantity=rng.randint(1, 10),
+            )
+            for shopping_list_id, username, title in shopping_lists
+            for ingredient_id in rng.sample(pks, min(items_per_list, len(pks)))
+        ),
+        batch_size=batch_size,
+    )
+    ShoppingList.objects.all().refresh_total_cost()
+    return (
+        sorted(ingredient_ids.values()),
+        [(username, title) for pk, username, title in shopping_lists],
+    )
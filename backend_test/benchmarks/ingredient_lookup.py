@@ -0,0 +1,81 @@
+"""
+Ingredient lookup latency by catalog size.
+
+    python -m benchmarks.ingredient_lookup --sizes 10000 100000 1000000
+"""
+
+import argparse
+import json
+import random
+
+from .utils import measure, setup_django, test_database
+
+
+def populate(Ingredient, size, batch_size=5000):
+    existing = Ingredient.objects.count()
+    Ingredient.objects.bulk_create(
+        (
+            Ingredient(
+                name="ingredient %07d" % i,
+                category="fresh",
+                unit="g",
+                cost_per_unit=0.01,
+                available=True,
+            )
+            for i in range(existing, size)
+        ),
+        batch_size=batch_size,
+    )
+
+
+def run(sizes, repeat):
+    from django.db import connection
+
+    from ingredient.models import Ingredient
+    from ingredient.views import IngredientViewSet
+
+    results = []
+    with test_database():
+        for size in sorted(sizes):
+            populate(Ingredient, size)
+            names = list(
+                Ingredient.objects.filter(name__startswith="ingredient ").values_list(
+                    "name", flat=True
+                )
+            )
+            queryset = IngredientViewSet.queryset
+
+            def lookup():
+                queryset.get(name=random.choice(names))
+
+            def first_page():
+                list(queryset.order_by("name")[:50])
+
+            with connection.cursor() as cursor:
+                sql, params = queryset.filter(name=names[0]).query.sql_with_params()
+                cursor.execute("EXPLAIN QUERY PLAN " + sql, params)
+                plan = [row[-1] for row in cursor.fetchall()]
+            results.append(
+                {
+                    "ingredients": Ingredient.objects.count(),
+                    "lookup_by_name": measure(lookup, repeat),
+                    "first_page_by_name": measure(first_page, max(1, repeat // 10)),
+                    "plan": plan,
+                }
+            )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000]
+    )
+    parser.add_argument("--repeat", type=int, default=1000)
+    args = parser.parse_args()
+    setup_django()
+    print(json.dumps(run(args.sizes, args.repeat), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Ingredient search latency by catalog size, on the in-memory index alone.
+
+    python -m benchmarks.search --sizes 10000 100000 1000000
+"""
+
+import argparse
+import json
+import random
+import time
+
+from .utils import measure, setup_django
+
+SYLLABLES = [
+    "ba", "ca", "che", "da", "fen", "ga", "ho", "ki", "la", "lo", "ma", "mi",
+    "na", "ni", "o", "pa", "pe", "ra", "ri", "sa", "so", "ta", "to", "va", "zu",
+]  # fmt: skip
+
+
+def generate_names(size, rng):
+    names = set()
+    while len(names) < size:
+        words = [
+            "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+            for _ in range(rng.randint(1, 3))
+        ]
+        names.add(" ".join(words))
+    return sorted(names)
+
+
+def typo(name, rng):
+    position = rng.randrange(len(name) - 1)
+    edit = rng.choice(["delete", "substitute", "transpose"])
+    if edit == "delete":
+        return name[:position] + name[position + 1 :]
+    if edit == "substitute":
+        return name[:position] + rng.choice("aeiou") + name[position + 1 :]
+    return name[:position] + name[position + 1] + name[position] + name[position + 2 :]
+
+
+def run(sizes, repeat, seed=0):
+    from ingredient.search import SearchIndex
+
+    rng = random.Random(seed)
+    results = []
+    for size in sorted(sizes):
+        names = generate_names(size, rng)
+        start = time.perf_counter()
+        index = SearchIndex(
+            (name, rng.choice(["fresh", "staple"]), "g", rng.random() > 0.05)
+            for name in names
+        )
+        build_s = time.perf_counter() - start
+
+        def autocomplete():
+            name = rng.choice(names)
+            index.complete(name[: rng.randint(1, 6)], limit=10)
+
+        def autocomplete_filtered():
+            name = rng.choice(names)
+            index.complete(
+                name[: rng.randint(1, 6)], category="fresh", available=True, limit=10
+            )
+
+        def fuzzy():
+            index.fuzzy(typo(rng.choice(names), rng), limit=10)
+
+        results.append(
+            {
+                "ingredients": size,
+                "build_s": round(build_s, 2),
+                "autocomplete": measure(autocomplete, repeat),
+                "autocomplete_filtered": measure(autocomplete_filtered, repeat),
+                "fuzzy": measure(fuzzy, repeat),
+            }
+        )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--repeat", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    setup_django()
+    print(json.dumps(run(args.sizes, args.repeat, args.seed), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Spend report and price simulation latency by number of shopping list items.
+
+    python -m benchmarks.spend_report --sizes 100000 1000000
+"""
+
+import argparse
+import json
+import time
+from decimal import Decimal
+from io import StringIO
+
+from .utils import setup_django, test_database
+
+
+def populate(size, lists=1000, batch_size=5000):
+    from django.contrib.auth import get_user_model
+    from django.core.management import call_command
+    from django.db.models import QuerySet
+
+    from ingredient.models import Ingredient
+    from shopping.models import ShoppingList, ShoppingListItem
+
+    user = get_user_model().objects.get_or_create(username="benchmark")[0]
+    ShoppingList.objects.bulk_create(
+        (ShoppingList(user=user, title="list %05d" % i) for i in range(lists)),
+        ignore_conflicts=True,
+    )
+    shopping_list_ids = list(
+        ShoppingList.objects.filter(user=user).values_list("pk", flat=True)
+    )
+    if not Ingredient.objects.exists():
+        # The seed catalog, which migrations no longer load
+        call_command("load_data", stdout=StringIO())
+    ingredient_ids = list(Ingredient.objects.values_list("pk", flat=True))
+    existing = ShoppingListItem.objects.count()
+    # A plain QuerySet skips the per-batch total refresh of the item manager
+    items = (
+        ShoppingListItem(
+            shopping_list_id=shopping_list_ids[i % len(shopping_list_ids)],
+            ingredient_id=ingredient_ids[i % len(ingredient_ids)],
+            quantity=1 + i % 7,
+        )
+        for i in range(existing, size)
+    )
+    QuerySet(ShoppingListItem).bulk_create(items, batch_size=batch_size)
+    ShoppingList.objects.all().refresh_total_cost()
+
+
+def run(sizes):
+    from ingredient.models import Ingredient
+    from shopping.analytics import simulate_prices, spend_report
+    from shopping.models import ShoppingListItem
+
+    results = []
+    with test_database():
+        for size in sorted(sizes):
+            populate(size)
+            # A price sheet raising every ingredient by 10%
+            prices = {
+                name: cost_per_unit * Decimal("1.1")
+                for name, cost_per_unit in Ingredient.objects.exclude(
+                    cost_per_unit=None
+                ).values_list("name", "cost_per_unit")
+            }
+            start = time.perf_counter()
+            spend_report()
+            report_ms = (time.perf_counter() - start) * 1000
+            start = time.perf_counter()
+            simulate_prices(prices)
+            simulation_ms = (time.perf_counter() - start) * 1000
+            results.append(
+                {
+                    "items": ShoppingListItem.objects.count(),
+                    "spend_report_ms": round(report_ms, 1),
+                    "simulate_prices_ms": round(simulation_ms, 1),
+                }
+            )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000])
+    args = parser.parse_args()
+    setup_django()
+    print(json.dumps(run(args.sizes), indent=2))
+
+
+if __name__ == "__main__":
+    main()
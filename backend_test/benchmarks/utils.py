@@ -0,0 +1,48 @@
+import os
+import statistics
+import time
+from contextlib import contextmanager
+
+
+def setup_django():
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "backend_test.settings")
+    import django
+
+    django.setup()
+
+
+@contextmanager
+def test_database():
+    """Run against a throwaway copy of the database, like the test runner."""
+    from django.db import connection
+    from django.test.utils import setup_test_environment, teardown_test_environment
+
+    setup_test_environment()
+    old_name = connection.settings_dict["NAME"]
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        yield connection
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+
+def measure(func, repeat, setup=None):
+    """
+    Call ``func`` ``repeat`` times and return latency stats in milliseconds.
+    ``setup`` is called untimed before each call.
+    """
+    timings = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return {
+        "runs": repeat,
+        "mean_ms": round(statistics.mean(timings), 4),
+        "p50_ms": round(timings[len(timings) // 2], 4),
+        "p99_ms": round(timings[min(len(timings) - 1, int(len(timings) * 0.99))], 4),
+    }
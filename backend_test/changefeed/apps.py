@@ -0,0 +1,7 @@
+from django.apps import AppConfig
+
+
+class ChangeFeedAppConfig(AppConfig):
+
+    name = "changefeed"
+    verbose_name = "Change Feed"
@@ -0,0 +1,137 @@
+"""
+What changed since a cursor, as it is now.
+
+Writes to ingredients, shopping lists and the items on them log a Change of
+the object's kind and id, in the same transaction. Readers page through the
+log from the last cursor they saw, and get the current state of each object
+changed since, or that it was deleted, once per page however often it
+changed. A mirror that applies the pages in order ends up with the database's
+state, and as the log always holds the latest change to every object (see
+the compact_changes command), a new mirror starts from cursor 0 instead of a
+full dump.
+
+Where writers run concurrently, a change can commit after one with a later
+id. So the log is read in order of the id of the transaction that made each
+change, then id, and only up to the oldest transaction still running. Every
+transaction before it has ended, so no change can commit behind the cursor.
+The cursor is "<transaction id>-<id>" of the last change read. SQLite
+writers take the database lock when they begin, so their changes already
+commit in id order, with transaction id 0.
+"""
+
+from collections import defaultdict
+
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import Q
+
+from ingredient.models import Ingredient
+from ingredient.serializers import IngredientSerializer
+from shopping.models import ShoppingList, ShoppingListItem
+from shopping.serializers import ShoppingListItemSerializer
+
+from .models import (
+    INGREDIENT,
+    SHOPPING_LIST,
+    SHOPPING_LIST_ITEMS,
+    START,
+    Change,
+    running_transactions_xmin,
+)
+from .serializers import ShoppingListStateSerializer
+
+
+def ingredient_states(ids, using):
+    ingredients = list(Ingredient.objects.using(using).filter(pk__in=ids))
+    data = IngredientSerializer(ingredients, many=True).data
+    return {ingredient.pk: state for ingredient, state in zip(ingredients, data)}
+
+
+def shopping_list_states(ids, using):
+    shopping_lists = list(ShoppingList.objects.using(using).filter(pk__in=ids))
+    data = ShoppingListStateSerializer(shopping_lists, many=True).data
+    return {
+        shopping_list.pk: state for shopping_list, state in zip(shopping_lists, data)
+    }
+
+
+def shopping_list_item_states(ids, using):
+    states = {
+        pk: {"items": []}
+        for pk in ShoppingList.objects.using(using)
+        .filter(pk__in=ids)
+        .values_list("pk", flat=True)
+    }
+    items = defaultdict(list)
+    for item in (
+        ShoppingListItem.objects.using(using)
+        .filter(shopping_list__in=list(states))
+        .select_related("ingredient")
+        .order_by("pk")
+    ):
+        items[item.shopping_list_id].append(item)
+    for pk, shopping_list_items in items.items():
+        states[pk]["items"] = ShoppingListItemSerializer(
+            shopping_list_items, many=True
+        ).data
+    return states
+
+
+STATES = {
+    INGREDIENT: ingredient_states,
+    SHOPPING_LIST: shopping_list_states,
+    SHOPPING_LIST_ITEMS: shopping_list_item_states,
+}
+
+
+def parse_cursor(cursor):
+    transaction_id, pk = cursor.split("-")
+    return int(transaction_id), int(pk)
+
+
+def read_changes(since=START, limit=100, using=DEFAULT_DB_ALIAS):
+    """
+    Return the objects changed after the cursor ``since``, from up to
+    ``limit`` changes, with the cursor to read on from and whether there are
+    more changes after it.
+    """
+    transaction_id, pk = parse_cursor(since)
+    log = Change.objects.using(using).filter(
+        Q(transaction_id__gt=transaction_id)
+        | Q(transaction_id=transaction_id, pk__gt=pk)
+    )
+    xmin = running_transactions_xmin(using)
+    if xmin is not None:
+        # Transactions from the oldest one still running may yet commit
+        # changes ordered before the ones after it
+        log = log.filter(transaction_id__lt=xmin)
+    entries = list(
+        log.order_by("transaction_id", "pk").values_list(
+            "transaction_id", "pk", "kind", "object_id"
+        )[: limit + 1]
+    )
+    more = len(entries) > limit
+    entries = entries[:limit]
+    latest = {}
+    for position, (transaction_id, pk, kind, object_id) in enumerate(entries):
+        latest[kind, object_id] = position
+    ids = defaultdict(list)
+    for kind, object_id in latest:
+        ids[kind].append(object_id)
+    states = {kind: STATES[kind](object_ids, using) for kind, object_ids in ids.items()}
+
+    changes = []
+    for (kind, object_id), position in sorted(
+        latest.items(), key=lambda entry: entry[1]
+    ):
+        state = states[kind].get(object_id)
+        if state is None:
+            changes.append({"kind": kind, "id": object_id, "deleted": True})
+        else:
+            changes.append(
+                {"kind": kind, "id": object_id, "deleted": False, "data": state}
+            )
+    return {
+        "cursor": "%d-%d" % entries[-1][:2] if entries else since,
+        "more": more,
+        "changes": changes,
+    }
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+
+from changefeed.models import Change
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete the change feed entries followed by a later change to the same "
+        "object. Readers get the same objects from the feed afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=10000,
+            help="Number of changes to compact per transaction.",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        last_pk = Change.objects.aggregate(last_pk=Max("pk"))["last_pk"] or 0
+        deleted = 0
+        for start in range(0, last_pk, batch_size):
+            with transaction.atomic():
+                deleted += Change.objects.filter(
+                    pk__gt=start, pk__lte=start + batch_size
+                ).compact()
+        self.stdout.write(
+            self.style.SUCCESS("Deleted %d superseded changes." % deleted)
+        )
@@ -0,0 +1,43 @@
+# Generated by Django 3.2.7 on 2026-10-18 14:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = []
+
+    operations = [
+        migrations.CreateModel(
+            name="Change",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("ingredient", "ingredient"),
+                            ("shopping_list", "shopping list"),
+                            ("shopping_list_items", "shopping list items"),
+                        ],
+                        max_length=32,
+                    ),
+                ),
+                ("object_id", models.BigIntegerField()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="change",
+            index=models.Index(fields=["kind", "object_id"], name="change_object_idx"),
+        ),
+    ]
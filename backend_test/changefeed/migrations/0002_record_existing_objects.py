@@ -0,0 +1,30 @@
+from django.db import migrations
+
+
+def record_existing_objects(apps, schema_editor):
+    # Give every object a change, so a new mirror can start from cursor 0
+    Change = apps.get_model("changefeed", "Change")
+    models = [
+        ("ingredient", apps.get_model("ingredient", "Ingredient")),
+        ("shopping_list", apps.get_model("shopping", "ShoppingList")),
+        ("shopping_list_items", apps.get_model("shopping", "ShoppingList")),
+    ]
+    for kind, model in models:
+        ids = model.objects.order_by("pk").values_list("pk", flat=True)
+        Change.objects.bulk_create(
+            (Change(kind=kind, object_id=pk) for pk in ids.iterator()),
+            batch_size=500,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("changefeed", "0001_initial"),
+        ("ingredient", "0007_ingredient_version"),
+        ("shopping", "0007_decimal_costs"),
+    ]
+
+    operations = [
+        migrations.RunPython(record_existing_objects, migrations.RunPython.noop),
+    ]
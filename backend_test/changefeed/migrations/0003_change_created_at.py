@@ -0,0 +1,19 @@
+# Generated by Django 3.2.7 on 2026-10-18 15:15
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("changefeed", "0002_record_existing_objects"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="change",
+            name="created_at",
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 3.2.7 on 2026-10-18 15:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("changefeed", "0003_change_created_at"),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name="change",
+            name="created_at",
+        ),
+        migrations.AddField(
+            model_name="change",
+            name="transaction_id",
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name="change",
+            index=models.Index(fields=["transaction_id", "id"], name="change_feed_idx"),
+        ),
+    ]
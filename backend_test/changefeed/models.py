@@ -0,0 +1,97 @@
+from django.db import connections, models, router, transaction
+from django.db.models import Exists, OuterRef, Q
+from django.db.models.expressions import RawSQL
+
+INGREDIENT = "ingredient"
+SHOPPING_LIST = "shopping_list"
+SHOPPING_LIST_ITEMS = "shopping_list_items"
+KINDS = (
+    (INGREDIENT, "ingredient"),
+    (SHOPPING_LIST, "shopping list"),
+    (SHOPPING_LIST_ITEMS, "shopping list items"),
+)
+
+# The id of the current transaction, and the lowest id of a transaction still
+# running, by database vendor. SQLite runs one writer at a time, so its
+# changes commit in id order and share transaction id 0.
+CURRENT_TRANSACTION_ID = {"postgresql": "txid_current()"}
+RUNNING_TRANSACTIONS_XMIN = {
+    "postgresql": "txid_snapshot_xmin(txid_current_snapshot())"
+}
+
+# The cursor before every change
+START = "0-0"
+
+
+def current_transaction_id(using):
+    sql = CURRENT_TRANSACTION_ID.get(connections[using].vendor)
+    return RawSQL(sql, []) if sql else 0
+
+
+def running_transactions_xmin(using):
+    sql = RUNNING_TRANSACTIONS_XMIN.get(connections[using].vendor)
+    return RawSQL(sql, []) if sql else None
+
+
+class ChangeQuerySet(models.QuerySet):
+    def record(self, changes):
+        """
+        Log ``changes``, (kind, object id) pairs, in the current transaction.
+        Make the writes they stand for in the same one.
+        """
+        changes = list(dict.fromkeys(changes))
+        if not changes:
+            return []
+        using = self._db or router.db_for_write(self.model)
+        # Concurrent transactions may commit their changes out of id order,
+        # readers order them by transaction instead, see changefeed.feed
+        transaction_id = current_transaction_id(using)
+        with transaction.atomic(using=using, savepoint=False):
+            return self.model.objects.using(using).bulk_create(
+                self.model(
+                    kind=kind, object_id=object_id, transaction_id=transaction_id
+                )
+                for kind, object_id in changes
+            )
+
+    record.alters_data = True
+
+    def compact(self):
+        """Delete the changes followed by a later change to the same object."""
+        later = self.model.objects.filter(
+            kind=OuterRef("kind"),
+            object_id=OuterRef("object_id"),
+        ).filter(
+            Q(transaction_id__gt=OuterRef("transaction_id"))
+            | Q(transaction_id=OuterRef("transaction_id"), pk__gt=OuterRef("pk"))
+        )
+        return self.filter(Exists(later)).delete()[0]
+
+    compact.alters_data = True
+
+
+class Change(models.Model):
+    """
+    A write to an object. The change feed reads them in order of transaction
+    id, then id.
+    """
+
+    kind = models.CharField(choices=KINDS, max_length=32)
+
+    object_id = models.BigIntegerField()
+
+    # Of the transaction that made the change
+    transaction_id = models.BigIntegerField(default=0)
+
+    objects = ChangeQuerySet.as_manager()
+
+    def __str__(self):
+        return "%s %s" % (self.kind, self.object_id)
+
+    class Meta:
+        indexes = [
+            # Finds later changes to the same object when compacting
+            models.Index(fields=["kind", "object_id"], name="change_object_idx"),
+            # Reads the feed in order
+            models.Index(fields=["transaction_id", "id"], name="change_feed_idx"),
+        ]
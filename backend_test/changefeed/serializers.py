@@ -0,0 +1,23 @@
+from rest_framework import serializers
+
+from shopping.models import ShoppingList
+
+from .models import START
+
+# Also keeps the lookups of a page within the database's parameter limit
+MAX_PAGE_SIZE = 500
+
+
+class ChangeFeedQuerySerializer(serializers.Serializer):
+    since = serializers.RegexField(
+        r"^\d+-\d+$",
+        default=START,
+        error_messages={"invalid": "Must be the cursor of an earlier response."},
+    )
+    limit = serializers.IntegerField(min_value=1, max_value=MAX_PAGE_SIZE, default=100)
+
+
+class ShoppingListStateSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ShoppingList
+        fields = ["user", "title", "total_cost", "version"]
@@ -0,0 +1,220 @@
+import threading
+from decimal import Decimal
+from io import StringIO
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase
+
+from ingredient.models import Ingredient
+from shopping.models import ShoppingList, ShoppingListItem
+
+from .feed import read_changes
+from .models import Change
+
+
+def last_cursor():
+    change = Change.objects.order_by("transaction_id", "pk").last()
+    return "%d-%d" % (change.transaction_id, change.pk)
+
+
+class ChangeFeedTest(TestCase):
+    def setUp(self):
+        self.onion = Ingredient.objects.create(
+            name="onion", category="fresh", unit="g", cost_per_unit=1, available=True
+        )
+        self.user = get_user_model().objects.create_user(username="cook")
+        self.soup = ShoppingList.objects.create(user=self.user, title="Soup")
+        self.cursor = last_cursor()
+
+    def test_logs_every_object_already_in_the_database(self):
+        logged = set(Change.objects.values_list("kind", "object_id"))
+        for pk in Ingredient.objects.values_list("pk", flat=True):
+            assert ("ingredient", pk) in logged
+        for pk in ShoppingList.objects.values_list("pk", flat=True):
+            assert ("shopping_list", pk) in logged
+
+    def test_reads_objects_changed_since_the_cursor_once(self):
+        ShoppingListItem.objects.create(
+            shopping_list=self.soup, ingredient=self.onion, quantity=2
+        )
+        Ingredient.objects.filter(pk=self.onion.pk).update_returning(
+            cost_per_unit=Decimal("1.5")
+        )
+        Ingredient.objects.filter(pk=self.onion.pk).update(cost_per_unit=2)
+        self.run_on_commit()
+
+        feed = read_changes(since=self.cursor)
+        assert feed["cursor"] == last_cursor()
+        assert not feed["more"]
+        changes = {(change["kind"], change["id"]): change for change in feed["changes"]}
+        assert len(changes) == len(feed["changes"]) == 3
+        assert changes["ingredient", self.onion.pk]["data"]["cost_per_unit"] == 2
+        assert changes["shopping_list", self.soup.pk]["data"] == {
+            "user": self.user.pk,
+            "title": "Soup",
+            "total_cost": 4,
+            # Recalculated once for the item and once for both price changes
+            "version": 3,
+        }
+        assert changes["shopping_list_items", self.soup.pk]["data"] == {
+            "items": [
+                {
+                    "id": self.soup.items.get().pk,
+                    "ingredient": "onion",
+                    "quantity": 2,
+                }
+            ]
+        }
+        assert read_changes(since=feed["cursor"]) == {
+            "cursor": feed["cursor"],
+            "more": False,
+            "changes": [],
+        }
+
+    def test_reads_deleted_objects(self):
+        soup_id, onion_id = self.soup.pk, self.onion.pk
+        self.soup.delete()
+        Ingredient.objects.filter(pk=onion_id).delete()
+        assert read_changes(since=self.cursor)["changes"] == [
+            {"kind": "shopping_list", "id": soup_id, "deleted": True},
+            {"kind": "shopping_list_items", "id": soup_id, "deleted": True},
+            {"kind": "ingredient", "id": onion_id, "deleted": True},
+        ]
+
+    def test_reads_lists_deleted_with_their_owner(self):
+        soup_id = self.soup.pk
+        self.user.delete()
+        assert read_changes(since=self.cursor)["changes"] == [
+            {"kind": "shopping_list", "id": soup_id, "deleted": True},
+            {"kind": "shopping_list_items", "id": soup_id, "deleted": True},
+        ]
+
+    def test_reads_lists_changed_through_querysets(self):
+        ShoppingList.objects.filter(pk=self.soup.pk).update(title="Stew")
+        ShoppingList.objects.bulk_create([ShoppingList(user=self.user, title="Salad")])
+        salad_id = ShoppingList.objects.get(title="Salad").pk
+        feed = read_changes(since=self.cursor)
+        assert [
+            (change["id"], change["data"]["title"]) for change in feed["changes"]
+        ] == [
+            (self.soup.pk, "Stew"),
+            (salad_id, "Salad"),
+        ]
+
+        ShoppingList.objects.filter(user=self.user).delete()
+        changes = read_changes(since=feed["cursor"])["changes"]
+        assert {(change["kind"], change["id"]) for change in changes} == {
+            ("shopping_list", self.soup.pk),
+            ("shopping_list_items", self.soup.pk),
+            ("shopping_list", salad_id),
+            ("shopping_list_items", salad_id),
+        }
+        assert all(change["deleted"] for change in changes)
+
+    def test_pages_through_changes(self):
+        for price in range(5):
+            Ingredient.objects.filter(pk=self.onion.pk).update(cost_per_unit=price)
+        feed = read_changes(since=self.cursor, limit=3)
+        assert feed["more"]
+        assert [change["id"] for change in feed["changes"]] == [self.onion.pk]
+        feed = read_changes(since=feed["cursor"], limit=3)
+        assert not feed["more"]
+        assert feed["changes"][0]["data"]["cost_per_unit"] == 4
+
+    def test_reads_changes_in_transaction_order(self):
+        later = Change.objects.create(
+            kind="ingredient", object_id=self.onion.pk, transaction_id=2
+        )
+        earlier = Change.objects.create(
+            kind="shopping_list", object_id=self.soup.pk, transaction_id=1
+        )
+        feed = read_changes(since=self.cursor, limit=1)
+        assert feed["cursor"] == "1-%d" % earlier.pk
+        assert [change["id"] for change in feed["changes"]] == [self.soup.pk]
+        feed = read_changes(since=feed["cursor"])
+        assert feed["cursor"] == "2-%d" % later.pk
+        assert [change["id"] for change in feed["changes"]] == [self.onion.pk]
+
+    def test_compacts_in_transaction_order(self):
+        later = Change.objects.create(
+            kind="ingredient", object_id=self.onion.pk, transaction_id=2
+        )
+        earlier = Change.objects.create(
+            kind="ingredient", object_id=self.onion.pk, transaction_id=1
+        )
+        call_command("compact_changes", stdout=StringIO())
+        assert Change.objects.filter(pk=later.pk).exists()
+        assert not Change.objects.filter(pk=earlier.pk).exists()
+
+    def test_logs_nothing_for_rolled_back_writes(self):
+        with self.assertRaises(ZeroDivisionError):
+            with transaction.atomic():
+                self.onion.cost_per_unit = 3
+                self.onion.save()
+                1 / 0
+        assert last_cursor() == self.cursor
+
+    def test_compacts_to_the_latest_change_of_each_object(self):
+        for price in range(5):
+            Ingredient.objects.filter(pk=self.onion.pk).update(cost_per_unit=price)
+        expected = read_changes(limit=500)
+        out = StringIO()
+        call_command("compact_changes", "--batch-size", "7", stdout=out)
+        assert "Deleted 5 superseded changes." in out.getvalue()
+        assert (
+            Change.objects.filter(kind="ingredient", object_id=self.onion.pk).count()
+            == 1
+        )
+        assert read_changes(limit=500) == expected
+
+    def run_on_commit(self):
+        # TestCase never commits, run the shopping list recalculations
+        connection = transaction.get_connection()
+        for sids, func in connection.run_on_commit:
+            func()
+        connection.run_on_commit = []
+
+
+@skipUnless(connection.vendor == "postgresql", "SQLite writers commit in id order")
+class ConcurrentChangeFeedTest(TransactionTestCase):
+    def setUp(self):
+        self.onion = Ingredient.objects.create(
+            name="onion", category="fresh", unit="g", cost_per_unit=1, available=True
+        )
+        self.leek = Ingredient.objects.create(
+            name="leek", category="fresh", unit="g", cost_per_unit=1, available=True
+        )
+        self.cursor = last_cursor()
+
+    def test_reads_changes_committed_after_later_ones(self):
+        written = threading.Event()
+        commit = threading.Event()
+
+        def write_and_wait():
+            try:
+                with transaction.atomic():
+                    Ingredient.objects.filter(pk=self.onion.pk).update(cost_per_unit=2)
+                    written.set()
+                    commit.wait(10)
+            finally:
+                connection.close()
+
+        writer = threading.Thread(target=write_and_wait)
+        writer.start()
+        written.wait(10)
+        # Gets a later id and commits first
+        Ingredient.objects.filter(pk=self.leek.pk).update(cost_per_unit=3)
+        feed = read_changes(since=self.cursor)
+        assert feed["cursor"] == self.cursor
+        assert feed["changes"] == []
+
+        commit.set()
+        writer.join()
+        feed = read_changes(since=feed["cursor"])
+        assert [change["id"] for change in feed["changes"]] == [
+            self.onion.pk,
+            self.leek.pk,
+        ]
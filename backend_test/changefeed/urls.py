@@ -0,0 +1,7 @@
+from django.urls import path
+
+from . import views
+
+urlpatterns = [
+    path("changes/", views.ChangeFeedView.as_view()),
+]
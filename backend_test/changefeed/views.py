@@ -0,0 +1,33 @@
+from rest_framework import permissions
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from backend_test.routers import use_replica
+
+from .feed import read_changes
+from .serializers import ChangeFeedQuerySerializer
+
+
+class ChangeFeedView(APIView):
+    """
+    Ingredients, shopping lists and their items changed since ?since=, the
+    "cursor" of an earlier response (default "0-0", everything), as they are
+    now.
+
+    Each page covers up to ?limit= (default 100, max 500) changes and lists
+    every object they touched once, in the order of its last change, either
+    with its "data" or as "deleted". Read on from the page's "cursor" while
+    "more" is true. Changes show up once the transactions that began before
+    theirs have ended, see changefeed.feed. Staff only.
+    """
+
+    permission_classes = [permissions.IsAdminUser]
+    # Session authentication accounts for two queries, the items of shopping
+    # lists take two
+    query_budgets = {"get": 7}
+
+    def get(self, request):
+        query_params = ChangeFeedQuerySerializer(data=request.query_params)
+        query_params.is_valid(raise_exception=True)
+        with use_replica():
+            return Response(read_changes(**query_params.validated_data))
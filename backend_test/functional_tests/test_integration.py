@@ -1,9 +1,31 @@
+import asyncio
+import os
+import tempfile
+import threading
+import time
+import uuid
+from decimal import Decimal
 from http import HTTPStatus
 
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.test import TransactionTestCase
+from django.core.cache import cache
+from django.db import transaction
+from django.db.utils import ConnectionHandler
+from django.http import HttpResponse
+from django.test import AsyncRequestFactory, SimpleTestCase, TransactionTestCase
 
+from backend_test.asgi import application
+from backend_test.metrics import (
+    MetricsMiddleware,
+    assert_within_query_budget,
+    registry,
+)
+from backend_test.routers import ReplicaRouter, use_replica
 from ingredient.models import Ingredient
+from ingredient.views import IngredientViewSet
+from jobs.worker import Worker
 from rest_framework.exceptions import ValidationError
 
 from shopping.models import ShoppingList, ShoppingListItem
@@ -20,16 +42,59 @@ class IngredientIntegrationTest(TransactionTestCase):
         }
         response = self.client.post("/ingredient/", new_ingredient, format="json")
         assert response.status_code == HTTPStatus.CREATED
-        assert response.data == {
+        assert response.json() == {
             "category": "fresh",
             "name": "My New Ingredient",
             "unit": "g",
             "cost_per_unit": 59.99,
+            "density": None,
             "available": True,
+            "version": 1,
         }
         saved_ingredient = Ingredient.objects.get(name="My New Ingredient")
         assert saved_ingredient.name == "My New Ingredient"
 
+    def test_rejects_duplicate_ingredient_name(self):
+        new_ingredient = {
+            "category": "fresh",
+            "name": "My New Ingredient",
+            "unit": "g",
+            "cost_per_unit": 59.99,
+            "available": True,
+        }
+        response = self.client.post("/ingredient/", new_ingredient, format="json")
+        assert response.status_code == HTTPStatus.CREATED
+        response = self.client.post("/ingredient/", new_ingredient, format="json")
+        assert response.status_code == HTTPStatus.BAD_REQUEST
+        assert Ingredient.objects.filter(name="My New Ingredient").count() == 1
+
+    def test_lists_ingredients_a_page_at_a_time(self):
+        for name, cost in (("Apple", 1), ("Banana", 2), ("Cherry", 3), ("Date", 4)):
+            Ingredient.objects.create(
+                category="fresh",
+                name="My %s" % name,
+                unit="g",
+                cost_per_unit=cost,
+                available=True,
+            )
+        Ingredient.objects.filter(name="My Banana").update(available=False)
+        response = self.client.get(
+            "/ingredient/",
+            {"available": "true", "min_price": 1, "max_price": 4, "page_size": 2},
+        )
+        assert response.status_code == HTTPStatus.OK
+        assert [item["name"] for item in response.data["results"]] == [
+            "My Apple",
+            "My Cherry",
+        ]
+        response = self.client.get(response.data["next"])
+        assert [item["name"] for item in response.data["results"]] == ["My Date"]
+        assert response.data["next"] is None
+
+    def test_rejects_invalid_ingredient_filters(self):
+        response = self.client.get("/ingredient/", {"category": "frozen"})
+        assert response.status_code == HTTPStatus.BAD_REQUEST
+
     def test_updates_ingredient_cost(self):
         created_product = Ingredient(
             category="fresh",
@@ -48,7 +113,9 @@ class IngredientIntegrationTest(TransactionTestCase):
             "name": "My New Ingredient",
             "unit": "g",
             "cost_per_unit": 60,
+            "density": None,
             "available": True,
+            "version": 2,
         }
         saved_ingredient = Ingredient.objects.get(name="My New Ingredient")
         assert saved_ingredient.cost_per_unit == 60
@@ -64,18 +131,172 @@ class IngredientIntegrationTest(TransactionTestCase):
         created_product.save()
         response = self.client.patch("/ingredient/My New Ingredient/flag_unavailable/")
         assert response.status_code == HTTPStatus.OK
-        assert response.data == {
+        assert response.json() == {
             "category": "fresh",
             "name": "My New Ingredient",
             "unit": "g",
             "cost_per_unit": 59.99,
+            "density": None,
             "available": False,
+            "version": 2,
         }
         saved_ingredient = Ingredient.objects.get(name="My New Ingredient")
         assert not saved_ingredient.available
 
+    def test_updates_only_the_version_in_if_match(self):
+        Ingredient.objects.create(
+            category="fresh",
+            name="My New Ingredient",
+            unit="g",
+            cost_per_unit=59.99,
+            available=True,
+        )
+        response = self.client.patch(
+            "/ingredient/My New Ingredient/new_cost_per_unit/?price=60",
+            HTTP_IF_MATCH='"1"',
+        )
+        assert response.status_code == HTTPStatus.OK
+        assert response["ETag"] == '"2"'
+
+        # Another worker flags it unavailable in the meantime
+        self.client.patch("/ingredient/My New Ingredient/flag_unavailable/")
+        response = self.client.patch(
+            "/ingredient/My New Ingredient/new_cost_per_unit/?price=61",
+            HTTP_IF_MATCH='"2"',
+        )
+        assert response.status_code == HTTPStatus.PRECONDITION_FAILED
+        saved_ingredient = Ingredient.objects.get(name="My New Ingredient")
+        assert saved_ingredient.cost_per_unit == 60
+        assert not saved_ingredient.available
+        assert saved_ingredient.version == 3
+
+        response = self.client.patch(
+            "/ingredient/Not An Ingredient/flag_unavailable/", HTTP_IF_MATCH='"1"'
+        )
+        assert response.status_code == HTTPStatus.NOT_FOUND
+
+    def test_bulk_updates_ingredient_costs(self):
+        Ingredient.objects.create(
+            category="fresh",
+            name="My New Ingredient",
+            unit="g",
+            cost_per_unit=59.99,
+            available=True,
+        )
+        Ingredient.objects.create(
+            category="fresh",
+            name="My New Ingredient 2",
+            unit="g",
+            cost_per_unit=10,
+            available=True,
+        )
+        response = self.client.post(
+            "/ingredient/bulk_cost_per_unit/",
+            [
+                {"name": "My New Ingredient", "price": 60},
+                {"name": "My New Ingredient 2", "price": 10},
+                {"name": "Not An Ingredient", "price": 1},
+                {"name": "My New Ingredient", "price": "abc"},
+            ],
+            content_type="application/json",
+        )
+        assert response.status_code == HTTPStatus.OK
+        assert response.data["updated"] == 1
+        assert [result["status"] for result in response.data["results"]] == [
+            "updated",
+            "unchanged",
+            "not_found",
+            "invalid",
+        ]
+        assert Ingredient.objects.get(name="My New Ingredient").cost_per_unit == 60
+
+    def test_bulk_updates_ingredient_costs_from_csv(self):
+        Ingredient.objects.create(
+            category="fresh",
+            name="My New Ingredient",
+            unit="g",
+            cost_per_unit=59.99,
+            available=True,
+        )
+        user = get_user_model().objects.create_user(username="testuser")
+        shopping_list = ShoppingList.objects.create(user=user, title="My List")
+        ShoppingListItem.objects.create(
+            shopping_list=shopping_list,
+            ingredient=Ingredient.objects.get(name="My New Ingredient"),
+            quantity=2,
+        )
+        response = self.client.post(
+            "/ingredient/bulk_cost_per_unit/",
+            "name,price\nMy New Ingredient,1.5\n",
+            content_type="text/csv",
+        )
+        assert response.status_code == HTTPStatus.OK
+        assert response.data == {
+            "updated": 1,
+            "results": [
+                {
+                    "row": 1,
+                    "name": "My New Ingredient",
+                    "cost_per_unit": 1.5,
+                    "status": "updated",
+                }
+            ],
+        }
+        shopping_list.refresh_from_db()
+        assert shopping_list.total_cost == 3
+
+    def test_bulk_updates_ingredient_costs_in_background(self):
+        Ingredient.objects.create(
+            category="fresh",
+            name="My New Ingredient",
+            unit="g",
+            cost_per_unit=59.99,
+            available=True,
+        )
+        sheet = "name,price\nMy New Ingredient,1.5\nNot An Ingredient,1\n"
+        path = "/ingredient/bulk_cost_per_unit/?background=true"
+        response = self.client.post(path, sheet, content_type="text/csv")
+        assert response.status_code == HTTPStatus.FORBIDDEN
+        get_user_model().objects.create_user(username="testuser", password="12345")
+        self.client.login(username="testuser", password="12345")
+        response = self.client.post(path, sheet, content_type="text/csv")
+        assert response.status_code == HTTPStatus.ACCEPTED
+        assert response.data["status"] == "queued"
+        location = response["Location"]
+        assert location == "/jobs/%s/" % response.data["id"]
+        assert Ingredient.objects.get(
+            name="My New Ingredient"
+        ).cost_per_unit == Decimal("59.99")
+
+        assert Worker("test").run_next()
+        response = self.client.get(location)
+        assert response.status_code == HTTPStatus.OK
+        assert response.data["status"] == "succeeded"
+        assert (response.data["progress"], response.data["total"]) == (2, 2)
+        assert response.data["result"]["updated"] == 1
+        assert [row["status"] for row in response.data["result"]["results"]] == [
+            "updated",
+            "not_found",
+        ]
+        assert Ingredient.objects.get(name="My New Ingredient").cost_per_unit == 1.5
+
+        get_user_model().objects.create_user(username="otheruser", password="12345")
+        self.client.login(username="otheruser", password="12345")
+        assert self.client.get(location).status_code == HTTPStatus.NOT_FOUND
+        self.client.logout()
+        assert self.client.get(location).status_code == HTTPStatus.FORBIDDEN
+
+    def test_unknown_job(self):
+        get_user_model().objects.create_user(username="testuser", password="12345")
+        self.client.login(username="testuser", password="12345")
+        response = self.client.get("/jobs/%s/" % uuid.uuid4())
+        assert response.status_code == HTTPStatus.NOT_FOUND
+
 
 class ShoppingListIntegrationTest(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+
     def test_finds_latest_shopping_list_total_cost_of_available_items_only(self):
         created_product = Ingredient(
             category="fresh",
@@ -109,7 +330,7 @@ class ShoppingListIntegrationTest(TransactionTestCase):
         self.client.login(username="testuser", password="12345")
         response = self.client.get("/shopping/My Shopping List/")
         assert response.status_code == HTTPStatus.OK
-        assert response.data == {
+        assert response.json() == {
             "user": user.id,
             "title": "My Shopping List",
             "total_cost": 69.99,
@@ -130,7 +351,7 @@ class ShoppingListIntegrationTest(TransactionTestCase):
 
         response = self.client.get("/shopping/My Shopping List/")
         assert response.status_code == HTTPStatus.OK
-        assert response.data == {
+        assert response.json() == {
             "user": user.id,
             "title": "My Shopping List",
             "total_cost": 79.99,
@@ -141,7 +362,7 @@ class ShoppingListIntegrationTest(TransactionTestCase):
 
         response = self.client.get("/shopping/My Shopping List/")
         assert response.status_code == HTTPStatus.OK
-        assert response.data == {
+        assert response.json() == {
             "user": user.id,
             "title": "My Shopping List",
             "total_cost": 69.99,
@@ -181,7 +402,39 @@ class ShoppingListIntegrationTest(TransactionTestCase):
         get_user_model().objects.create_user(username="testuser2", password="123456")
         self.client.login(username="testuser2", password="123456")
         response = self.client.get("/shopping/My Shopping List/")
-        assert response.status_code == HTTPStatus.FORBIDDEN
+        assert response.status_code == HTTPStatus.NOT_FOUND
+
+    def test_finds_own_shopping_list_when_title_is_shared(self):
+        user = get_user_model().objects.create_user(
+            username="testuser", password="12345"
+        )
+        other_user = get_user_model().objects.create_user(
+            username="testuser2", password="123456"
+        )
+        ShoppingList.objects.create(user=other_user, title="My Shopping List")
+        ShoppingList.objects.create(user=user, title="My Shopping List")
+        self.client.login(username="testuser", password="12345")
+        response = self.client.get("/shopping/My Shopping List/")
+        assert response.status_code == HTTPStatus.OK
+        assert response.data["user"] == user.id
+
+    def test_lists_own_shopping_lists(self):
+        user = get_user_model().objects.create_user(
+            username="testuser", password="12345"
+        )
+        other_user = get_user_model().objects.create_user(
+            username="testuser2", password="123456"
+        )
+        ShoppingList.objects.create(user=other_user, title="Not Mine")
+        ShoppingList.objects.create(user=user, title="Weekly")
+        ShoppingList.objects.create(user=user, title="Party")
+        self.client.login(username="testuser", password="12345")
+        response = self.client.get("/shopping/")
+        assert response.status_code == HTTPStatus.OK
+        assert [item["title"] for item in response.data["results"]] == [
+            "Party",
+            "Weekly",
+        ]
 
     def test_ingredient_remains_on_shopping_list_when_made_unavailable(self):
         created_product = Ingredient(
@@ -228,3 +481,733 @@ class ShoppingListIntegrationTest(TransactionTestCase):
             str(error.exception)
             == "[ErrorDetail(string='Ingredient is unavailable', code='invalid')]"
         )
+
+
+class ShoppingListItemIntegrationTest(TransactionTestCase):
+    def setUp(self):
+        for name, cost, available in (
+            ("My New Ingredient", 2, True),
+            ("My New Ingredient 2", 10, True),
+            ("My Unavailable Ingredient", 1, False),
+        ):
+            Ingredient.objects.create(
+                category="fresh",
+                name=name,
+                unit="g",
+                cost_per_unit=cost,
+                available=available,
+            )
+        user = get_user_model().objects.create_user(
+            username="testuser", password="12345"
+        )
+        self.shopping_list = ShoppingList.objects.create(
+            user=user, title="My Shopping List"
+        )
+        self.client.login(username="testuser", password="12345")
+
+    def test_adds_updates_and_removes_items_in_batches(self):
+        response = self.client.post(
+            "/shopping/My Shopping List/items/",
+            [
+                {"ingredient": "My New Ingredient", "quantity": 3},
+                {"ingredient": "My New Ingredient 2", "quantity": 1},
+            ],
+            content_type="application/json",
+        )
+        assert response.status_code == HTTPStatus.CREATED
+        assert [(item["ingredient"], item["quantity"]) for item in response.data] == [
+            ("My New Ingredient", 3),
+            ("My New Ingredient 2", 1),
+        ]
+        self.shopping_list.refresh_from_db()
+        assert self.shopping_list.total_cost == 16
+
+        first, second = [item["id"] for item in response.data]
+        response = self.client.patch(
+            "/shopping/My Shopping List/items/",
+            [{"id": first, "quantity": 1}, {"id": second, "quantity": 2}],
+            content_type="application/json",
+        )
+        assert response.status_code == HTTPStatus.OK
+        self.shopping_list.refresh_from_db()
+        assert self.shopping_list.total_cost == 22
+
+        response = self.client.delete(
+            "/shopping/My Shopping List/items/",
+            {"ids": [second]},
+            content_type="application/json",
+        )
+        assert response.status_code == HTTPStatus.NO_CONTENT
+        response = self.client.get("/shopping/My Shopping List/items/")
+        assert [item["id"] for item in response.data] == [first]
+        self.shopping_list.refresh_from_db()
+        assert self.shopping_list.total_cost == 2
+
+    def test_rejects_whole_batch_with_unavailable_or_unknown_ingredient(self):
+        response = self.client.post(
+            "/shopping/My Shopping List/items/",
+            [
+                {"ingredient": "My New Ingredient", "quantity": 3},
+                {"ingredient": "My Unavailable Ingredient", "quantity": 1},
+                {"ingredient": "Not An Ingredient", "quantity": 1},
+            ],
+            content_type="application/json",
+        )
+        assert response.status_code == HTTPStatus.BAD_REQUEST
+        assert response.data == [
+            {},
+            {"ingredient": ["Ingredient is unavailable"]},
+            {"ingredient": ["Ingredient does not exist"]},
+        ]
+        assert not self.shopping_list.items.exists()
+
+    def test_converts_quantities_to_the_ingredient_unit(self):
+        Ingredient.objects.filter(name="My New Ingredient 2").update(density="0.5")
+        response = self.client.post(
+            "/shopping/My Shopping List/items/",
+            [
+                {"ingredient": "My New Ingredient", "quantity": "1.5", "unit": "kg"},
+                {"ingredient": "My New Ingredient 2", "quantity": 1, "unit": "cup"},
+            ],
+            content_type="application/json",
+        )
+        assert response.status_code == HTTPStatus.CREATED
+        assert [(item["ingredient"], item["quantity"]) for item in response.json()] == [
+            ("My New Ingredient", 1500),
+            ("My New Ingredient 2", 120),
+        ]
+        self.shopping_list.refresh_from_db()
+        assert self.shopping_list.total_cost == 4200
+
+        first = response.json()[0]["id"]
+        response = self.client.patch(
+            "/shopping/My Shopping List/items/",
+            [{"id": first, "quantity": 1, "unit": "oz"}],
+            content_type="application/json",
+        )
+        assert response.status_code == HTTPStatus.OK
+        assert response.json()[0]["quantity"] == 28.35
+
+    def test_rejects_quantities_that_cannot_be_converted(self):
+        response = self.client.post(
+            "/shopping/My Shopping List/items/",
+            [
+                {"ingredient": "My New Ingredient", "quantity": 1, "unit": "kg"},
+                {"ingredient": "My New Ingredient 2", "quantity": 1, "unit": "cup"},
+            ],
+            content_type="application/json",
+        )
+        assert response.status_code == HTTPStatus.BAD_REQUEST
+        assert response.data == [
+            {},
+            {"unit": ["Cannot convert cup to g without a density."]},
+        ]
+        assert not self.shopping_list.items.exists()
+
+    def test_cannot_update_items_on_another_list(self):
+        other_list = ShoppingList.objects.create(
+            user=self.shopping_list.user, title="Other"
+        )
+        item = ShoppingListItem.objects.create(
+            shopping_list=other_list,
+            ingredient=Ingredient.objects.get(name="My New Ingredient"),
+            quantity=1,
+        )
+        response = self.client.patch(
+            "/shopping/My Shopping List/items/",
+            [{"id": item.id, "quantity": 5}],
+            content_type="application/json",
+        )
+        assert response.status_code == HTTPStatus.BAD_REQUEST
+        item.refresh_from_db()
+        assert item.quantity == 1
+
+
+class ShoppingListCacheIntegrationTest(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.ingredient = Ingredient.objects.create(
+            category="fresh",
+            name="My New Ingredient",
+            unit="g",
+            cost_per_unit=2,
+            available=True,
+        )
+        user = get_user_model().objects.create_user(
+            username="testuser", password="12345"
+        )
+        self.shopping_list = ShoppingList.objects.create(
+            user=user, title="My Shopping List"
+        )
+        ShoppingListItem.objects.create(
+            shopping_list=self.shopping_list, ingredient=self.ingredient, quantity=1
+        )
+        self.client.login(username="testuser", password="12345")
+
+    def test_serves_repeat_retrieves_from_cache(self):
+        response = self.client.get("/shopping/My Shopping List/")
+        assert response.status_code == HTTPStatus.OK
+        # Only the session and user lookups remain
+        with self.assertNumQueries(2):
+            cached_response = self.client.get("/shopping/My Shopping List/")
+        assert cached_response.data == response.data
+        assert cached_response["ETag"] == response["ETag"]
+
+    def test_returns_not_modified_for_matching_etag(self):
+        response = self.client.get("/shopping/My Shopping List/")
+        etag = response["ETag"]
+        response = self.client.get(
+            "/shopping/My Shopping List/", HTTP_IF_NONE_MATCH=etag
+        )
+        assert response.status_code == HTTPStatus.NOT_MODIFIED
+
+        self.ingredient.cost_per_unit = 3
+        self.ingredient.save()
+        response = self.client.get(
+            "/shopping/My Shopping List/", HTTP_IF_NONE_MATCH=etag
+        )
+        assert response.status_code == HTTPStatus.OK
+        assert response["ETag"] != etag
+        assert response.data["total_cost"] == 3
+
+    def test_returns_a_new_etag_after_saving_the_list(self):
+        etag = self.client.get("/shopping/My Shopping List/")["ETag"]
+        self.shopping_list.title = "Renamed"
+        self.shopping_list.save()
+        self.shopping_list.title = "My Shopping List"
+        self.shopping_list.save(update_fields=["title"])
+        response = self.client.get(
+            "/shopping/My Shopping List/", HTTP_IF_NONE_MATCH=etag
+        )
+        assert response.status_code == HTTPStatus.OK
+        assert response["ETag"] == '"%s.%s"' % (
+            self.shopping_list.pk,
+            self.shopping_list.version,
+        )
+        assert response["ETag"] != etag
+
+    def test_invalidates_when_items_change(self):
+        self.client.get("/shopping/My Shopping List/")
+        self.client.post(
+            "/shopping/My Shopping List/items/",
+            [{"ingredient": "My New Ingredient", "quantity": 4}],
+            content_type="application/json",
+        )
+        response = self.client.get("/shopping/My Shopping List/")
+        assert response.data["total_cost"] == 10
+
+        self.client.patch("/ingredient/My New Ingredient/flag_unavailable/")
+        response = self.client.get("/shopping/My Shopping List/")
+        assert response.data["total_cost"] == 0
+
+
+class SpendReportIntegrationTest(TransactionTestCase):
+    def test_reports_spend_to_staff_only(self):
+        ingredient = Ingredient.objects.create(
+            category="fresh",
+            name="My New Ingredient",
+            unit="g",
+            cost_per_unit=2.5,
+            available=True,
+        )
+        user = get_user_model().objects.create_user(
+            username="testuser", password="12345"
+        )
+        shopping_list = ShoppingList.objects.create(user=user, title="My Shopping List")
+        ShoppingListItem.objects.create(
+            shopping_list=shopping_list, ingredient=ingredient, quantity=2
+        )
+        self.client.login(username="testuser", password="12345")
+        response = self.client.get("/reports/spend/")
+        assert response.status_code == HTTPStatus.FORBIDDEN
+
+        user.is_staff = True
+        user.save()
+        response = self.client.get("/reports/spend/?top=1")
+        assert response.status_code == HTTPStatus.OK
+        assert {"user": "testuser", "items": 1, "spend": 5} in response.data["by_user"]
+        assert len(response.data["most_expensive_lists"]) == 1
+
+        response = self.client.get("/reports/spend/?top=0")
+        assert response.status_code == HTTPStatus.BAD_REQUEST
+
+    def test_simulates_price_sheet_for_staff_only(self):
+        ingredient = Ingredient.objects.create(
+            category="fresh",
+            name="My New Ingredient",
+            unit="g",
+            cost_per_unit=2.5,
+            available=True,
+        )
+        user = get_user_model().objects.create_user(
+            username="testuser", password="12345"
+        )
+        shopping_list = ShoppingList.objects.create(user=user, title="My Shopping List")
+        ShoppingListItem.objects.create(
+            shopping_list=shopping_list, ingredient=ingredient, quantity=2
+        )
+        self.client.login(username="testuser", password="12345")
+        price_sheet = "name,price\nMy New Ingredient,3\nNot An Ingredient,1\n"
+        response = self.client.post(
+            "/reports/price-simulation/", price_sheet, content_type="text/csv"
+        )
+        assert response.status_code == HTTPStatus.FORBIDDEN
+
+        user.is_staff = True
+        user.save()
+        response = self.client.post(
+            "/reports/price-simulation/", price_sheet, content_type="text/csv"
+        )
+        assert response.status_code == HTTPStatus.OK
+        assert response.data["shopping_lists"] == [
+            {
+                "user": "testuser",
+                "title": "My Shopping List",
+                "total_cost": 5,
+                "simulated_total_cost": 6,
+                "delta": 1,
+            }
+        ]
+        assert [result["status"] for result in response.data["results"]] == [
+            "changed",
+            "not_found",
+        ]
+        shopping_list.refresh_from_db()
+        assert shopping_list.total_cost == 5
+
+
+class ChangeFeedIntegrationTest(TransactionTestCase):
+    def test_syncs_a_mirror_from_the_change_feed(self):
+        ingredient = Ingredient.objects.create(
+            category="fresh",
+            name="My New Ingredient",
+            unit="g",
+            cost_per_unit=2.5,
+            available=True,
+        )
+        user = get_user_model().objects.create_user(
+            username="testuser", password="12345"
+        )
+        shopping_list = ShoppingList.objects.create(user=user, title="My Shopping List")
+        self.client.login(username="testuser", password="12345")
+        response = self.client.get("/changes/")
+        assert response.status_code == HTTPStatus.FORBIDDEN
+
+        user.is_staff = True
+        user.save()
+        mirror = {}
+
+        def sync(cursor):
+            while True:
+                response = self.client.get("/changes/?since=%s&limit=2" % cursor)
+                assert response.status_code == HTTPStatus.OK
+                assert_within_query_budget(response)
+                for change in response.data["changes"]:
+                    key = change["kind"], change["id"]
+                    if change["deleted"]:
+                        mirror.pop(key, None)
+                    else:
+                        mirror[key] = change["data"]
+                cursor = response.data["cursor"]
+                if not response.data["more"]:
+                    return cursor
+
+        cursor = sync("0-0")
+        assert mirror["ingredient", ingredient.pk]["cost_per_unit"] == 2.5
+        assert mirror["shopping_list", shopping_list.pk]["title"] == "My Shopping List"
+
+        self.client.post(
+            "/shopping/My Shopping List/items/",
+            [{"ingredient": "My New Ingredient", "quantity": 2}],
+            content_type="application/json",
+        )
+        self.client.patch("/ingredient/My New Ingredient/new_cost_per_unit/?price=3")
+        cursor = sync(cursor)
+        assert mirror["ingredient", ingredient.pk]["cost_per_unit"] == 3
+        assert mirror["shopping_list", shopping_list.pk]["total_cost"] == 6
+        assert [
+            item["ingredient"]
+            for item in mirror["shopping_list_items", shopping_list.pk]["items"]
+        ] == ["My New Ingredient"]
+
+        ingredient.delete()
+        sync(cursor)
+        assert ("ingredient", ingredient.pk) not in mirror
+        assert mirror["shopping_list", shopping_list.pk]["total_cost"] == 0
+
+        response = self.client.get("/changes/?since=3")
+        assert response.status_code == HTTPStatus.BAD_REQUEST
+
+
+class AsyncIntegrationTest(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        ingredient = Ingredient.objects.create(
+            category="fresh",
+            name="My New Ingredient",
+            unit="g",
+            cost_per_unit=59.99,
+            available=True,
+        )
+        user = get_user_model().objects.create_user(
+            username="testuser", password="12345"
+        )
+        shopping_list = ShoppingList.objects.create(user=user, title="My Shopping List")
+        ShoppingListItem.objects.create(
+            shopping_list=shopping_list, ingredient=ingredient, quantity=1
+        )
+        self.async_client.login(username="testuser", password="12345")
+
+    async def test_updates_ingredient_cost(self):
+        response = await self.async_client.patch(
+            "/async/ingredient/My New Ingredient/new_cost_per_unit/?price=60"
+        )
+        assert response.status_code == HTTPStatus.OK
+        assert response.json() == {
+            "category": "fresh",
+            "name": "My New Ingredient",
+            "unit": "g",
+            "cost_per_unit": 60,
+            "density": None,
+            "available": True,
+            "version": 2,
+        }
+        response = await self.async_client.get("/async/shopping/My Shopping List/")
+        assert response.json()["total_cost"] == 60
+
+    async def test_runs_views_on_the_event_loop_thread(self):
+        threads = []
+
+        async def view(request):
+            threads.append(threading.current_thread())
+            return HttpResponse()
+
+        middleware = MetricsMiddleware(view)
+        assert asyncio.iscoroutinefunction(middleware)
+        response = await middleware(AsyncRequestFactory().get("/"))
+        assert response.status_code == HTTPStatus.OK
+        assert threads == [threading.current_thread()]
+
+    async def test_rejects_invalid_price(self):
+        response = await self.async_client.patch(
+            "/async/ingredient/My New Ingredient/new_cost_per_unit/?price=abc"
+        )
+        assert response.status_code == HTTPStatus.BAD_REQUEST
+
+    async def test_mark_ingredient_unavailable(self):
+        response = await self.async_client.patch(
+            "/async/ingredient/My New Ingredient/flag_unavailable/"
+        )
+        assert response.status_code == HTTPStatus.OK
+        assert response.json()["available"] is False
+        response = await self.async_client.get("/async/shopping/My Shopping List/")
+        assert response.json()["total_cost"] == 0
+
+    async def test_retrieves_shopping_list_with_etag(self):
+        response = await self.async_client.get("/async/shopping/My Shopping List/")
+        assert response.status_code == HTTPStatus.OK
+        assert response.json()["title"] == "My Shopping List"
+        response = await self.async_client.get(
+            "/async/shopping/My Shopping List/",
+            **{"If-None-Match": response["ETag"]},
+        )
+        assert response.status_code == HTTPStatus.NOT_MODIFIED
+
+    async def test_shopping_list_not_found_for_other_titles(self):
+        response = await self.async_client.get("/async/shopping/Not My List/")
+        assert response.status_code == HTTPStatus.NOT_FOUND
+        assert response.json() == {"detail": "Not found."}
+        response = await self.async_client.get(
+            "/async/shopping/Not My List/changes/?timeout=0"
+        )
+        assert response.status_code == HTTPStatus.NOT_FOUND
+        assert response.json() == {"detail": "Not found."}
+
+    async def test_ingredient_not_found(self):
+        response = await self.async_client.patch(
+            "/async/ingredient/Not An Ingredient/flag_unavailable/"
+        )
+        assert response.status_code == HTTPStatus.NOT_FOUND
+        assert response.json() == {"detail": "Not found."}
+
+
+class ShoppingListPushIntegrationTest(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.ingredient = Ingredient.objects.create(
+            category="fresh",
+            name="My New Ingredient",
+            unit="g",
+            cost_per_unit=2,
+            available=True,
+        )
+        user = get_user_model().objects.create_user(
+            username="testuser", password="12345"
+        )
+        self.shopping_list = ShoppingList.objects.create(
+            user=user, title="My Shopping List"
+        )
+        self.async_client.login(username="testuser", password="12345")
+
+    def add_item(self):
+        ShoppingListItem.objects.create(
+            shopping_list=self.shopping_list, ingredient=self.ingredient, quantity=3
+        )
+
+    async def test_long_polls_for_changes(self):
+        response = await self.async_client.get("/async/shopping/My Shopping List/")
+        etag = response["ETag"]
+        response = await self.async_client.get(
+            "/async/shopping/My Shopping List/changes/?timeout=0",
+            **{"If-None-Match": etag},
+        )
+        assert response.status_code == HTTPStatus.NOT_MODIFIED
+        assert response["ETag"] == etag
+
+        poll = asyncio.ensure_future(
+            self.async_client.get(
+                "/async/shopping/My Shopping List/changes/?timeout=10",
+                **{"If-None-Match": etag},
+            )
+        )
+        await sync_to_async(self.add_item)()
+        response = await poll
+        assert response.status_code == HTTPStatus.OK
+        assert response.json()["total_cost"] == 6
+        assert response["ETag"] != etag
+        assert_within_query_budget(response)
+
+        response = await self.async_client.get(
+            "/async/shopping/My Shopping List/changes/?timeout=61"
+        )
+        assert response.status_code == HTTPStatus.BAD_REQUEST
+
+    async def test_streams_changes_as_server_sent_events(self):
+        session = self.async_client.cookies[settings.SESSION_COOKIE_NAME].value
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "GET",
+            "scheme": "http",
+            "path": "/events/shopping/My Shopping List/",
+            "root_path": "",
+            "query_string": b"",
+            "headers": [
+                (
+                    b"cookie",
+                    ("%s=%s" % (settings.SESSION_COOKIE_NAME, session)).encode(),
+                )
+            ],
+            "server": ("testserver", 80),
+        }
+        received = asyncio.Queue()
+        sent = asyncio.Queue()
+        stream = asyncio.ensure_future(application(scope, received.get, sent.put))
+        start = await sent.get()
+        assert start["status"] == HTTPStatus.OK
+        assert (b"content-type", b"text/event-stream") in start["headers"]
+        first = (await sent.get())["body"].decode()
+        assert first.startswith("event: shopping_list\nid: ")
+        assert '"total_cost": 0' in first
+
+        await sync_to_async(self.add_item)()
+        second = (await sent.get())["body"].decode()
+        assert '"total_cost": 6' in second
+
+        await sync_to_async(self.shopping_list.delete)()
+        assert (await sent.get())["body"] == b"event: deleted\ndata: null\n\n"
+        await stream
+
+        scope["headers"] = []
+        stream = asyncio.ensure_future(application(scope, received.get, sent.put))
+        assert (await sent.get())["status"] == HTTPStatus.FORBIDDEN
+        await stream
+
+
+class QueryBudgetIntegrationTest(TransactionTestCase):
+    def setUp(self):
+        self.ingredient = Ingredient.objects.create(
+            category="fresh",
+            name="My New Ingredient",
+            unit="g",
+            cost_per_unit=59.99,
+            available=True,
+        )
+        Ingredient.objects.create(
+            category="fresh",
+            name="My Other Ingredient",
+            unit="g",
+            cost_per_unit=1,
+            available=True,
+        )
+        user = get_user_model().objects.create_user(
+            username="testuser", password="12345"
+        )
+        shopping_list = ShoppingList.objects.create(user=user, title="My Shopping List")
+        self.item = ShoppingListItem.objects.create(
+            shopping_list=shopping_list, ingredient=self.ingredient, quantity=1
+        )
+        self.client.login(username="testuser", password="12345")
+        self.async_client.login(username="testuser", password="12345")
+
+    def test_ingredient_endpoints_stay_within_query_budget(self):
+        for response in [
+            self.client.get("/ingredient/"),
+            self.client.post(
+                "/ingredient/",
+                {
+                    "category": "fresh",
+                    "name": "My Third Ingredient",
+                    "unit": "g",
+                    "cost_per_unit": 1,
+                    "available": True,
+                },
+            ),
+            self.client.patch(
+                "/ingredient/My New Ingredient/new_cost_per_unit/?price=60"
+            ),
+            self.client.patch("/ingredient/My New Ingredient/flag_unavailable/"),
+        ]:
+            assert response.status_code < 400
+            assert_within_query_budget(response)
+
+    def test_shopping_list_endpoints_stay_within_query_budget(self):
+        items_path = "/shopping/My Shopping List/items/"
+        for response in [
+            self.client.get("/shopping/"),
+            self.client.get("/shopping/My Shopping List/"),
+            self.client.get(items_path),
+            self.client.post(
+                items_path,
+                [{"ingredient": "My Other Ingredient", "quantity": 2}],
+                content_type="application/json",
+            ),
+            self.client.patch(
+                items_path,
+                [{"id": self.item.pk, "quantity": 3}],
+                content_type="application/json",
+            ),
+            self.client.delete(
+                items_path, {"ids": [self.item.pk]}, content_type="application/json"
+            ),
+        ]:
+            assert response.status_code < 400
+            assert_within_query_budget(response)
+
+    async def test_async_endpoints_stay_within_query_budget(self):
+        for response in [
+            await self.async_client.patch(
+                "/async/ingredient/My New Ingredient/new_cost_per_unit/?price=60"
+            ),
+            await self.async_client.patch(
+                "/async/ingredient/My New Ingredient/flag_unavailable/"
+            ),
+            await self.async_client.get("/async/shopping/My Shopping List/"),
+        ]:
+            assert response.status_code < 400
+            assert_within_query_budget(response)
+
+    def test_fails_over_query_budget(self):
+        budgets = IngredientViewSet.query_budgets
+        IngredientViewSet.query_budgets = {**budgets, "list": 0}
+        try:
+            with self.assertLogs("backend_test.metrics", "WARNING") as logs:
+                response = self.client.get("/ingredient/")
+        finally:
+            IngredientViewSet.query_budgets = budgets
+        assert '"over_budget": true' in logs.output[0]
+        assert response.metrics["over_budget"]
+        with self.assertRaises(AssertionError):
+            assert_within_query_budget(response)
+
+    def test_serves_prometheus_metrics(self):
+        registry.reset()
+        self.client.get("/shopping/My Shopping List/")
+        self.client.logout()
+        assert self.client.get("/metrics").status_code == HTTPStatus.FORBIDDEN
+        with self.settings(METRICS_TOKEN="secret"):
+            response = self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer wrong")
+            assert response.status_code == HTTPStatus.FORBIDDEN
+            response = self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer secret")
+        assert response.status_code == HTTPStatus.OK
+        labels = 'view="ShoppingViewSet.retrieve",method="GET",status="200"'
+        metrics = response.content.decode()
+        assert "http_requests_total{%s} 1" % labels in metrics
+        assert "http_request_db_queries_count{%s} 1" % labels in metrics
+        assert "http_request_serializer_duration_seconds_sum{%s}" % labels in metrics
+
+    def test_serves_prometheus_metrics_to_staff(self):
+        get_user_model().objects.create_user(
+            username="staff", password="12345", is_staff=True
+        )
+        self.client.login(username="staff", password="12345")
+        assert self.client.get("/metrics").status_code == HTTPStatus.OK
+
+
+class ReplicaRouterTest(TransactionTestCase):
+    class Router(ReplicaRouter):
+        # The test database stands in for the replica
+        replica = "default"
+
+    def test_reads_from_the_replica_only_when_asked(self):
+        router = self.Router()
+        assert router.db_for_read(Ingredient) is None
+        with use_replica():
+            assert router.db_for_read(Ingredient) == "default"
+            with transaction.atomic():
+                assert router.db_for_read(Ingredient) is None
+            # No replica is configured
+            assert ReplicaRouter().db_for_read(Ingredient) is None
+        assert router.db_for_write(Ingredient) == "default"
+        assert not ReplicaRouter().allow_migrate("replica", "ingredient")
+
+
+class SQLiteConcurrencyTest(SimpleTestCase):
+    def test_concurrent_writers_wait_for_each_other(self):
+        with tempfile.TemporaryDirectory() as directory:
+            handler = ConnectionHandler(
+                {
+                    "default": {
+                        "ENGINE": "backend_test.sqlite3",
+                        "NAME": os.path.join(directory, "db.sqlite3"),
+                        "OPTIONS": {"timeout": 10},
+                    }
+                }
+            )
+            with handler["default"].cursor() as cursor:
+                cursor.execute("PRAGMA journal_mode")
+                assert cursor.fetchone()[0] == "wal"
+                cursor.execute("CREATE TABLE counter (value integer)")
+                cursor.execute("INSERT INTO counter VALUES (0)")
+
+            errors = []
+
+            def increment():
+                # Read, then write, like a save() inside transaction.atomic()
+                connection = handler["default"]
+                try:
+                    connection.set_autocommit(
+                        False, force_begin_transaction_with_broken_autocommit=True
+                    )
+                    with connection.cursor() as cursor:
+                        cursor.execute("SELECT value FROM counter")
+                        value = cursor.fetchone()[0]
+                        time.sleep(0.01)
+                        cursor.execute("UPDATE counter SET value = %s", [value + 1])
+                    connection.commit()
+                except Exception as error:
+                    errors.append(error)
+                finally:
+                    connection.close()
+
+            threads = [threading.Thread(target=increment) for _ in range(10)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            with handler["default"].cursor() as cursor:
+                cursor.execute("SELECT value FROM counter")
+                assert cursor.fetchone()[0] == 10
+            handler.close_all()
+        assert errors == []
@@ -0,0 +1,63 @@
+"""
+Async versions of the ingredient write actions, for serving under ASGI.
+
+Django 3.2 has no async ORM, so all the database work of a request runs in
+a single sync_to_async hop rather than one per middleware and view layer.
+"""
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponseNotAllowed, JsonResponse
+from rest_framework.utils.encoders import JSONEncoder
+
+from backend_test.async_views import json_errors
+
+from .preconditions import (
+    PreconditionFailed,
+    etag,
+    if_match_versions,
+    update_ingredient,
+)
+from .serializers import IngredientSerializer, QueryParamSerializer
+
+
+async def update_response(request, name, **changes):
+    try:
+        ingredient = await sync_to_async(update_ingredient)(
+            name, if_match_versions(request), **changes
+        )
+    except PreconditionFailed as exc:
+        return JsonResponse({"detail": exc.detail}, status=exc.status_code)
+    response = JsonResponse(IngredientSerializer(ingredient).data, encoder=JSONEncoder)
+    response["ETag"] = etag(ingredient)
+    return response
+
+
+@json_errors
+async def new_cost_per_unit(request, name):
+    """PATCH ?price=<number> to set the cost per unit of an ingredient, see If-Match."""
+    if request.method != "PATCH":
+        return HttpResponseNotAllowed(["PATCH"])
+    query_params = QueryParamSerializer(data=request.GET)
+    if not query_params.is_valid():
+        return JsonResponse(query_params.errors, status=400)
+    return await update_response(
+        request, name, cost_per_unit=query_params.validated_data["price"]
+    )
+
+
+@json_errors
+async def flag_unavailable(request, name):
+    """PATCH to flag an ingredient as no longer available."""
+    if request.method != "PATCH":
+        return HttpResponseNotAllowed(["PATCH"])
+    return await update_response(request, name, available=False)
+
+
+# Ingredient endpoints are public, like their DRF counterparts. The
+# csrf_exempt decorator is not async-aware in Django 3.2.
+new_cost_per_unit.csrf_exempt = True
+flag_unavailable.csrf_exempt = True
+
+# See backend_test.metrics, session authentication accounts for two
+new_cost_per_unit.query_budget = 9
+flag_unavailable.query_budget = 9
@@ -0,0 +1,192 @@
+"""
+In-process cache of ingredient records.
+
+Each worker keeps a bounded LRU of ingredients keyed by id and by name. A
+catalog version token in the shared Django cache is replaced on every
+ingredient write, and a worker that sees a new token drops all its entries.
+Workers only share invalidations when the cache backend is shared between
+them (see REDIS_URL in settings, "manage.py check --deploy" warns when it is
+not), otherwise entries also expire after INGREDIENT_CATALOG_TIMEOUT seconds.
+The search index has a version of its own, replaced only by writes that
+change what it indexes (see ingredient.search).
+"""
+
+import copy
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import caches
+from django.core.checks import Tags, Warning, register
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+VERSION_KEY = "ingredient:catalog:version"
+SEARCH_VERSION_KEY = "ingredient:search:version"
+
+
+# Cache backends that keep their entries in each process
+LOCAL_CACHE_BACKENDS = {
+    "django.core.cache.backends.dummy.DummyCache",
+    "django.core.cache.backends.locmem.LocMemCache",
+}
+
+
+def get_version_cache_alias():
+    return getattr(settings, "INGREDIENT_CATALOG_CACHE_ALIAS", "default")
+
+
+def get_version_cache():
+    return caches[get_version_cache_alias()]
+
+
+@register(Tags.caches, deploy=True)
+def check_version_cache(app_configs, **kwargs):
+    alias = get_version_cache_alias()
+    if settings.CACHES.get(alias, {}).get("BACKEND") not in LOCAL_CACHE_BACKENDS:
+        return []
+    return [
+        Warning(
+            "The %r cache is local to each process, so worker processes only "
+            "see each other's ingredient changes once their catalog entries "
+            "expire, and never in their search indexes." % alias,
+            hint=(
+                "Set REDIS_URL, or INGREDIENT_CATALOG_CACHE_ALIAS to a cache "
+                "shared by every worker process."
+            ),
+            id="ingredient.W001",
+        )
+    ]
+
+
+def get_version(key=VERSION_KEY):
+    version_cache = get_version_cache()
+    version = version_cache.get(key)
+    if version is None:
+        version_cache.add(key, uuid.uuid4().hex, None)
+        version = version_cache.get(key)
+    return version
+
+
+def set_new_version(key=VERSION_KEY):
+    get_version_cache().set(key, uuid.uuid4().hex, None)
+
+
+class PendingVersionBump:
+    """On-commit callback that invalidates the catalog once more."""
+
+    def __init__(self, key):
+        self.key = key
+        self.done = False
+
+    def __call__(self):
+        self.done = True
+        set_new_version(self.key)
+
+
+def bump_version(using=None, key=VERSION_KEY):
+    """Invalidate every worker's catalog, now and once the transaction commits."""
+    set_new_version(key)
+    connection = transaction.get_connection(using)
+    if connection.in_atomic_block:
+        for sids, func in connection.run_on_commit:
+            if (
+                isinstance(func, PendingVersionBump)
+                and func.key == key
+                and not func.done
+            ):
+                return
+    transaction.on_commit(PendingVersionBump(key), using=using)
+
+
+class IngredientCatalog:
+    def __init__(self, max_size, timeout=None):
+        self.max_size = max_size
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._by_id = OrderedDict()
+        self._ids_by_name = {}
+        self._version = None
+
+    def clear(self):
+        with self._lock:
+            self._by_id.clear()
+            self._ids_by_name.clear()
+
+    def _sync(self):
+        version = get_version()
+        with self._lock:
+            if version != self._version:
+                self._by_id.clear()
+                self._ids_by_name.clear()
+                self._version = version
+        return version
+
+    def _lookup(self, pk=None, name=None):
+        with self._lock:
+            if pk is None:
+                pk = self._ids_by_name.get(name)
+            entry = self._by_id.get(pk)
+            if entry is None:
+                return None
+            ingredient, expires = entry
+            if expires is not None and expires <= time.monotonic():
+                del self._by_id[pk]
+                self._ids_by_name.pop(ingredient.name, None)
+                return None
+            self._by_id.move_to_end(pk)
+            return copy.copy(ingredient)
+
+    def _store(self, version, ingredients, using):
+        # Rows read inside a transaction may yet be rolled back, and rows
+        # read under an older version may already be stale
+        if connections[using].in_atomic_block:
+            return
+        expires = None if self.timeout is None else time.monotonic() + self.timeout
+        with self._lock:
+            if version != self._version:
+                return
+            for ingredient in ingredients:
+                self._by_id[ingredient.pk] = copy.copy(ingredient), expires
+                self._by_id.move_to_end(ingredient.pk)
+                self._ids_by_name[ingredient.name] = ingredient.pk
+            while len(self._by_id) > self.max_size:
+                pk, (evicted, expires) = self._by_id.popitem(last=False)
+                self._ids_by_name.pop(evicted.name, None)
+
+    def get(self, pk=None, name=None, using=DEFAULT_DB_ALIAS):
+        """Return a copy of one ingredient, by id or name."""
+        version = self._sync()
+        ingredient = self._lookup(pk=pk, name=name)
+        if ingredient is None:
+            Ingredient = apps.get_model("ingredient", "Ingredient")
+            lookup = {"pk": pk} if pk is not None else {"name": name}
+            ingredient = Ingredient.objects.using(using).get(**lookup)
+            self._store(version, [ingredient], using)
+        return ingredient
+
+    def get_many(self, names, using=DEFAULT_DB_ALIAS):
+        """Return {name: ingredient} for the names that exist, with one query for misses."""
+        version = self._sync()
+        found = {}
+        missing = []
+        for name in set(names):
+            ingredient = self._lookup(name=name)
+            if ingredient is None:
+                missing.append(name)
+            else:
+                found[name] = ingredient
+        if missing:
+            Ingredient = apps.get_model("ingredient", "Ingredient")
+            ingredients = list(Ingredient.objects.using(using).filter(name__in=missing))
+            self._store(version, ingredients, using)
+            found.update((ingredient.name, ingredient) for ingredient in ingredients)
+        return found
+
+
+catalog = IngredientCatalog(
+    getattr(settings, "INGREDIENT_CATALOG_CACHE_SIZE", 10000),
+    getattr(settings, "INGREDIENT_CATALOG_TIMEOUT", None),
+)
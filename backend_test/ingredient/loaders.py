@@ -0,0 +1,296 @@
+"""
+Streaming import and export of catalog data.
+
+Records are read from and written to NDJSON, CSV or JSON array files one at a
+time and processed in fixed-size chunks, so memory use does not grow with the
+size of the file. Column names match the seed data in ``data/``. Data sets
+split into several files, or shards, can be parsed in a process pool, see
+the load_data command.
+"""
+
+import csv
+import json
+import sys
+from collections import deque
+from contextlib import contextmanager
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.db import DEFAULT_DB_ALIAS, connections
+
+FORMATS = ("ndjson", "csv", "json")
+
+EXTENSIONS = {
+    ".ndjson": "ndjson",
+    ".jsonl": "ndjson",
+    ".csv": "csv",
+    ".json": "json",
+}
+
+INGREDIENT_COLUMNS = [
+    "Ingredient",
+    "Excel Category",
+    "Unit",
+    "Cost Per Unit",
+    "Density",
+    "Available",
+]
+
+
+def guess_format(path, default="ndjson"):
+    for extension, fmt in EXTENSIONS.items():
+        if str(path).endswith(extension):
+            return fmt
+    return default
+
+
+@contextmanager
+def open_stream(path, mode="r"):
+    """Open ``path`` for streaming text, with - meaning stdin or stdout."""
+    if path == "-":
+        yield sys.stdout if "w" in mode else sys.stdin
+    else:
+        with open(path, mode, newline="", encoding="utf-8") as stream:
+            yield stream
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def iter_json_array(stream, read_size=64 * 1024):
+    """Yield the elements of a JSON array without loading the whole document."""
+    decoder = json.JSONDecoder()
+    buffer = ""
+    position = 0
+    eof = False
+    started = False
+
+    while True:
+        # Skip whitespace and separators, reading more input when needed
+        while True:
+            while position < len(buffer) and buffer[position] in " \t\r\n,":
+                position += 1
+            if position < len(buffer) or eof:
+                break
+            data = stream.read(read_size)
+            eof = not data
+            buffer = buffer[position:] + data
+            position = 0
+        if position >= len(buffer):
+            if started:
+                raise ValueError("Unexpected end of JSON array")
+            return
+        if not started:
+            if buffer[position] != "[":
+                raise ValueError("Expected a JSON array")
+            started = True
+            position += 1
+            continue
+        if buffer[position] == "]":
+            return
+        try:
+            value, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            data = stream.read(read_size)
+            eof = not data
+            buffer = buffer[position:] + data
+            position = 0
+            continue
+        yield value
+        position = end
+
+
+def read_records(stream, fmt):
+    """Yield one dict per record in ``stream``."""
+    if fmt == "ndjson":
+        for line in stream:
+            if line.strip():
+                yield json.loads(line)
+    elif fmt == "csv":
+        yield from csv.DictReader(stream)
+    elif fmt == "json":
+        yield from iter_json_array(stream)
+    else:
+        raise ValueError("Unknown format %r" % fmt)
+
+
+def read_shard(shard):
+    """Return the records of a ``(path, format)`` shard as a list."""
+    path, fmt = shard
+    with open_stream(path) as stream:
+        return list(read_records(stream, fmt))
+
+
+def read_shards(shards, pool=None, processes=1):
+    """
+    Yield the records of each ``(path, format)`` shard in order. With a
+    multiprocessing ``pool`` of ``processes``, shards are parsed in parallel,
+    at most one ahead per process so that memory use stays bounded.
+    """
+    if pool is None:
+        for shard in shards:
+            yield from read_shard(shard)
+        return
+    pending = deque()
+    for shard in shards:
+        pending.append(pool.apply_async(read_shard, (shard,)))
+        if len(pending) > processes:
+            yield from pending.popleft().get()
+    while pending:
+        yield from pending.popleft().get()
+
+
+@contextmanager
+def deferred_indexes(models, using=DEFAULT_DB_ALIAS):
+    """
+    Drop the Meta.indexes of the ``models`` whose tables are empty, and
+    create them again on exit, which is faster than maintaining them row by
+    row during a bulk load, and also if loading fails. Yields the names of
+    the deferred indexes.
+    """
+    connection = connections[using]
+    # Only used to build the statements, which SQLite cannot run through
+    # a schema editor inside a transaction
+    schema_editor = connection.schema_editor()
+    deferred = [
+        (model, index)
+        for model in models
+        if not model.objects.using(using).exists()
+        for index in model._meta.indexes
+    ]
+    with connection.cursor() as cursor:
+        for model, index in deferred:
+            cursor.execute(str(index.remove_sql(model, schema_editor)))
+
+    def create_indexes():
+        with connection.cursor() as cursor:
+            for model, index in deferred:
+                cursor.execute(str(index.create_sql(model, schema_editor)))
+
+    try:
+        yield [index.name for model, index in deferred]
+    except BaseException:
+        # Rolling the transaction back restores them where it can
+        if not (connection.in_atomic_block and connection.features.can_rollback_ddl):
+            create_indexes()
+        raise
+    create_indexes()
+
+
+def write_records(stream, records, fmt, columns):
+    """Write ``records`` to ``stream`` and return how many were written."""
+    count = 0
+    if fmt == "csv":
+        writer = csv.DictWriter(stream, fieldnames=columns)
+        writer.writeheader()
+        for record in records:
+            writer.writerow(record)
+            count += 1
+    elif fmt == "ndjson":
+        for record in records:
+            stream.write(json.dumps(record, default=str))
+            stream.write("\n")
+            count += 1
+    elif fmt == "json":
+        stream.write("[")
+        for record in records:
+            stream.write(",\n" if count else "\n")
+            stream.write(json.dumps(record, default=str))
+            count += 1
+        stream.write("\n]\n")
+    else:
+        raise ValueError("Unknown format %r" % fmt)
+    return count
+
+
+def parse_cost(value):
+    try:
+        cost = Decimal(str(value))
+    except InvalidOperation:
+        return None
+    return cost if cost.is_finite() else None
+
+
+def parse_available(value):
+    if value in (None, ""):
+        return True
+    if isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "yes")
+    return bool(value)
+
+
+def load_ingredients(records, Ingredient, batch_size=500):
+    """
+    Create or update ingredients from ``records``, a chunk at a time.
+
+    ``Ingredient`` is passed in so that migrations can use the historical
+    model, which may not have a density yet. Returns a ``(created, updated)``
+    tuple.
+    """
+    fields = ["category", "unit", "cost_per_unit", "available"]
+    has_density = any(field.name == "density" for field in Ingredient._meta.fields)
+    if has_density:
+        fields.append("density")
+    ids_by_name = dict(Ingredient.objects.values_list("name", "pk"))
+    created = updated = 0
+    for chunk in chunked(records, batch_size):
+        new_ingredients = {}
+        changed_ingredients = {}
+        for record in chunk:
+            ingredient = Ingredient(
+                name=record["Ingredient"],
+                category=record.get("Excel Category") or "",
+                unit=record.get("Unit") or "",
+                cost_per_unit=parse_cost(record.get("Cost Per Unit")),
+                available=parse_available(record.get("Available")),
+            )
+            if has_density:
+                ingredient.density = parse_cost(record.get("Density"))
+            ingredient.pk = ids_by_name.get(ingredient.name)
+            if ingredient.pk is None:
+                new_ingredients[ingredient.name] = ingredient
+            else:
+                changed_ingredients[ingredient.name] = ingredient
+        Ingredient.objects.bulk_create(new_ingredients.values(), batch_size=batch_size)
+        Ingredient.objects.bulk_update(
+            changed_ingredients.values(),
+            fields,
+            batch_size=batch_size,
+        )
+        if new_ingredients:
+            ids_by_name.update(
+                Ingredient.objects.filter(name__in=list(new_ingredients)).values_list(
+                    "name", "pk"
+                )
+            )
+        created += len(new_ingredients)
+        updated += len(changed_ingredients)
+    return created, updated
+
+
+def dump_ingredients(Ingredient, batch_size=500):
+    """Yield a record per ingredient, reading the table in chunks."""
+    rows = (
+        Ingredient.objects.order_by("pk")
+        .values_list(
+            "name", "category", "unit", "cost_per_unit", "density", "available"
+        )
+        .iterator(chunk_size=batch_size)
+    )
+    for name, category, unit, cost_per_unit, density, available in rows:
+        yield {
+            "Ingredient": name,
+            "Excel Category": category,
+            "Unit": unit,
+            "Cost Per Unit": cost_per_unit,
+            "Density": density,
+            "Available": available,
+        }
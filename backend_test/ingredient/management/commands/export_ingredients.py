@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from ingredient.loaders import (
+    FORMATS,
+    INGREDIENT_COLUMNS,
+    dump_ingredients,
+    guess_format,
+    open_stream,
+    write_records,
+)
+from ingredient.models import Ingredient
+
+
+class Command(BaseCommand):
+    help = "Export every ingredient to an NDJSON, CSV or JSON file."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="File to write, or - for stdout.")
+        parser.add_argument("--format", choices=FORMATS)
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        fmt = options["format"] or guess_format(options["path"])
+        with open_stream(options["path"], "w") as stream:
+            count = write_records(
+                stream,
+                dump_ingredients(Ingredient, options["batch_size"]),
+                fmt,
+                INGREDIENT_COLUMNS,
+            )
+        self.stderr.write("Exported %d ingredients." % count)
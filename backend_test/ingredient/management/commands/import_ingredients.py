@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from ingredient.loaders import (
+    FORMATS,
+    guess_format,
+    load_ingredients,
+    open_stream,
+    read_records,
+)
+from ingredient.models import Ingredient
+
+
+class Command(BaseCommand):
+    help = "Create or update ingredients from an NDJSON, CSV or JSON file."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="File to import, or - for stdin.")
+        parser.add_argument("--format", choices=FORMATS)
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        fmt = options["format"] or guess_format(options["path"])
+        with open_stream(options["path"]) as stream, transaction.atomic():
+            created, updated = load_ingredients(
+                read_records(stream, fmt), Ingredient, options["batch_size"]
+            )
+        self.stdout.write(
+            self.style.SUCCESS(
+                "Created %d and updated %d ingredients." % (created, updated)
+            )
+        )
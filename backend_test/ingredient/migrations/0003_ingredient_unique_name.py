@@ -0,0 +1,77 @@
+# Generated by Django 3.2.7 on 2026-10-18 13:43
+
+from django.db import migrations, models
+from django.db.models import FloatField, Func, Count, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+class RoundCost(Func):
+    """Round a monetary amount to two decimal places in the database."""
+
+    function = "ROUND"
+    template = "%(function)s(%(expressions)s, 2)"
+    output_field = FloatField()
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        # PostgreSQL only offers two-argument ROUND() for numeric
+        return self.as_sql(
+            compiler,
+            connection,
+            template="%(function)s(CAST(%(expressions)s AS numeric), 2)",
+            **extra_context,
+        )
+
+
+def merge_duplicate_ingredients(apps, schema_editor):
+    # Keep one ingredient per name, preferring an available one, and move
+    # shopping list items on the duplicates over to it
+    Ingredient = apps.get_model("ingredient", "Ingredient")
+    ShoppingList = apps.get_model("shopping", "ShoppingList")
+    ShoppingListItem = apps.get_model("shopping", "ShoppingListItem")
+    duplicate_names = (
+        Ingredient.objects.values("name")
+        .annotate(count=Count("pk"))
+        .filter(count__gt=1)
+        .values_list("name", flat=True)
+    )
+    shopping_list_ids = set()
+    for name in duplicate_names.iterator():
+        keep, *duplicates = Ingredient.objects.filter(name=name).order_by(
+            "-available", "pk"
+        )
+        duplicate_ids = [duplicate.pk for duplicate in duplicates]
+        items = ShoppingListItem.objects.filter(ingredient_id__in=duplicate_ids)
+        shopping_list_ids.update(items.values_list("shopping_list_id", flat=True))
+        items.update(ingredient_id=keep.pk)
+        Ingredient.objects.filter(pk__in=duplicate_ids).delete()
+
+    item_costs = (
+        ShoppingListItem.objects.filter(
+            shopping_list=OuterRef("pk"), ingredient__available=True
+        )
+        .values("shopping_list")
+        .annotate(total_cost=Sum(F("ingredient__cost_per_unit") * F("quantity")))
+        .values("total_cost")
+    )
+    ShoppingList.objects.filter(pk__in=shopping_list_ids).update(
+        total_cost=Coalesce(RoundCost(Subquery(item_costs)), Value(0.0))
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ingredient", "0002_seed"),
+        ("shopping", "0004_shoppinglistitem_ingredient_index"),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_ingredients, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="ingredient",
+            name="name",
+            field=models.CharField(
+                max_length=250, unique=True, verbose_name="Ingredient"
+            ),
+        ),
+    ]
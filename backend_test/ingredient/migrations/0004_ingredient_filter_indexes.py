@@ -0,0 +1,29 @@
+# Generated by Django 3.2.7 on 2026-10-18 13:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ingredient", "0003_ingredient_unique_name"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="ingredient",
+            index=models.Index(
+                fields=["category", "name"], name="ingredient_category_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="ingredient",
+            index=models.Index(fields=["unit", "name"], name="ingredient_unit_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="ingredient",
+            index=models.Index(
+                fields=["available", "name"], name="ingredient_available_idx"
+            ),
+        ),
+    ]
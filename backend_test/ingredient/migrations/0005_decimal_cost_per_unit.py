@@ -0,0 +1,24 @@
+# Generated by Django 3.2.7 on 2026-10-18 14:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ingredient", "0004_ingredient_filter_indexes"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="ingredient",
+            name="cost_per_unit",
+            field=models.DecimalField(
+                blank=True,
+                decimal_places=4,
+                max_digits=12,
+                null=True,
+                verbose_name="Cost Per Unit",
+            ),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 3.2.7 on 2026-10-18 14:12
+
+from decimal import Decimal
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ingredient", "0005_decimal_cost_per_unit"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="ingredient",
+            name="density",
+            field=models.DecimalField(
+                blank=True,
+                decimal_places=4,
+                max_digits=8,
+                null=True,
+                validators=[
+                    django.core.validators.MinValueValidator(Decimal("0.0001"))
+                ],
+                verbose_name="Density (g/ml)",
+            ),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.7 on 2026-10-18 14:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ingredient", "0006_ingredient_density"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="ingredient",
+            name="version",
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+    ]
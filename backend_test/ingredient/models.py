@@ -1,24 +1,278 @@
-from django.db import models
+from decimal import Decimal
+
+from django.core.validators import MinValueValidator
+from django.db import connections, models, router, transaction
+from django.db.models import F
+from django.db.models.sql import UpdateQuery
 from django.utils.translation import ugettext_lazy as _
 
+from changefeed.models import INGREDIENT, Change
+
+from .catalog import SEARCH_VERSION_KEY, bump_version
+from .signals import ingredients_changed
 
 CATEGORIES = (("fresh", "fresh"), ("staple", "staple"))
 UNITS = (("g", "g"), ("ml", "ml"), ("tsp", "tsp"), ("tbsp", "tbsp"))
 
+# Fields that feed into shopping list totals
+COST_FIELDS = {"cost_per_unit", "available"}
+
+# Fields in the search index
+SEARCH_FIELDS = {"name", "category", "unit", "available"}
+
+# Keeps IN (...) lookups within the database's parameter limit
+LOOKUP_BATCH_SIZE = 500
+
+
+def record_changes(ingredient_ids, using):
+    Change.objects.db_manager(using).record(
+        (INGREDIENT, ingredient_id) for ingredient_id in ingredient_ids
+    )
+
+
+def can_update_returning(connection):
+    if connection.vendor == "postgresql":
+        return True
+    if connection.vendor == "sqlite":
+        return connection.Database.sqlite_version_info >= (3, 35)
+    return False
+
+
+class IngredientQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        # bulk_update() also goes through here, one call per batch
+        kwargs.setdefault("version", F("version") + 1)
+        self._for_write = True
+        with transaction.atomic(using=self.db, savepoint=False):
+            ingredient_ids = list(self.values_list("pk", flat=True))
+            rows = super().update(**kwargs)
+            self._changed(kwargs, ingredient_ids)
+        return rows
+
+    update.alters_data = True
+
+    def update_returning(self, **kwargs):
+        """
+        Update the rows like update() and return them as they are now, in a
+        single UPDATE ... RETURNING statement where the database has it.
+        """
+        kwargs.setdefault("version", F("version") + 1)
+        self._for_write = True
+        connection = connections[self.db]
+        if not can_update_returning(connection):
+            with transaction.atomic(using=self.db):
+                ingredient_ids = list(
+                    self.select_for_update().values_list("pk", flat=True)
+                )
+                self.model.objects.using(self.db).filter(pk__in=ingredient_ids).update(
+                    **kwargs
+                )
+                return list(
+                    self.model.objects.using(self.db).filter(pk__in=ingredient_ids)
+                )
+
+        query = self.query.chain(UpdateQuery)
+        query.add_update_values(kwargs)
+        query.annotations = {}
+        compiler = query.get_compiler(self.db)
+        compiler.pre_sql_setup()
+        sql, params = compiler.as_sql()
+        fields = self.model._meta.concrete_fields
+        returning = ", ".join(
+            connection.ops.quote_name(field.column) for field in fields
+        )
+        columns = [field.get_col(self.model._meta.db_table) for field in fields]
+        converters = [
+            connection.ops.get_db_converters(column)
+            + column.field.get_db_converters(connection)
+            for column in columns
+        ]
+        names = [field.attname for field in fields]
+        ingredients = []
+        with transaction.atomic(using=self.db, savepoint=False):
+            with connection.cursor() as cursor:
+                cursor.execute("%s RETURNING %s" % (sql, returning), params)
+                rows = cursor.fetchall()
+            for row in rows:
+                values = []
+                for value, column, column_converters in zip(row, columns, converters):
+                    for converter in column_converters:
+                        value = converter(value, column, connection)
+                    values.append(value)
+                ingredients.append(self.model.from_db(self.db, names, values))
+            self._changed(kwargs, [ingredient.pk for ingredient in ingredients])
+        return ingredients
+
+    update_returning.alters_data = True
+
+    def _changed(self, fields, ingredient_ids):
+        record_changes(ingredient_ids, using=self.db)
+        bump_version(using=self.db)
+        if not SEARCH_FIELDS.isdisjoint(fields):
+            bump_version(using=self.db, key=SEARCH_VERSION_KEY)
+        if ingredient_ids and not COST_FIELDS.isdisjoint(fields):
+            ingredients_changed.send(
+                sender=self.model, ingredient_ids=ingredient_ids, using=self.db
+            )
+
+    def update_prices(self, prices):
+        """
+        Set the cost per unit of the ingredients named in ``prices``, in one
+        transaction, and return {name: "updated", "unchanged" or "not_found"}.
+        """
+        names = list(prices)
+        ingredients = {}
+        for start in range(0, len(names), LOOKUP_BATCH_SIZE):
+            batch = names[start : start + LOOKUP_BATCH_SIZE]
+            for ingredient in self.filter(name__in=batch).only(
+                "pk", "name", "cost_per_unit"
+            ):
+                ingredients[ingredient.name] = ingredient
+
+        statuses = {}
+        changed = []
+        for name, price in prices.items():
+            ingredient = ingredients.get(name)
+            if ingredient is None:
+                statuses[name] = "not_found"
+            elif ingredient.cost_per_unit == price:
+                statuses[name] = "unchanged"
+            else:
+                ingredient.cost_per_unit = price
+                changed.append(ingredient)
+                statuses[name] = "updated"
+
+        with transaction.atomic(using=self.db):
+            self.bulk_update(changed, ["cost_per_unit"], batch_size=LOOKUP_BATCH_SIZE)
+        return statuses
+
+    update_prices.alters_data = True
+
+    def bulk_create(self, objs, *args, **kwargs):
+        self._for_write = True
+        with transaction.atomic(using=self.db, savepoint=False):
+            objs = super().bulk_create(objs, *args, **kwargs)
+            ingredient_ids = [obj.pk for obj in objs]
+            if None in ingredient_ids:
+                # Only some databases return the ids of the rows they insert
+                names = [obj.name for obj in objs]
+                ingredient_ids = []
+                for start in range(0, len(names), LOOKUP_BATCH_SIZE):
+                    ingredient_ids += (
+                        self.model.objects.using(self.db)
+                        .filter(name__in=names[start : start + LOOKUP_BATCH_SIZE])
+                        .values_list("pk", flat=True)
+                    )
+            record_changes(ingredient_ids, using=self.db)
+        bump_version(using=self.db, key=SEARCH_VERSION_KEY)
+        return objs
+
+    bulk_create.alters_data = True
+
+    def delete(self):
+        self._for_write = True
+        with transaction.atomic(using=self.db, savepoint=False):
+            ingredient_ids = list(self.values_list("pk", flat=True))
+            deleted = super().delete()
+            record_changes(ingredient_ids, using=self.db)
+        bump_version(using=self.db)
+        bump_version(using=self.db, key=SEARCH_VERSION_KEY)
+        return deleted
+
+    delete.alters_data = True
+
 
 class Ingredient(models.Model):
-    name = models.CharField(_("Ingredient"), max_length=250)
+    name = models.CharField(_("Ingredient"), max_length=250, unique=True)
 
     category = models.CharField(choices=CATEGORIES, max_length=64)
 
     unit = models.CharField(choices=UNITS, max_length=64)
 
-    cost_per_unit = models.FloatField(_("Cost Per Unit"), null=True, blank=True)
+    cost_per_unit = models.DecimalField(
+        _("Cost Per Unit"), max_digits=12, decimal_places=4, null=True, blank=True
+    )
+
+    # Converts quantities between mass and volume, see ingredient.units
+    density = models.DecimalField(
+        _("Density (g/ml)"),
+        max_digits=8,
+        decimal_places=4,
+        null=True,
+        blank=True,
+        validators=[MinValueValidator(Decimal("0.0001"))],
+    )
 
     available = models.BooleanField(null=False, blank=False)
 
+    # Incremented by every change, see IngredientViewSet's If-Match support
+    version = models.PositiveIntegerField(default=1, editable=False)
+
+    objects = IngredientQuerySet.as_manager()
+
     def __str__(self):
         return self.name
 
     class Meta:
         ordering = ["name"]
+        indexes = [
+            # Keep filtered catalog pages in name order without sorting
+            models.Index(fields=["category", "name"], name="ingredient_category_idx"),
+            models.Index(fields=["unit", "name"], name="ingredient_unit_idx"),
+            models.Index(fields=["available", "name"], name="ingredient_available_idx"),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_search_values = instance._search_values()
+        return instance
+
+    def _search_values(self):
+        return {field: self.__dict__.get(field) for field in SEARCH_FIELDS}
+
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        loaded_version = self.version
+        if not adding:
+            # Incremented by the database, so concurrent saves never write
+            # the same version
+            self.version = F("version") + 1
+            if kwargs.get("update_fields") is not None:
+                kwargs["update_fields"] = {*kwargs["update_fields"], "version"}
+        using = kwargs.get("using") or router.db_for_write(
+            self.__class__, instance=self
+        )
+        try:
+            with transaction.atomic(using=using, savepoint=False):
+                super().save(*args, **kwargs)
+                if not adding:
+                    self.refresh_from_db(using=using, fields=["version"])
+                record_changes([self.pk], using=using)
+        except BaseException:
+            self.version = loaded_version
+            raise
+        bump_version(using=self._state.db)
+        search_values = self._search_values()
+        if search_values != getattr(self, "_loaded_search_values", None):
+            bump_version(using=self._state.db, key=SEARCH_VERSION_KEY)
+            self._loaded_search_values = search_values
+        update_fields = kwargs.get("update_fields")
+        if update_fields is None:
+            update_fields = COST_FIELDS
+        if not adding and not COST_FIELDS.isdisjoint(update_fields):
+            ingredients_changed.send(
+                sender=self.__class__, ingredient_ids=[self.pk], using=self._state.db
+            )
+
+    def delete(self, *args, **kwargs):
+        using = kwargs.get("using") or router.db_for_write(
+            self.__class__, instance=self
+        )
+        ingredient_id = self.pk
+        with transaction.atomic(using=using, savepoint=False):
+            deleted = super().delete(*args, **kwargs)
+            record_changes([ingredient_id], using=using)
+        bump_version(using=self._state.db)
+        bump_version(using=self._state.db, key=SEARCH_VERSION_KEY)
+        return deleted
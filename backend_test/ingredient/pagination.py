@@ -0,0 +1,10 @@
+from rest_framework.pagination import CursorPagination
+
+
+class IngredientCursorPagination(CursorPagination):
+    """Keyset pagination over the unique name index."""
+
+    ordering = "name"
+    page_size = 100
+    page_size_query_param = "page_size"
+    max_page_size = 1000
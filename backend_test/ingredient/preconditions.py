@@ -0,0 +1,56 @@
+"""
+Conditional ingredient updates.
+
+Every change increments an ingredient's version, which responses carry as
+an ETag. Clients send it back in If-Match to update only if nobody else has
+changed the ingredient since, and get a 412 Precondition Failed otherwise.
+"""
+
+from django.http import Http404
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from .models import Ingredient
+
+
+class PreconditionFailed(APIException):
+    status_code = status.HTTP_412_PRECONDITION_FAILED
+    default_detail = "The ingredient has changed since the version in If-Match."
+    default_code = "precondition_failed"
+
+
+def etag(ingredient):
+    return '"%s"' % ingredient.version
+
+
+def if_match_versions(request):
+    """Return the versions in If-Match, or None when any version will do."""
+    header = request.headers.get("If-Match")
+    if header is None:
+        return None
+    etags = parse_etags(header)
+    if "*" in etags:
+        return None
+    versions = set()
+    # If-Match compares strong ETags only
+    for tag in etags:
+        if tag.startswith('"') and tag[1:-1].isdigit():
+            versions.add(int(tag[1:-1]))
+    return versions
+
+
+def update_ingredient(name, versions=None, **changes):
+    """
+    Apply ``changes`` to the named ingredient in one statement, if its version
+    is one of ``versions``, and return it as updated.
+    """
+    ingredients = Ingredient.objects.filter(name=name)
+    if versions is not None:
+        ingredients = ingredients.filter(version__in=versions)
+    updated = ingredients.update_returning(**changes)
+    if updated:
+        return updated[0]
+    if versions is not None and Ingredient.objects.filter(name=name).exists():
+        raise PreconditionFailed()
+    raise Http404("No Ingredient matches the given query.")
@@ -0,0 +1,294 @@
+"""
+In-memory search index of ingredient names, for autocomplete.
+
+Each worker builds the index from the Ingredient table on its first search,
+and rebuilds it once the search version in the shared Django cache changes.
+That only happens when ingredients are added or removed or their name,
+category, unit or availability change, so price updates keep the index.
+
+Names match by a case-insensitive prefix of the name or of any word in it.
+The sorted keys are split by category and availability, so a search is a
+binary search per matching group and a merge of the results. Fuzzy matches
+allow each word of the query up to two edits, found by looking up its
+deletions of one character in a table of every indexed word's, so neither
+kind of search scans the catalog.
+"""
+
+import bisect
+import heapq
+import itertools
+import re
+import threading
+from array import array
+from collections import defaultdict
+
+from django.apps import apps
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from .catalog import SEARCH_VERSION_KEY, get_version
+
+WORD = re.compile(r"\w+")
+
+# Shorter words only match exactly, they are too near too many others
+FUZZY_MIN_LENGTH = 4
+
+# Rough cost of finding words in a name, relative to reading one position
+NAME_LOOKUP_COST = 20
+
+
+def normalize(text):
+    return " ".join(WORD.findall(text.lower()))
+
+
+def deletions(word):
+    return {word[:i] + word[i + 1 :] for i in range(len(word))}
+
+
+class SearchIndex:
+    def __init__(self, rows):
+        """Index ``rows`` of (name, category, unit, available), in name order."""
+        self.rows = []
+        groups = defaultdict(list)
+        self.word_names = defaultdict(lambda: array("i"))
+        for position, row in enumerate(rows):
+            self.rows.append(tuple(row))
+            name, category, unit, available = row
+            key = normalize(name)
+            start = 0
+            for word in key.split(" "):
+                groups[category, available].append((key[start:], position))
+                self.word_names[word].append(position)
+                start += len(word) + 1
+        self.word_names = dict(self.word_names)
+        self.words = sorted(self.word_names)
+        self.groups = {}
+        for group, entries in groups.items():
+            entries.sort()
+            self.groups[group] = (
+                [key for key, position in entries],
+                array("i", (position for key, position in entries)),
+            )
+        self.deletions = defaultdict(list)
+        for word in self.word_names:
+            if len(word) >= FUZZY_MIN_LENGTH:
+                for variant in deletions(word):
+                    self.deletions[variant].append(word)
+        self.deletions = dict(self.deletions)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def _matches(self, row, category, available):
+        return category in (None, row[1]) and available in (None, row[3])
+
+    def complete(self, prefix, category=None, available=None, limit=10):
+        """Return the positions of up to ``limit`` names with a word starting with ``prefix``."""
+        prefix = normalize(prefix)
+
+        def matches(keys, positions):
+            for index in range(bisect.bisect_left(keys, prefix), len(keys)):
+                if not keys[index].startswith(prefix):
+                    return
+                yield keys[index], positions[index]
+
+        groups = [
+            entries
+            for (group_category, group_available), entries in self.groups.items()
+            if category in (None, group_category)
+            and available in (None, group_available)
+        ]
+        found = {}
+        for key, position in heapq.merge(*(matches(*entries) for entries in groups)):
+            found.setdefault(position)
+            if len(found) == limit:
+                break
+        return list(found)
+
+    def similar_words(self, word, prefix=False):
+        """
+        Return {word: edits} of the indexed words within two edits of
+        ``word``, and with ``prefix`` those starting with it. Substitutions
+        and transpositions count as two.
+        """
+        similar = {}
+        if prefix:
+            start = bisect.bisect_left(self.words, word)
+            for other in itertools.islice(self.words, start, None):
+                if not other.startswith(word):
+                    break
+                similar[other] = 0
+
+        def add(words, edits):
+            for other in words:
+                if edits < similar.get(other, edits + 1):
+                    similar[other] = edits
+
+        if word in self.word_names:
+            similar[word] = 0
+        if len(word) < FUZZY_MIN_LENGTH:
+            return similar
+        add(self.deletions.get(word, ()), 1)
+        for variant in deletions(word):
+            if variant in self.word_names:
+                add([variant], 1)
+            add(self.deletions.get(variant, ()), 2)
+        return similar
+
+    def fuzzy(self, query, category=None, available=None, limit=10, exclude=()):
+        """
+        Return the positions of up to ``limit`` names with a word similar to
+        each word of ``query``, fewest edits first. The last word may also be
+        the start of a word, as it may not be typed in full yet.
+        """
+        words = normalize(query).split(" ")
+        similar = [self.similar_words(word) for word in words[:-1]]
+        similar.append(self.similar_words(words[-1], prefix=True))
+        if not all(similar):
+            return []
+        exclude = set(exclude)
+
+        def allowed(position):
+            return position not in exclude and self._matches(
+                self.rows[position], category, available
+            )
+
+        if len(words) == 1:
+            # Names are indexed in order, so each word's positions are sorted
+            # and the first matches found are the ones to return
+            found = {}
+            for edits, position in heapq.merge(
+                *(
+                    ((edits, position) for position in self.word_names[word])
+                    for word, edits in similar[0].items()
+                )
+            ):
+                if position not in found and allowed(position):
+                    found[position] = edits
+                    if len(found) == limit:
+                        break
+            return list(found)
+
+        sizes = [sum(len(self.word_names[word]) for word in edits) for edits in similar]
+        order = sorted(range(len(words)), key=sizes.__getitem__)
+        candidates = {
+            position: edits
+            for position, edits in self._positions(similar[order[0]]).items()
+            if allowed(position)
+        }
+        for index in order[1:]:
+            if sizes[index] <= NAME_LOOKUP_COST * len(candidates):
+                positions = self._positions(similar[index])
+                candidates = {
+                    position: edits + positions[position]
+                    for position, edits in candidates.items()
+                    if position in positions
+                }
+            else:
+                # Cheaper to look for the words in the names left
+                candidates = self._narrow(candidates, similar[index])
+        return [
+            position
+            for edits, position in heapq.nsmallest(
+                limit, ((edits, position) for position, edits in candidates.items())
+            )
+        ]
+
+    def _positions(self, similar):
+        """Return {position: edits} of the names with any of the ``similar`` words."""
+        positions = {}
+        for word, edits in similar.items():
+            for position in self.word_names[word]:
+                if edits < positions.get(position, edits + 1):
+                    positions[position] = edits
+        return positions
+
+    def _narrow(self, candidates, similar):
+        narrowed = {}
+        for position, edits in candidates.items():
+            matched = [
+                similar[word]
+                for word in normalize(self.rows[position][0]).split(" ")
+                if word in similar
+            ]
+            if matched:
+                narrowed[position] = edits + min(matched)
+        return narrowed
+
+
+class IngredientSearch:
+    """The search index of this worker, rebuilt when the catalog changes."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._index = None
+        self._version = None
+
+    def clear(self):
+        with self._lock:
+            self._index = None
+            self._version = None
+
+    def get_index(self, using=DEFAULT_DB_ALIAS):
+        version = get_version(SEARCH_VERSION_KEY)
+        # Searches wait for one rebuild instead of each doing their own
+        with self._lock:
+            if self._index is not None and version == self._version:
+                return self._index
+            Ingredient = apps.get_model("ingredient", "Ingredient")
+            index = SearchIndex(
+                Ingredient.objects.using(using)
+                .order_by("name")
+                .values_list("name", "category", "unit", "available")
+                .iterator(chunk_size=10000)
+            )
+            # Rows read inside a transaction may yet be rolled back
+            if not connections[using].in_atomic_block:
+                self._index = index
+                self._version = version
+            return index
+
+    def search(
+        self,
+        query,
+        category=None,
+        available=None,
+        limit=10,
+        fuzzy=True,
+        using=DEFAULT_DB_ALIAS,
+    ):
+        """
+        Return up to ``limit`` ingredients matching ``query``, prefix matches
+        in order of the matching text first, then fuzzy matches by edits.
+        """
+        index = self.get_index(using)
+        matches = [
+            (position, "prefix")
+            for position in index.complete(query, category, available, limit)
+        ]
+        if fuzzy and len(matches) < limit:
+            matches += [
+                (position, "fuzzy")
+                for position in index.fuzzy(
+                    query,
+                    category,
+                    available,
+                    limit - len(matches),
+                    exclude=[position for position, match in matches],
+                )
+            ]
+        results = []
+        for position, match in matches:
+            name, category, unit, available = index.rows[position]
+            results.append(
+                {
+                    "name": name,
+                    "category": category,
+                    "unit": unit,
+                    "available": available,
+                    "match": match,
+                }
+            )
+        return results
+
+
+search_index = IngredientSearch()
@@ -1,13 +1,97 @@
 from rest_framework import serializers
+from rest_framework.exceptions import ParseError
 
-from .models import Ingredient
+from backend_test.metrics import TimedSerializerMixin
 
+from .models import CATEGORIES, UNITS, Ingredient
 
-class IngredientSerializer(serializers.ModelSerializer):
+
+class IngredientSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Ingredient
-        fields = ["name", "category", "unit", "cost_per_unit", "available"]
+        fields = [
+            "name",
+            "category",
+            "unit",
+            "cost_per_unit",
+            "density",
+            "available",
+            "version",
+        ]
+        read_only_fields = ["version"]
 
 
 class QueryParamSerializer(serializers.Serializer):
-    price = serializers.FloatField()
+    price = serializers.DecimalField(max_digits=12, decimal_places=4)
+
+
+class IngredientFilterSerializer(serializers.Serializer):
+    category = serializers.ChoiceField(choices=CATEGORIES, required=False)
+    unit = serializers.ChoiceField(choices=UNITS, required=False)
+    available = serializers.BooleanField(required=False)
+    min_price = serializers.DecimalField(
+        max_digits=12, decimal_places=4, required=False
+    )
+    max_price = serializers.DecimalField(
+        max_digits=12, decimal_places=4, required=False
+    )
+
+
+class IngredientSearchSerializer(serializers.Serializer):
+    q = serializers.CharField(max_length=250)
+    category = serializers.ChoiceField(choices=CATEGORIES, required=False)
+    available = serializers.BooleanField(required=False)
+    limit = serializers.IntegerField(min_value=1, max_value=100, default=10)
+    fuzzy = serializers.BooleanField(default=True)
+
+
+class PriceRowSerializer(serializers.Serializer):
+    name = serializers.CharField(max_length=250)
+    price = serializers.DecimalField(max_digits=12, decimal_places=4)
+
+
+def read_price_sheet(rows):
+    """
+    Validate a price sheet, given as {name: price} or a list of
+    {"name": ..., "price": ...} rows. Returns a result per row, with an
+    "invalid" status for rows that failed, and {name: price} of the rest.
+    """
+    if isinstance(rows, dict):
+        rows = [{"name": name, "price": price} for name, price in rows.items()]
+    if not isinstance(rows, list):
+        raise ParseError("Expected a list of prices or an object of name: price.")
+
+    results = []
+    prices = {}
+    for number, row in enumerate(rows, start=1):
+        result = {"row": number}
+        results.append(result)
+        price_row = PriceRowSerializer(data=row)
+        if not price_row.is_valid():
+            result.update(status="invalid", errors=price_row.errors)
+            continue
+        name = price_row.validated_data["name"]
+        result["name"] = name
+        if name in prices:
+            result.update(
+                status="invalid", errors={"name": ["Duplicate ingredient name."]}
+            )
+            continue
+        prices[name] = price_row.validated_data["price"]
+    return results, prices
+
+
+def report_price_sheet(results, prices, statuses):
+    """
+    Complete the results of read_price_sheet() with the status of each
+    price, from Ingredient.objects.update_prices().
+    """
+    for result in results:
+        if "status" in result:
+            continue
+        name = result["name"]
+        result["status"] = statuses[name]
+        if statuses[name] != "not_found":
+            result["cost_per_unit"] = prices[name]
+    updated = sum(status == "updated" for status in statuses.values())
+    return {"updated": updated, "results": results}
@@ -0,0 +1,6 @@
+from django.dispatch import Signal
+
+# Sent with ``ingredient_ids`` whenever the price or availability of one or
+# more ingredients may have changed, including through bulk queryset paths
+# that bypass ``Ingredient.save``.
+ingredients_changed = Signal()
@@ -0,0 +1,20 @@
+from jobs.registry import task
+
+from .models import LOOKUP_BATCH_SIZE, Ingredient
+from .serializers import read_price_sheet, report_price_sheet
+
+
+@task("ingredient.bulk_cost_per_unit")
+def bulk_cost_per_unit(job, rows):
+    """Apply a price sheet like /ingredient/bulk_cost_per_unit/, a batch at a time."""
+    results, prices = read_price_sheet(rows)
+    names = list(prices)
+    statuses = {}
+    job.report_progress(0, len(names))
+    for start in range(0, len(names), LOOKUP_BATCH_SIZE):
+        batch = names[start : start + LOOKUP_BATCH_SIZE]
+        statuses.update(
+            Ingredient.objects.update_prices({name: prices[name] for name in batch})
+        )
+        job.report_progress(len(statuses))
+    return report_price_sheet(results, prices, statuses)
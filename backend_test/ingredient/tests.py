@@ -1,6 +1,20 @@
-from django.test import TestCase
+import multiprocessing
+import os
+import tempfile
+from decimal import Decimal
+from http import HTTPStatus
+from io import StringIO
 
-from .serializers import IngredientSerializer, QueryParamSerializer
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+
+from .catalog import IngredientCatalog, check_version_cache
+from .loaders import deferred_indexes, iter_json_array, read_records, read_shards
+from .models import Ingredient
+from .search import SearchIndex, search_index
+from .serializers import IngredientSerializer, PriceRowSerializer, QueryParamSerializer
+from .units import UnitConversionError, convert, normalize_quantity
 
 
 class IngredientSerializerTest(TestCase):
@@ -19,7 +33,7 @@ class IngredientSerializerTest(TestCase):
             "category": "fresh",
             "name": "My New Ingredient",
             "unit": "g",
-            "cost_per_unit": 59.99,
+            "cost_per_unit": Decimal("59.99"),
             "available": True,
         }
 
@@ -92,3 +106,296 @@ class QueryParamSerializerTest(TestCase):
     def test_fails_if_data_invalid(self):
         serializer = QueryParamSerializer(data={"price": "abc"})
         assert not serializer.is_valid()
+
+
+class PriceRowSerializerTest(TestCase):
+    def test_serializes_valid_data(self):
+        serializer = PriceRowSerializer(data={"name": "salt", "price": "0.002"})
+        serializer.is_valid(raise_exception=True)
+        assert serializer.validated_data == {"name": "salt", "price": Decimal("0.002")}
+
+    def test_fails_if_price_invalid(self):
+        serializer = PriceRowSerializer(data={"name": "salt", "price": "abc"})
+        assert not serializer.is_valid()
+
+
+class UnitsTest(TestCase):
+    def test_converts_within_a_dimension(self):
+        assert convert(Decimal("1.5"), "kg", "g") == 1500
+        assert convert(Decimal("2"), "tbsp", "tsp") == 6
+        assert convert(Decimal("1"), "lb", "oz") == 16
+
+    def test_converts_between_mass_and_volume_through_density(self):
+        assert convert(Decimal("1"), "cup", "g", density=Decimal("0.5")) == 120
+        assert convert(Decimal("120"), "g", "cup", density=Decimal("0.5")) == 1
+        with self.assertRaises(UnitConversionError):
+            convert(Decimal("1"), "cup", "g")
+
+    def test_normalizes_to_the_ingredient_unit(self):
+        assert normalize_quantity(Decimal("1"), "oz", "g") == Decimal("28.350")
+        assert normalize_quantity(Decimal("3"), None, "g") == 3
+        with self.assertRaises(UnitConversionError):
+            normalize_quantity(Decimal("3"), "kg", "")
+
+
+class LoadersTest(TestCase):
+    def test_streams_json_array(self):
+        stream = StringIO('[{"a": 1}, {"b": "x, ]"},\n {"c": [1, 2]}]')
+        assert list(iter_json_array(stream, read_size=3)) == [
+            {"a": 1},
+            {"b": "x, ]"},
+            {"c": [1, 2]},
+        ]
+
+    def test_reads_ndjson_and_csv(self):
+        ndjson = StringIO('{"Ingredient": "salt"}\n\n{"Ingredient": "pepper"}\n')
+        assert list(read_records(ndjson, "ndjson")) == [
+            {"Ingredient": "salt"},
+            {"Ingredient": "pepper"},
+        ]
+        csv = StringIO("Ingredient,Unit\nsalt,g\n")
+        assert list(read_records(csv, "csv")) == [{"Ingredient": "salt", "Unit": "g"}]
+
+    def test_reads_shards_in_a_process_pool(self):
+        with tempfile.TemporaryDirectory() as directory:
+            shards = []
+            for number in range(3):
+                path = os.path.join(directory, "%d.ndjson" % number)
+                with open(path, "w") as shard:
+                    shard.write('{"Ingredient": "%d"}\n' % number)
+                shards.append((path, "ndjson"))
+            with multiprocessing.get_context("fork").Pool(2) as pool:
+                records = list(read_shards(shards, pool, 2))
+        assert records == [
+            {"Ingredient": "0"},
+            {"Ingredient": "1"},
+            {"Ingredient": "2"},
+        ]
+
+    def test_defers_indexes_of_empty_tables(self):
+        Ingredient.objects.all().delete()
+        with deferred_indexes([Ingredient]) as indexes:
+            assert "ingredient_category_idx" in indexes
+            assert "ingredient_category_idx" not in self.get_constraints()
+        assert "ingredient_category_idx" in self.get_constraints()
+
+        Ingredient.objects.create(name="salt", unit="g", available=True)
+        with deferred_indexes([Ingredient]) as indexes:
+            assert indexes == []
+
+    def get_constraints(self):
+        with connection.cursor() as cursor:
+            return connection.introspection.get_constraints(
+                cursor, Ingredient._meta.db_table
+            )
+
+    def test_export_and_import_round_trip(self):
+        Ingredient.objects.create(
+            category="staple",
+            name="salt",
+            unit="g",
+            cost_per_unit=Decimal("0.001"),
+            available=True,
+        )
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "ingredients.csv")
+            call_command("export_ingredients", path, stderr=StringIO())
+            count = Ingredient.objects.count()
+            Ingredient.objects.update(cost_per_unit=None)
+            call_command("import_ingredients", path, stdout=StringIO())
+        assert Ingredient.objects.count() == count
+        assert Ingredient.objects.get(name="salt").cost_per_unit == Decimal("0.001")
+
+    def test_imports_density(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "ingredients.csv")
+            with open(path, "w") as csv_file:
+                csv_file.write(
+                    "Ingredient,Excel Category,Unit,Cost Per Unit,Density,Available\n"
+                    "olive oil,staple,ml,0.01,0.91,true\n"
+                )
+            call_command("import_ingredients", path, stdout=StringIO())
+        assert Ingredient.objects.get(name="olive oil").density == Decimal("0.91")
+
+
+class IngredientCatalogTest(TransactionTestCase):
+    def setUp(self):
+        self.catalog = IngredientCatalog(max_size=2)
+        for name in ("onion", "garlic", "leek"):
+            Ingredient.objects.create(
+                category="fresh", name=name, unit="g", cost_per_unit=1, available=True
+            )
+
+    def test_serves_repeat_lookups_from_memory(self):
+        onion = self.catalog.get(name="onion")
+        with self.assertNumQueries(0):
+            assert self.catalog.get(name="onion").pk == onion.pk
+            assert self.catalog.get(pk=onion.pk).name == "onion"
+
+    def test_drops_entries_when_an_ingredient_changes(self):
+        self.catalog.get_many(["onion", "garlic"])
+        Ingredient.objects.filter(name="onion").update(cost_per_unit=2)
+        with self.assertNumQueries(1):
+            ingredients = self.catalog.get_many(["onion", "garlic"])
+        assert ingredients["onion"].cost_per_unit == 2
+
+    def test_evicts_least_recently_used(self):
+        self.catalog.get(name="onion")
+        self.catalog.get(name="garlic")
+        self.catalog.get(name="onion")
+        self.catalog.get(name="leek")
+        with self.assertNumQueries(0):
+            self.catalog.get(name="onion")
+        with self.assertNumQueries(1):
+            self.catalog.get(name="garlic")
+
+    def test_does_not_keep_rows_read_inside_a_transaction(self):
+        with transaction.atomic():
+            self.catalog.get(name="onion")
+        with self.assertNumQueries(1):
+            self.catalog.get(name="onion")
+
+    def test_expires_entries(self):
+        catalog = IngredientCatalog(max_size=2, timeout=0)
+        catalog.get(name="onion")
+        with self.assertNumQueries(1):
+            catalog.get(name="onion")
+
+    def test_warns_when_the_version_cache_is_not_shared(self):
+        [warning] = check_version_cache(None)
+        assert warning.id == "ingredient.W001"
+        with override_settings(
+            CACHES={
+                "default": {
+                    "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+                    "LOCATION": tempfile.gettempdir(),
+                }
+            }
+        ):
+            assert check_version_cache(None) == []
+
+
+class IngredientUpdateTest(TestCase):
+    def test_updates_and_returns_rows_in_one_query(self):
+        salt = Ingredient.objects.create(
+            category="staple",
+            name="salt",
+            unit="g",
+            cost_per_unit=Decimal("0.001"),
+            available=True,
+        )
+        # And one to log the change
+        with self.assertNumQueries(2):
+            (updated,) = Ingredient.objects.filter(name="salt").update_returning(
+                cost_per_unit=Decimal("0.002")
+            )
+        assert updated.pk == salt.pk
+        assert updated.cost_per_unit == Decimal("0.002")
+        assert updated.available is salt.available
+        assert updated.version == salt.version + 1
+        assert (
+            Ingredient.objects.filter(name="missing").update_returning(available=False)
+            == []
+        )
+
+    def test_saves_increment_the_stored_version(self):
+        onion = Ingredient.objects.create(
+            category="fresh", name="onion", unit="g", cost_per_unit=1, available=True
+        )
+        first = Ingredient.objects.get(pk=onion.pk)
+        second = Ingredient.objects.get(pk=onion.pk)
+        first.save()
+        second.save()
+        assert (first.version, second.version) == (2, 3)
+
+        second.name = None
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            second.save()
+        assert second.version == 3
+
+
+class SearchIndexTest(TestCase):
+    def setUp(self):
+        self.index = SearchIndex(
+            [
+                ("cherry tomatoes", "fresh", "g", True),
+                ("chicken breast", "fresh", "g", True),
+                ("chopped tomatoes", "staple", "g", True),
+                ("tomato puree", "staple", "g", False),
+            ]
+        )
+
+    def names(self, positions):
+        return [self.index.rows[position][0] for position in positions]
+
+    def test_completes_names_and_words(self):
+        assert self.names(self.index.complete("TOM")) == [
+            "tomato puree",
+            "cherry tomatoes",
+            "chopped tomatoes",
+        ]
+        assert self.names(self.index.complete("ch", limit=2)) == [
+            "cherry tomatoes",
+            "chicken breast",
+        ]
+
+    def test_filters_by_category_and_availability(self):
+        assert self.names(self.index.complete("tom", category="staple")) == [
+            "tomato puree",
+            "chopped tomatoes",
+        ]
+        assert self.names(
+            self.index.complete("tom", category="staple", available=True)
+        ) == ["chopped tomatoes"]
+
+    def test_finds_fuzzy_matches(self):
+        assert self.names(self.index.fuzzy("chiken")) == ["chicken breast"]
+        assert self.names(self.index.fuzzy("tomatos")) == [
+            "cherry tomatoes",
+            "chopped tomatoes",
+            "tomato puree",
+        ]
+        assert self.names(self.index.fuzzy("choped tom")) == ["chopped tomatoes"]
+        assert self.index.fuzzy("xyz") == []
+
+
+class IngredientSearchTest(TransactionTestCase):
+    def setUp(self):
+        search_index.clear()
+        for name, category in (("onion", "fresh"), ("red onion", "fresh")):
+            Ingredient.objects.create(
+                category=category, name=name, unit="g", cost_per_unit=1, available=True
+            )
+
+    def test_searches_by_prefix_then_fuzzy(self):
+        response = self.client.get("/ingredient/search/", {"q": "oni", "limit": 5})
+        assert response.status_code == HTTPStatus.OK
+        assert [
+            (result["name"], result["match"]) for result in response.json()["results"]
+        ] == [("onion", "prefix"), ("red onion", "prefix")]
+
+        response = self.client.get("/ingredient/search/", {"q": "onnion"})
+        assert [result["name"] for result in response.json()["results"]] == [
+            "onion",
+            "red onion",
+        ]
+
+    def test_keeps_the_index_until_searched_fields_change(self):
+        self.client.get("/ingredient/search/", {"q": "onion"})
+        Ingredient.objects.filter(name="onion").update(cost_per_unit=2)
+        with self.assertNumQueries(0):
+            self.client.get("/ingredient/search/", {"q": "onion"})
+
+        self.client.patch("/ingredient/onion/flag_unavailable/")
+        with self.assertNumQueries(1):
+            response = self.client.get(
+                "/ingredient/search/", {"q": "onion", "available": "true"}
+            )
+        assert [result["name"] for result in response.json()["results"]] == [
+            "red onion"
+        ]
+
+    def test_validates_query(self):
+        response = self.client.get("/ingredient/search/", {"limit": 1000})
+        assert response.status_code == HTTPStatus.BAD_REQUEST
+        assert set(response.json()) == {"q", "limit"}
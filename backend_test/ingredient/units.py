@@ -0,0 +1,89 @@
+"""
+Conversion of quantities between units.
+
+Every unit has a factor to the base unit of its dimension, grams for mass and
+millilitres for volume. The factor between every pair of units of the same
+dimension is worked out once, when the module is imported, so a conversion is
+a dict lookup and a multiplication. Mass and volume convert into each other
+through an ingredient's density, in grams per millilitre.
+
+Quantities are converted to the ingredient's own unit when they are written,
+so totals never have to convert anything.
+"""
+
+from decimal import ROUND_HALF_UP, Decimal
+
+MASS = "mass"
+VOLUME = "volume"
+
+BASE_UNITS = {MASS: "g", VOLUME: "ml"}
+
+# Dimension and size in the base unit of every unit quantities can be given in
+FACTORS = {
+    "mg": (MASS, Decimal("0.001")),
+    "g": (MASS, Decimal("1")),
+    "kg": (MASS, Decimal("1000")),
+    "oz": (MASS, Decimal("28.349523125")),
+    "lb": (MASS, Decimal("453.59237")),
+    "ml": (VOLUME, Decimal("1")),
+    "cl": (VOLUME, Decimal("10")),
+    "dl": (VOLUME, Decimal("100")),
+    "l": (VOLUME, Decimal("1000")),
+    "tsp": (VOLUME, Decimal("5")),
+    "tbsp": (VOLUME, Decimal("15")),
+    "cup": (VOLUME, Decimal("240")),
+    "fl_oz": (VOLUME, Decimal("29.5735295625")),
+    "pint": (VOLUME, Decimal("473.176473")),
+}
+
+UNIT_CHOICES = tuple((unit, unit) for unit in FACTORS)
+
+CONVERSIONS = {
+    (from_unit, to_unit): from_factor / to_factor
+    for from_unit, (from_dimension, from_factor) in FACTORS.items()
+    for to_unit, (to_dimension, to_factor) in FACTORS.items()
+    if from_dimension == to_dimension
+}
+
+QUANTITY = Decimal("0.001")
+
+
+class UnitConversionError(ValueError):
+    pass
+
+
+def convert(quantity, from_unit, to_unit, density=None):
+    """
+    Convert ``quantity`` from one unit to another. Converting between mass
+    and volume takes the ``density`` in g/ml.
+    """
+    if from_unit == to_unit:
+        return quantity
+    factor = CONVERSIONS.get((from_unit, to_unit))
+    if factor is not None:
+        return quantity * factor
+    for unit in (from_unit, to_unit):
+        if unit not in FACTORS:
+            raise UnitConversionError("Unknown unit %r." % unit)
+    if density is None:
+        raise UnitConversionError(
+            "Cannot convert %s to %s without a density." % (from_unit, to_unit)
+        )
+    if FACTORS[from_unit][0] == MASS:
+        millilitres = quantity * CONVERSIONS[from_unit, "g"] / density
+        return millilitres * CONVERSIONS["ml", to_unit]
+    grams = quantity * CONVERSIONS[from_unit, "ml"] * density
+    return grams * CONVERSIONS["g", to_unit]
+
+
+def normalize_quantity(quantity, unit, ingredient_unit, density=None):
+    """
+    Return ``quantity`` given in ``unit`` in the ingredient's unit, rounded
+    to the places items store. No ``unit`` means the ingredient's.
+    """
+    if unit is None or unit == ingredient_unit:
+        return quantity
+    if not ingredient_unit:
+        raise UnitConversionError("The ingredient has no unit to convert to.")
+    quantity = convert(quantity, unit, ingredient_unit, density)
+    return quantity.quantize(QUANTITY, rounding=ROUND_HALF_UP)
@@ -1,11 +1,19 @@
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
-from . import views
+from . import async_views, views
 
 router = DefaultRouter()
 router.register(r"ingredient", views.IngredientViewSet)
 
 urlpatterns = [
     path("", include(router.urls)),
+    path(
+        "async/ingredient/<str:name>/new_cost_per_unit/",
+        async_views.new_cost_per_unit,
+    ),
+    path(
+        "async/ingredient/<str:name>/flag_unavailable/",
+        async_views.flag_unavailable,
+    ),
 ]
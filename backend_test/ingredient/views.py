@@ -1,43 +1,161 @@
 from rest_framework import mixins, viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotAuthenticated
+from rest_framework.parsers import JSONParser
 from rest_framework.response import Response
 
+from backend_test.routers import use_replica
+from jobs.models import Job
+from jobs.views import job_accepted
+
 from .models import Ingredient
-from .serializers import IngredientSerializer, QueryParamSerializer
+from .pagination import IngredientCursorPagination
+from .parsers import CSVParser
+from .preconditions import etag, if_match_versions, update_ingredient
+from .search import search_index
+from .serializers import (
+    IngredientFilterSerializer,
+    IngredientSearchSerializer,
+    IngredientSerializer,
+    QueryParamSerializer,
+    read_price_sheet,
+    report_price_sheet,
+)
 
 
 class IngredientViewSet(
     mixins.CreateModelMixin,
+    mixins.ListModelMixin,
     viewsets.GenericViewSet,
 ):
+    """
+    The ingredient catalog.
+
+    list:
+    Page through ingredients ordered by name. Follow the "next" link to get
+    the following page. Filter with ?category=, ?unit=, ?available=true|false,
+    ?min_price= and ?max_price=, and size pages with ?page_size= (max 1000).
+
+    create:
+    Add an ingredient to the catalog.
+
+    new_cost_per_unit:
+    Set the cost per unit to ?price=. Send the ETag of an earlier response
+    in If-Match to only update the version it came from, or get a 412.
+
+    flag_unavailable:
+    Flag the ingredient as no longer available. Takes If-Match like
+    new_cost_per_unit.
+
+    search:
+    Autocomplete ?q= against ingredient names and the words in them, falling
+    back to fuzzy matches. Filter with ?category= and ?available=true|false,
+    return at most ?limit= (default 10, max 100) results and turn fuzzy
+    matching off with ?fuzzy=false. Each result says whether it was a
+    "prefix" or a "fuzzy" match.
+    """
+
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     lookup_field = "name"
+    pagination_class = IngredientCursorPagination
+    # Most queries each action may run, see backend_test.metrics. Session
+    # authentication accounts for two of them, writes include logging them to
+    # the change feed, and price and availability changes include
+    # recalculating one batch of shopping lists.
+    query_budgets = {
+        "list": 3,
+        "create": 6,
+        "search": 1,
+        "new_cost_per_unit": 11,
+        "flag_unavailable": 11,
+    }
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == "list":
+            filters = IngredientFilterSerializer(data=self.request.query_params.dict())
+            filters.is_valid(raise_exception=True)
+            queryset = self.filter_queryset_by(queryset, **filters.validated_data)
+        return queryset
+
+    @staticmethod
+    def filter_queryset_by(
+        queryset,
+        category=None,
+        unit=None,
+        available=None,
+        min_price=None,
+        max_price=None,
+    ):
+        if category is not None:
+            queryset = queryset.filter(category=category)
+        if unit is not None:
+            queryset = queryset.filter(unit=unit)
+        if available is not None:
+            queryset = queryset.filter(available=available)
+        if min_price is not None:
+            queryset = queryset.filter(cost_per_unit__gte=min_price)
+        if max_price is not None:
+            queryset = queryset.filter(cost_per_unit__lte=max_price)
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        with use_replica():
+            return super().list(request, *args, **kwargs)
+
+    @action(detail=False, methods=["get"])
+    def search(self, request, **kwargs):
+        query_params = IngredientSearchSerializer(data=request.query_params.dict())
+        query_params.is_valid(raise_exception=True)
+        options = query_params.validated_data
+        return Response({"results": search_index.search(options.pop("q"), **options)})
 
     @action(detail=True, methods=["patch"])
     def new_cost_per_unit(self, request, **kwargs):
-        instance = self.get_object()
         query_params = QueryParamSerializer(data=self.request.query_params)
         query_params.is_valid(raise_exception=True)
-        ingredient = self.get_serializer(
-            instance,
-            data={"cost_per_unit": query_params.validated_data["price"]},
-            partial=True,
-        )
-        ingredient.is_valid(raise_exception=True)
-        ingredient.save()
-        updated_ingredient = self.get_serializer(self.get_object())
-        return Response(updated_ingredient.data)
+        return self.update_response(cost_per_unit=query_params.validated_data["price"])
 
     @action(detail=True, methods=["patch"])
     def flag_unavailable(self, request, **kwargs):
-        instance = self.get_object()
-        ingredient = self.get_serializer(
-            instance,
-            data={"available": False},
-            partial=True,
+        return self.update_response(available=False)
+
+    def update_response(self, **changes):
+        # One UPDATE ... RETURNING, so concurrent updates never overwrite
+        # each other's fields and clients can make them conditional
+        ingredient = update_ingredient(
+            self.kwargs[self.lookup_field], if_match_versions(self.request), **changes
         )
-        ingredient.is_valid(raise_exception=True)
-        ingredient.save()
-        updated_ingredient = self.get_serializer(self.get_object())
-        return Response(updated_ingredient.data)
+        return Response(
+            self.get_serializer(ingredient).data, headers={"ETag": etag(ingredient)}
+        )
+
+    @action(detail=False, methods=["post"], parser_classes=[JSONParser, CSVParser])
+    def bulk_cost_per_unit(self, request, **kwargs):
+        """
+        Update the cost per unit of many ingredients in one transaction.
+
+        The body is either a JSON object mapping ingredient names to prices,
+        a JSON list of {"name": ..., "price": ...} rows, or CSV with "name"
+        and "price" columns. Every row is reported back with a status of
+        "updated", "unchanged", "not_found" or "invalid".
+
+        With ?background=true large sheets are applied by a background job
+        instead, a batch of rows per transaction. Responds with 202 Accepted
+        and the job, follow its progress at the Location given. Only the
+        authenticated user who queued it can.
+        """
+        results, prices = read_price_sheet(request.data)
+        if request.query_params.get("background") == "true":
+            if not request.user.is_authenticated:
+                raise NotAuthenticated()
+            return job_accepted(
+                Job.objects.enqueue(
+                    "ingredient.bulk_cost_per_unit",
+                    user=request.user,
+                    rows=request.data,
+                )
+            )
+        statuses = Ingredient.objects.update_prices(prices)
+        return Response(report_price_sheet(results, prices, statuses))
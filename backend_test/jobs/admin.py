@@ -0,0 +1,9 @@
+from django.contrib import admin
+
+from jobs.models import Job
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ["name", "status", "progress", "total", "attempts", "created_at"]
+    list_filter = ["status", "name"]
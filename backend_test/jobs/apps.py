@@ -0,0 +1,12 @@
+from django.apps import AppConfig
+from django.utils.module_loading import autodiscover_modules
+
+
+class JobsAppConfig(AppConfig):
+
+    name = "jobs"
+    verbose_name = "Jobs"
+
+    def ready(self):
+        # Apps register their jobs in a tasks module, see jobs.registry
+        autodiscover_modules("tasks")
@@ -0,0 +1,82 @@
+import multiprocessing
+import os
+import socket
+import threading
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from jobs.worker import Worker
+
+
+def run_worker(index, options, stop):
+    name = "%s:%d:%d" % (socket.gethostname(), os.getpid(), index)
+    try:
+        Worker(name, options["poll_interval"], options["stale_after"]).run(
+            options["burst"], stop
+        )
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs in a pool of worker threads or processes."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=1,
+            help="Number of jobs to run at once.",
+        )
+        parser.add_argument(
+            "--processes",
+            action="store_true",
+            help="Run each job in a worker process instead of a thread, for "
+            "CPU-bound jobs.",
+        )
+        parser.add_argument(
+            "--burst",
+            action="store_true",
+            help="Stop once no jobs are due instead of waiting for more.",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=1.0,
+            help="Seconds to wait before looking for jobs again when none are due.",
+        )
+        parser.add_argument(
+            "--stale-after",
+            type=int,
+            default=600,
+            help="Seconds without progress after which a running job is requeued.",
+        )
+
+    def handle(self, *args, **options):
+        if options["processes"]:
+            context = multiprocessing.get_context("fork")
+            stop = context.Event()
+            # Forked workers must not share the parent's connections
+            connections.close_all()
+            workers = [
+                context.Process(target=run_worker, args=(index, options, stop))
+                for index in range(options["concurrency"])
+            ]
+        else:
+            stop = threading.Event()
+            workers = [
+                threading.Thread(target=run_worker, args=(index, options, stop))
+                for index in range(options["concurrency"])
+            ]
+        for worker in workers:
+            worker.start()
+        try:
+            for worker in workers:
+                worker.join()
+        except KeyboardInterrupt:
+            self.stderr.write("Stopping once the running jobs finish.")
+            stop.set()
+            for worker in workers:
+                worker.join()
+        self.stdout.write(self.style.SUCCESS("Stopped %d workers." % len(workers)))
@@ -0,0 +1,171 @@
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import models
+from django.db.models import F
+from django.utils import timezone
+from django.utils.translation import ugettext_lazy as _
+from rest_framework.utils.encoders import JSONEncoder
+
+from .registry import get_task
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+STATUSES = (
+    (QUEUED, "queued"),
+    (RUNNING, "running"),
+    (SUCCEEDED, "succeeded"),
+    (FAILED, "failed"),
+)
+
+
+def get_retry_delay(attempts):
+    # Doubles with every failed attempt
+    delay = getattr(settings, "JOBS_RETRY_DELAY", 30)
+    return timedelta(seconds=delay * 2 ** (attempts - 1))
+
+
+class JobQuerySet(models.QuerySet):
+    def enqueue(self, name, run_after=None, user=None, **arguments):
+        """
+        Queue a run of the task ``name`` with ``arguments``, see jobs.registry,
+        due at ``run_after``, or now, for ``user`` to follow.
+        """
+        return self.create(
+            name=name,
+            arguments=arguments,
+            user=user,
+            max_attempts=get_task(name).max_attempts,
+            run_after=run_after or timezone.now(),
+        )
+
+    def claim(self, worker):
+        """Mark the next job that is due as running on ``worker`` and return it."""
+        now = timezone.now()
+        due = (
+            self.filter(status=QUEUED, run_after__lte=now)
+            .order_by("run_after")
+            .values_list("pk", flat=True)
+        )
+        # Another worker may claim a job first, then try the next one
+        for pk in due[:10]:
+            claimed = self.filter(pk=pk, status=QUEUED).update(
+                status=RUNNING,
+                worker=worker,
+                attempts=F("attempts") + 1,
+                started_at=now,
+                heartbeat_at=now,
+            )
+            if claimed:
+                return self.get(pk=pk)
+        return None
+
+    claim.alters_data = True
+
+    def requeue_stale(self, stale_after):
+        """
+        Queue running jobs again that have not reported progress for
+        ``stale_after``, as their worker has likely died, or fail them once
+        out of attempts.
+        """
+        stale = self.filter(
+            status=RUNNING, heartbeat_at__lt=timezone.now() - stale_after
+        )
+        error = "The worker stopped reporting progress."
+        failed = stale.filter(attempts__gte=F("max_attempts")).update(
+            status=FAILED, error=error, finished_at=timezone.now()
+        )
+        return failed + stale.update(status=QUEUED, error=error)
+
+    requeue_stale.alters_data = True
+
+
+class Job(models.Model):
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+
+    # The registered task to run, see jobs.registry
+    name = models.CharField(_("Task"), max_length=100)
+
+    arguments = models.JSONField(default=dict, encoder=JSONEncoder)
+
+    # Who queued the job through the API, the only one who may follow it
+    user = models.ForeignKey(
+        get_user_model(), on_delete=models.SET_NULL, null=True, blank=True
+    )
+
+    status = models.CharField(choices=STATUSES, max_length=16, default=QUEUED)
+
+    attempts = models.PositiveIntegerField(default=0)
+
+    max_attempts = models.PositiveIntegerField(default=3)
+
+    # Units of work done out of total, whatever the task counts
+    progress = models.PositiveIntegerField(default=0)
+
+    total = models.PositiveIntegerField(null=True, blank=True)
+
+    result = models.JSONField(null=True, blank=True, encoder=JSONEncoder)
+
+    error = models.TextField(blank=True)
+
+    worker = models.CharField(max_length=255, blank=True)
+
+    created_at = models.DateTimeField(default=timezone.now)
+
+    run_after = models.DateTimeField(default=timezone.now)
+
+    started_at = models.DateTimeField(null=True, blank=True)
+
+    # Updated with progress, running jobs that stop updating it are requeued
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    objects = JobQuerySet.as_manager()
+
+    def __str__(self):
+        return "%s %s" % (self.name, self.pk)
+
+    class Meta:
+        indexes = [
+            # Finds the next job that is due
+            models.Index(fields=["status", "run_after"], name="job_queue_idx"),
+        ]
+
+    def _finish(self, **fields):
+        # A job requeued as stale may be running on another worker by now
+        Job.objects.filter(pk=self.pk, status=RUNNING, worker=self.worker).update(
+            **fields
+        )
+        for field, value in fields.items():
+            setattr(self, field, value)
+
+    def report_progress(self, progress, total=None):
+        """
+        Record the progress of a running job, and that it is still alive.
+        Call it outside transactions, or readers only see it once they commit.
+        """
+        fields = {"progress": progress, "heartbeat_at": timezone.now()}
+        if total is not None:
+            fields["total"] = total
+        Job.objects.filter(pk=self.pk).update(**fields)
+        for field, value in fields.items():
+            setattr(self, field, value)
+
+    def succeed(self, result):
+        self._finish(status=SUCCEEDED, result=result, finished_at=timezone.now())
+
+    def fail(self, error):
+        """Record a failed attempt, and queue the job again if it has attempts left."""
+        if self.attempts < self.max_attempts:
+            self._finish(
+                status=QUEUED,
+                error=error,
+                run_after=timezone.now() + get_retry_delay(self.attempts),
+            )
+        else:
+            self._finish(status=FAILED, error=error, finished_at=timezone.now())
@@ -0,0 +1,35 @@
+"""
+Functions that jobs run, by name.
+
+Apps register them in their ``tasks`` module:
+
+    @task("shopping.rebuild_total_costs")
+    def rebuild_total_costs(job, batch_size=1000):
+        ...
+
+and queue a run with Job.objects.enqueue("shopping.rebuild_total_costs",
+batch_size=500). A task is called with its Job and the job's arguments, and
+what it returns, which must serialize to JSON, is kept as the job's result.
+It can call job.report_progress() as it goes. Tasks that raise are retried,
+so they should be safe to run again.
+"""
+
+tasks = {}
+
+
+def task(name, max_attempts=3):
+    """Register the decorated function as the task ``name``."""
+
+    def register(function):
+        function.max_attempts = max_attempts
+        tasks[name] = function
+        return function
+
+    return register
+
+
+def get_task(name):
+    try:
+        return tasks[name]
+    except KeyError:
+        raise LookupError("No task is registered as %r." % name) from None
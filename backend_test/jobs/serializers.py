@@ -0,0 +1,25 @@
+from rest_framework import serializers
+
+from backend_test.metrics import TimedSerializerMixin
+
+from .models import Job
+
+
+class JobSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    class Meta:
+        model = Job
+        fields = [
+            "id",
+            "name",
+            "status",
+            "progress",
+            "total",
+            "attempts",
+            "max_attempts",
+            "result",
+            "error",
+            "created_at",
+            "started_at",
+            "finished_at",
+        ]
+        read_only_fields = fields
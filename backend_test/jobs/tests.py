@@ -0,0 +1,115 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from . import models
+from .models import Job
+from .registry import get_task, task
+from .worker import Worker
+
+
+@task("jobs.tests.count", max_attempts=2)
+def count(job, to, fail=0):
+    if job.attempts <= fail:
+        raise ValueError("Attempt %d failed." % job.attempts)
+    for number in range(1, to + 1):
+        job.report_progress(number, to)
+    return {"counted": to}
+
+
+@override_settings(JOBS_RETRY_DELAY=0)
+class WorkerTest(TestCase):
+    def setUp(self):
+        self.worker = Worker("test")
+
+    def test_runs_job(self):
+        job = Job.objects.enqueue("jobs.tests.count", to=3)
+        assert job.max_attempts == 2
+        assert self.worker.run_next()
+        assert not self.worker.run_next()
+        job.refresh_from_db()
+        assert job.status == models.SUCCEEDED
+        assert (job.progress, job.total) == (3, 3)
+        assert job.result == {"counted": 3}
+        assert job.attempts == 1
+        assert job.worker == "test"
+        assert job.finished_at is not None
+
+    def test_retries_failed_job(self):
+        job = Job.objects.enqueue("jobs.tests.count", to=1, fail=1)
+        with self.assertLogs("jobs.worker", "ERROR"):
+            assert self.worker.run_next()
+        job.refresh_from_db()
+        assert job.status == models.QUEUED
+        assert job.error == "ValueError: Attempt 1 failed."
+        assert self.worker.run_next()
+        job.refresh_from_db()
+        assert job.status == models.SUCCEEDED
+        assert job.attempts == 2
+
+    def test_fails_job_out_of_attempts(self):
+        job = Job.objects.enqueue("jobs.tests.count", to=1, fail=2)
+        with self.assertLogs("jobs.worker", "ERROR") as logs:
+            assert self.worker.run_next()
+            assert self.worker.run_next()
+        assert len(logs.records) == 2
+        assert not self.worker.run_next()
+        job.refresh_from_db()
+        assert job.status == models.FAILED
+        assert job.error == "ValueError: Attempt 2 failed."
+        assert job.result is None
+
+    @override_settings(JOBS_RETRY_DELAY=60)
+    def test_delays_retries(self):
+        Job.objects.enqueue("jobs.tests.count", to=1, fail=1)
+        with self.assertLogs("jobs.worker", "ERROR"):
+            assert self.worker.run_next()
+        assert not self.worker.run_next()
+        assert models.get_retry_delay(3) == timedelta(seconds=240)
+
+    def test_requeues_stale_jobs(self):
+        job = Job.objects.enqueue("jobs.tests.count", to=1)
+        claimed = Job.objects.claim("dead")
+        assert claimed == job
+        assert Job.objects.claim("test") is None
+        Job.objects.filter(pk=job.pk).update(
+            heartbeat_at=timezone.now() - timedelta(hours=1)
+        )
+        assert self.worker.run_next()
+        job.refresh_from_db()
+        assert job.status == models.SUCCEEDED
+        assert job.worker == "test"
+
+        # The dead worker's late result is ignored
+        claimed.succeed({"counted": 0})
+        job.refresh_from_db()
+        assert job.result == {"counted": 1}
+
+    def test_fails_stale_jobs_out_of_attempts(self):
+        job = Job.objects.enqueue("jobs.tests.count", to=1)
+        Job.objects.filter(pk=job.pk).update(
+            status=models.RUNNING,
+            attempts=2,
+            heartbeat_at=timezone.now() - timedelta(hours=1),
+        )
+        assert not self.worker.run_next()
+        job.refresh_from_db()
+        assert job.status == models.FAILED
+
+    def test_unknown_task(self):
+        with self.assertRaises(LookupError):
+            get_task("jobs.tests.missing")
+
+
+@override_settings(JOBS_RETRY_DELAY=0)
+class RunJobsCommandTest(TransactionTestCase):
+    def test_run_jobs_command(self):
+        Job.objects.enqueue("jobs.tests.count", to=1)
+        Job.objects.enqueue("jobs.tests.count", to=2)
+        stdout = StringIO()
+        call_command("run_jobs", "--burst", "--concurrency", "2", stdout=stdout)
+        assert "Stopped 2 workers." in stdout.getvalue()
+        assert set(Job.objects.values_list("status", flat=True)) == {models.SUCCEEDED}
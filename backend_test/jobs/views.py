@@ -0,0 +1,36 @@
+from django.urls import reverse
+from rest_framework import mixins, permissions, status, viewsets
+from rest_framework.response import Response
+
+from .models import Job
+from .serializers import JobSerializer
+
+
+def job_accepted(job):
+    """Respond to a request that queued ``job`` with where to follow it."""
+    return Response(
+        JobSerializer(job).data,
+        status=status.HTTP_202_ACCEPTED,
+        headers={"Location": reverse("job-detail", args=[job.pk])},
+    )
+
+
+class JobViewSet(mixins.RetrieveModelMixin, viewsets.GenericViewSet):
+    """
+    Background jobs, of the authenticated user.
+
+    retrieve:
+    Return the job's status ("queued", "running", "succeeded" or "failed"),
+    its progress out of its total, when known, and its result once it has
+    succeeded or the error of its last attempt.
+    """
+
+    queryset = Job.objects.all()
+    serializer_class = JobSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    # Most queries each action may run, see backend_test.metrics. Session
+    # authentication accounts for two of them.
+    query_budgets = {"retrieve": 3}
+
+    def get_queryset(self):
+        return super().get_queryset().filter(user=self.request.user)
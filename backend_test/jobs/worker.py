@@ -0,0 +1,60 @@
+"""
+Running queued jobs, see the run_jobs command.
+
+Workers poll the Job table for jobs that are due and claim one with an
+UPDATE that only succeeds for the first of them, so any number of workers in
+any number of processes can share the queue. Failed jobs are queued again
+after a delay that doubles with every attempt, until they run out of
+attempts. Running jobs that stop reporting progress are requeued, as their
+worker has most likely died.
+"""
+
+import logging
+import threading
+from datetime import timedelta
+
+from django.db import close_old_connections
+
+from .models import Job
+from .registry import get_task
+
+logger = logging.getLogger(__name__)
+
+
+def run_job(job):
+    """Run a claimed job and record how it went."""
+    try:
+        result = get_task(job.name)(job, **job.arguments)
+    except Exception as error:
+        logger.exception("Job %s (%s) failed", job.pk, job.name)
+        job.fail("%s: %s" % (type(error).__name__, error))
+    else:
+        job.succeed(result)
+
+
+class Worker:
+    def __init__(self, name, poll_interval=1.0, stale_after=600):
+        self.name = name
+        self.poll_interval = poll_interval
+        self.stale_after = timedelta(seconds=stale_after)
+
+    def run_next(self):
+        """Run the next job that is due, and return whether there was one."""
+        Job.objects.requeue_stale(self.stale_after)
+        job = Job.objects.claim(self.name)
+        if job is None:
+            return False
+        run_job(job)
+        return True
+
+    def run(self, burst=False, stop=None):
+        """Run jobs until ``stop`` is set, or with ``burst`` until none are due."""
+        stop = stop or threading.Event()
+        while not stop.is_set():
+            # Jobs run outside Django's request handling, so close
+            # connections between them like it does
+            close_old_connections()
+            if not self.run_next():
+                if burst:
+                    return
+                stop.wait(self.poll_interval)
@@ -8,9 +8,11 @@ from shopping.models import (
 
 @admin.register(ShoppingListItem)
 class ShoppingListItemAdmin(admin.ModelAdmin):
-    pass
+    list_select_related = ["shopping_list", "ingredient"]
 
 
 @admin.register(ShoppingList)
 class ShoppingListAdmin(admin.ModelAdmin):
-    pass
+    list_display = ["title", "user", "total_cost"]
+    list_select_related = ["user"]
+    readonly_fields = ["total_cost"]
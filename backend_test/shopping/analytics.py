@@ -0,0 +1,175 @@
+"""
+Spend reports and price simulations across every shopping list.
+
+Item rows are aggregated by the database with GROUP BY queries, so only a
+row per group comes back to Python.
+"""
+
+import heapq
+from collections import defaultdict
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db.models import Count, Q, Sum, Value
+from django.db.models.functions import Coalesce
+
+from ingredient.loaders import chunked
+from ingredient.models import LOOKUP_BATCH_SIZE, Ingredient
+
+from .functions import ScaledTotalCost, TotalCost
+from .models import ShoppingList, ShoppingListItem
+
+PENNY = Decimal("0.01")
+ZERO = Decimal("0.00")
+# Of the sums of ScaledTotalCost
+COST_PLACES = (
+    Ingredient._meta.get_field("cost_per_unit").decimal_places
+    + ShoppingListItem._meta.get_field("quantity").decimal_places
+)
+
+GROUPS = {
+    "category": "ingredient__category",
+    "unit": "ingredient__unit",
+    "user": "shopping_list__user__username",
+}
+
+
+def spend_by(group, items=None):
+    """Spend on available ingredients grouped by category, unit or user."""
+    if items is None:
+        items = ShoppingListItem.objects.all()
+    field = GROUPS[group]
+    rows = (
+        items.filter(ingredient__available=True)
+        .values(field)
+        .annotate(
+            items=Count("pk"),
+            spend=Coalesce(
+                TotalCost("ingredient__cost_per_unit", "quantity"), Value(ZERO)
+            ),
+        )
+        .order_by("-spend", field)
+    )
+    return [
+        {group: row[field], "items": row["items"], "spend": row["spend"]}
+        for row in rows
+    ]
+
+
+def most_expensive_lists(limit=10, shopping_lists=None):
+    if shopping_lists is None:
+        shopping_lists = ShoppingList.objects.all()
+    rows = shopping_lists.order_by("-total_cost", "pk").values_list(
+        "user__username", "title", "total_cost"
+    )[:limit]
+    return [
+        {"user": user, "title": title, "total_cost": total_cost}
+        for user, title, total_cost in rows
+    ]
+
+
+def spend_report(limit=10):
+    totals = ShoppingList.objects.aggregate(
+        lists=Count("pk"),
+        spend=Coalesce(Sum("total_cost"), Value(ZERO)),
+    )
+    return {
+        "lists": totals["lists"],
+        "spend": totals["spend"],
+        "by_category": spend_by("category"),
+        "by_unit": spend_by("unit"),
+        "by_user": spend_by("user"),
+        "most_expensive_lists": most_expensive_lists(limit),
+    }
+
+
+def round_cost(value):
+    return value.quantize(PENNY, rounding=ROUND_HALF_UP)
+
+
+def simulate_prices(prices, limit=100):
+    """
+    Work out how candidate prices, {ingredient name: price}, would change
+    list totals, without saving them.
+
+    Returns a status per name ("changed", "unchanged", "unavailable" or
+    "not_found") and the aggregate and per-list deltas, keeping the
+    ``limit`` lists that change the most. Simulated totals are the exact sums
+    of the items plus the change, rounded half up to the penny once, like the
+    totals.
+    """
+    statuses = dict.fromkeys(prices, "not_found")
+    price_deltas = {}
+    for names in chunked(prices, LOOKUP_BATCH_SIZE):
+        ingredients = Ingredient.objects.filter(name__in=names).values_list(
+            "pk", "name", "cost_per_unit", "available"
+        )
+        for pk, name, cost_per_unit, available in ingredients:
+            if not available:
+                # Left out of totals whatever it costs
+                statuses[name] = "unavailable"
+            elif cost_per_unit == prices[name]:
+                statuses[name] = "unchanged"
+            else:
+                statuses[name] = "changed"
+                # Unpriced ingredients add nothing to the current totals
+                price_deltas[pk] = prices[name] - (cost_per_unit or 0)
+
+    # The one pass over items: quantities of the changed ingredients per list
+    list_deltas = defaultdict(Decimal)
+    for ingredient_ids in chunked(price_deltas, LOOKUP_BATCH_SIZE):
+        quantities = (
+            ShoppingListItem.objects.filter(ingredient__in=ingredient_ids)
+            .values_list("shopping_list_id", "ingredient_id")
+            .annotate(quantity=Sum("quantity"))
+            .order_by()
+        )
+        for shopping_list_id, ingredient_id, quantity in quantities:
+            list_deltas[shopping_list_id] += price_deltas[ingredient_id] * quantity
+
+    total_cost = ZERO
+    simulated_total_cost = ZERO
+    changes = []
+    for shopping_list_ids in chunked(list_deltas, LOOKUP_BATCH_SIZE):
+        totals = (
+            ShoppingList.objects.filter(pk__in=shopping_list_ids)
+            .annotate(
+                exact_total_cost=ScaledTotalCost(
+                    "items__ingredient__cost_per_unit",
+                    "items__quantity",
+                    filter=Q(items__ingredient__available=True),
+                )
+            )
+            .values_list("pk", "total_cost", "exact_total_cost")
+        )
+        for pk, current, exact in totals:
+            exact = Decimal(exact or 0).scaleb(-COST_PLACES)
+            simulated = round_cost(exact + list_deltas[pk])
+            total_cost += current
+            simulated_total_cost += simulated
+            changes.append((simulated - current, pk, current, simulated))
+
+    largest = heapq.nlargest(limit, changes, key=lambda change: abs(change[0]))
+    labels = {}
+    for shopping_list_ids in chunked(
+        (change[1] for change in largest), LOOKUP_BATCH_SIZE
+    ):
+        rows = ShoppingList.objects.filter(pk__in=shopping_list_ids).values_list(
+            "pk", "user__username", "title"
+        )
+        labels.update((pk, (user, title)) for pk, user, title in rows)
+    return statuses, {
+        "lists": len(changes),
+        "total_cost": total_cost,
+        "simulated_total_cost": simulated_total_cost,
+        "delta": simulated_total_cost - total_cost,
+        "shopping_lists": [
+            {
+                "user": labels[pk][0],
+                "title": labels[pk][1],
+                "total_cost": current,
+                "simulated_total_cost": simulated,
+                "delta": delta,
+            }
+            for delta, pk, current, simulated in largest
+        ],
+    }
@@ -5,3 +5,6 @@ class ShoppingAppConfig(AppConfig):
 
     name = "shopping"
     verbose_name = "Shopping"
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,111 @@
+"""
+Async version of shopping list retrieval, for serving under ASGI.
+
+Django 3.2 has no async ORM, so the session, user and list lookups of a
+request run in a single sync_to_async hop. Only session authentication is
+supported.
+"""
+
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse, HttpResponseNotAllowed, JsonResponse
+from django.shortcuts import get_object_or_404
+from rest_framework.utils.encoders import JSONEncoder
+
+from backend_test.async_views import json_errors
+
+from . import cache, events
+from .models import ShoppingList
+from .serializers import ShoppingListSerializer
+
+# Seconds a long poll waits for a change, by default and at most
+LONG_POLL_TIMEOUT = 30
+MAX_LONG_POLL_TIMEOUT = 60
+
+FORBIDDEN = {"detail": "Authentication credentials were not provided."}
+
+
+def authenticated_user(request):
+    user = request.user
+    return user if user.is_authenticated else None
+
+
+def load_shopping_list(request, title):
+    user = request.user
+    if not user.is_authenticated:
+        return None
+
+    def load():
+        instance = get_object_or_404(ShoppingList, user=user, title=title)
+        return {
+            "data": ShoppingListSerializer(instance).data,
+            "etag": cache.etag(instance),
+        }
+
+    return cache.get_or_set(user.pk, title, load)
+
+
+@json_errors
+async def shopping_list_detail(request, title):
+    """GET the authenticated user's list with this title and its total cost."""
+    if request.method != "GET":
+        return HttpResponseNotAllowed(["GET"])
+    cached = await sync_to_async(load_shopping_list)(request, title)
+    if cached is None:
+        return JsonResponse(FORBIDDEN, status=403)
+    return detail_response(request, cached)
+
+
+def detail_response(request, cached):
+    if cache.is_not_modified(request, cached["etag"]):
+        response = HttpResponse(status=304)
+    else:
+        response = JsonResponse(cached["data"], encoder=JSONEncoder)
+    response["ETag"] = cached["etag"]
+    return response
+
+
+@json_errors
+async def shopping_list_changes(request, title):
+    """
+    Long-poll the authenticated user's list with this title for changes.
+
+    Send the ETag of the version you have in If-None-Match. Responds with the
+    list as soon as it has another version, or with 304 Not Modified after
+    ?timeout= seconds (default 30, max 60) without a change.
+    """
+    if request.method != "GET":
+        return HttpResponseNotAllowed(["GET"])
+    timeout = request.GET.get("timeout", str(LONG_POLL_TIMEOUT))
+    if not timeout.isdigit() or int(timeout) > MAX_LONG_POLL_TIMEOUT:
+        return JsonResponse(
+            {
+                "timeout": [
+                    "Must be a whole number of seconds up to %d."
+                    % MAX_LONG_POLL_TIMEOUT
+                ]
+            },
+            status=400,
+        )
+    user = await sync_to_async(authenticated_user)(request)
+    if user is None:
+        return JsonResponse(FORBIDDEN, status=403)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + int(timeout)
+    # Subscribe before reading the list, so no change is missed in between
+    with events.get_broker().subscribe(cache.cache_key(user.pk, title)) as changes:
+        cached = await sync_to_async(load_shopping_list)(request, title)
+        while cache.is_not_modified(request, cached["etag"]):
+            try:
+                await changes.get(max(deadline - loop.time(), 0))
+            except asyncio.TimeoutError:
+                break
+            cached = await sync_to_async(load_shopping_list)(request, title)
+    return detail_response(request, cached)
+
+
+# See backend_test.metrics, session authentication accounts for two
+shopping_list_detail.query_budget = 3
+# And each change while waiting may take another
+shopping_list_changes.query_budget = 4
@@ -0,0 +1,62 @@
+"""
+Cache of shopping list retrieve responses.
+
+Entries are keyed by owner and title, which is how ShoppingViewSet looks
+lists up, and are dropped whenever the list or its total changes. Dropping
+an entry also notifies the subscribers to its key, see shopping.events.
+"""
+
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.http import parse_etags
+
+from . import events
+
+
+def get_cache():
+    return caches[getattr(settings, "SHOPPING_CACHE_ALIAS", "default")]
+
+
+def get_timeout():
+    return getattr(settings, "SHOPPING_CACHE_TIMEOUT", 300)
+
+
+def cache_key(user_id, title):
+    digest = hashlib.md5(title.encode()).hexdigest()
+    return "shopping:list:%s:%s" % (user_id, digest)
+
+
+def etag(shopping_list):
+    return '"%s.%s"' % (shopping_list.pk, shopping_list.version)
+
+
+def get_or_set(user_id, title, load):
+    """Return the cached {"data": ..., "etag": ...} for a list, calling load() on a miss."""
+    key = cache_key(user_id, title)
+    cached = get_cache().get(key)
+    if cached is None:
+        cached = load()
+        get_cache().set(key, cached, get_timeout())
+    return cached
+
+
+def is_not_modified(request, etag):
+    return etag in parse_etags(request.headers.get("If-None-Match", ""))
+
+
+def invalidate(keys, using=None):
+    keys = list(keys)
+    if not keys:
+        return
+    # Delete again once the transaction commits, in case a concurrent read
+    # cached the previous version in the meantime
+    get_cache().delete_many(keys)
+
+    def committed():
+        get_cache().delete_many(keys)
+        events.publish(keys)
+
+    transaction.on_commit(committed, using=using)
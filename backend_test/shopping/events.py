@@ -0,0 +1,111 @@
+"""
+Publish and subscribe to shopping list changes.
+
+Whenever the cached retrieve response of a list is dropped (see
+shopping.cache), a message goes out on a channel named by the same cache
+key, once the transaction commits. That covers every change to the list's
+total, including its items' ingredients changing price or availability. The
+server-sent events stream (see shopping.push) and the long-poll view (see
+shopping.async_views) wait on these channels instead of clients polling.
+
+The broker is set by SHOPPING_EVENTS_BROKER, by default LocalBroker, which
+only reaches subscribers in the same process. Serving from several processes
+takes a broker that delivers between them, such as one over Redis pub/sub,
+with the same publish() and subscribe() methods.
+"""
+
+import asyncio
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+# Messages a subscriber may fall behind by, later ones are dropped as each
+# only says that the list changed
+QUEUE_SIZE = 16
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+class Subscription:
+    """Messages published on a channel while the subscription is open."""
+
+    def __init__(self, broker, channel):
+        self.broker = broker
+        self.channel = channel
+        self._loop = None
+        self._queue = None
+
+    def __enter__(self):
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue(QUEUE_SIZE)
+        self.broker.add(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        self.broker.remove(self)
+
+    def put(self, message):
+        """Deliver ``message`` from any thread."""
+        try:
+            self._loop.call_soon_threadsafe(self._put, message)
+        except RuntimeError:
+            # The subscriber's event loop has closed
+            pass
+
+    def _put(self, message):
+        if not self._queue.full():
+            self._queue.put_nowait(message)
+
+    async def get(self, timeout=None):
+        """Wait for the next message, or raise asyncio.TimeoutError."""
+        return await asyncio.wait_for(self._queue.get(), timeout)
+
+
+class LocalBroker:
+    """Delivers messages to the subscribers in this process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = defaultdict(set)
+
+    def add(self, subscription):
+        with self._lock:
+            self._subscriptions[subscription.channel].add(subscription)
+
+    def remove(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.channel, set())
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                self._subscriptions.pop(subscription.channel, None)
+
+    def publish(self, channel, message):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(channel, ()))
+        for subscription in subscriptions:
+            subscription.put(message)
+
+    def subscribe(self, channel):
+        """Return a Subscription to ``channel``, open it with a ``with`` block."""
+        return Subscription(self, channel)
+
+
+def get_broker():
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            _broker = import_string(
+                getattr(
+                    settings, "SHOPPING_EVENTS_BROKER", "shopping.events.LocalBroker"
+                )
+            )()
+        return _broker
+
+
+def publish(channels, message="changed"):
+    broker = get_broker()
+    for channel in channels:
+        broker.publish(channel, message)
@@ -0,0 +1,129 @@
+"""
+Propagate ingredient price and availability changes to shopping list totals.
+
+Changes are collected per transaction and applied once it commits, so a burst
+of updates to the same ingredient results in a single recalculation. Affected
+lists are found through the ingredient index on shopping list items and
+recalculated in batches, each batch a single UPDATE in its own transaction.
+With SHOPPING_FANOUT_IN_BACKGROUND the recalculation is queued as a job
+instead, and totals catch up once a worker has run it (see jobs.worker).
+Jobs wait SHOPPING_FANOUT_DELAY seconds before they run, and changes to
+ingredients that a queued job already covers add no job, so bursts across
+requests result in a single recalculation too. Without it, each request
+recalculates before it responds.
+"""
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.utils import timezone
+
+from jobs.models import QUEUED, Job
+
+RECALCULATE_TASK = "shopping.recalculate_total_costs"
+
+from .models import ShoppingList, ShoppingListItem
+
+
+def get_batch_size():
+    return getattr(settings, "SHOPPING_FANOUT_BATCH_SIZE", 500)
+
+
+def in_background():
+    return getattr(settings, "SHOPPING_FANOUT_IN_BACKGROUND", False)
+
+
+def get_delay():
+    return getattr(settings, "SHOPPING_FANOUT_DELAY", 1)
+
+
+class PendingRecalculation:
+    """On-commit callback that recalculates the lists of the collected ingredients."""
+
+    def __init__(self, ingredient_ids, using):
+        self.ingredient_ids = set(ingredient_ids)
+        self.using = using
+        self.done = False
+
+    def __call__(self):
+        self.done = True
+        if in_background():
+            enqueue(self.ingredient_ids, self.using)
+        else:
+            recalculate(self.ingredient_ids, using=self.using)
+
+
+def schedule(ingredient_ids, using=None):
+    """Recalculate lists containing these ingredients once the transaction commits."""
+    using = using or DEFAULT_DB_ALIAS
+    connection = transaction.get_connection(using)
+    if connection.in_atomic_block:
+        # Merge into the recalculation already waiting on this transaction
+        for sids, func in connection.run_on_commit:
+            if isinstance(func, PendingRecalculation) and not func.done:
+                func.ingredient_ids.update(ingredient_ids)
+                return
+    transaction.on_commit(PendingRecalculation(ingredient_ids, using), using=using)
+
+
+def enqueue(ingredient_ids, using):
+    """
+    Queue a recalculation of the ingredients no queued job covers yet. Call it
+    once the changes have committed, so that the queued jobs read them.
+    """
+    jobs = Job.objects.using(using)
+    covered = set()
+    for arguments in jobs.filter(name=RECALCULATE_TASK, status=QUEUED).values_list(
+        "arguments", flat=True
+    ):
+        if arguments["using"] == using:
+            covered.update(arguments["ingredient_ids"])
+    ingredient_ids = set(ingredient_ids) - covered
+    if ingredient_ids:
+        jobs.enqueue(
+            RECALCULATE_TASK,
+            run_after=timezone.now() + timedelta(seconds=get_delay()),
+            ingredient_ids=sorted(ingredient_ids),
+            using=using,
+        )
+
+
+def affected_shopping_list_ids(ingredient_ids, batch_size, using=None):
+    """Yield batches of ids of the lists containing any of these ingredients."""
+    items = (
+        ShoppingListItem.objects.using(using or DEFAULT_DB_ALIAS)
+        .filter(ingredient__in=ingredient_ids)
+        .order_by("shopping_list_id")
+        .values_list("shopping_list_id", flat=True)
+        .distinct()
+    )
+    last_id = 0
+    while True:
+        batch = list(items.filter(shopping_list_id__gt=last_id)[:batch_size])
+        if not batch:
+            return
+        yield batch
+        last_id = batch[-1]
+
+
+def recalculate(ingredient_ids, batch_size=None, using=None, progress=None):
+    """
+    Recalculate the totals of every list containing these ingredients, and
+    call ``progress`` with the number done after each batch.
+    """
+    using = using or DEFAULT_DB_ALIAS
+    batch_size = batch_size or get_batch_size()
+    recalculated = 0
+    for shopping_list_ids in affected_shopping_list_ids(
+        ingredient_ids, batch_size, using=using
+    ):
+        with transaction.atomic(using=using):
+            recalculated += (
+                ShoppingList.objects.using(using)
+                .filter(pk__in=shopping_list_ids)
+                .refresh_total_cost()
+            )
+        if progress is not None:
+            progress(recalculated)
+    return recalculated
@@ -0,0 +1,79 @@
+from django.db.models import BigIntegerField, DecimalField, Func, Sum
+
+
+class Cost(Func):
+    """Price times quantity of a row."""
+
+    arg_joiner = " * "
+    template = "(%(expressions)s)"
+    output_field = DecimalField()
+
+    def decimal_places(self):
+        price, quantity = self.get_source_expressions()
+        return price.output_field.decimal_places + quantity.output_field.decimal_places
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        # SQLite keeps decimals as floats, so multiply them as whole numbers
+        # of their smallest units instead, which is exact
+        scaled = []
+        params = []
+        for expression in self.get_source_expressions():
+            sql, expression_params = compiler.compile(expression)
+            scaled.append(
+                "CAST(ROUND(%s * %d) AS INTEGER)"
+                % (sql, 10**expression.output_field.decimal_places)
+            )
+            params.extend(expression_params)
+        return "(%s)" % " * ".join(scaled), params
+
+
+class TotalCost(Func):
+    """
+    Sum of price times quantity over grouped rows, exactly, rounded half away
+    from zero to the penny. NULL when there are no rows.
+    """
+
+    template = "ROUND(%(expressions)s, 2)"
+    output_field = DecimalField(max_digits=14, decimal_places=2)
+
+    def __init__(self, price, quantity, filter=None):
+        super().__init__(Sum(Cost(price, quantity), filter=filter))
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        # The sum is in the smallest units of Cost.as_sqlite(), an integer
+        (total,) = self.get_source_expressions()
+        cost = total.get_source_expressions()[0]
+        sql, params = compiler.compile(total)
+        return (
+            "(ROUND(%s / %d.0) / 100)" % (sql, 10 ** (cost.decimal_places() - 2)),
+            params,
+        )
+
+
+class ScaledTotalCost(Func):
+    """
+    Sum of price times quantity over grouped rows, exactly and unrounded, as a
+    whole number of units of 10 ** -(price places + quantity places). NULL
+    when there are no rows.
+    """
+
+    output_field = BigIntegerField()
+
+    def __init__(self, price, quantity, filter=None):
+        super().__init__(Sum(Cost(price, quantity), filter=filter))
+
+    def as_sql(self, compiler, connection, **extra_context):
+        (total,) = self.get_source_expressions()
+        cost = total.get_source_expressions()[0]
+        return super().as_sql(
+            compiler,
+            connection,
+            template="CAST(%%(expressions)s * %d AS BIGINT)"
+            % 10 ** cost.decimal_places(),
+            **extra_context,
+        )
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        # The sum is already in those units, see Cost.as_sqlite()
+        (total,) = self.get_source_expressions()
+        return compiler.compile(total)
@@ -0,0 +1,138 @@
+"""
+Streaming import and export of shopping list items.
+
+Shopping lists are resolved by title among the lists the load creates, and
+ingredients by name through a map built with a single query up front.
+Everything is written with ``bulk_create`` a chunk at a time. See
+``ingredient.loaders`` for the file formats.
+"""
+
+import uuid
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+
+from ingredient.loaders import chunked
+from ingredient.units import UnitConversionError, normalize_quantity
+
+SHOPPING_LIST_ITEM_COLUMNS = ["Shopping List", "Ingredient", "Amount", "Unit"]
+
+
+def create_owners(User, count):
+    """Create ``count`` users with unusable passwords and return their ids."""
+    users = [
+        User(username=str(uuid.uuid4()), password=make_password(None))
+        for _ in range(count)
+    ]
+    User.objects.bulk_create(users)
+    ids_by_username = dict(
+        User.objects.filter(username__in=[user.username for user in users]).values_list(
+            "username", "pk"
+        )
+    )
+    return [ids_by_username[user.username] for user in users]
+
+
+def load_shopping_list_items(
+    records, ShoppingList, ShoppingListItem, Ingredient, User, batch_size=500
+):
+    """
+    Create shopping list items from ``records``, a chunk at a time.
+
+    Each title gets a new list and owner the first time it comes up, as
+    titles are only unique per owner, and unknown ingredients are added to
+    the catalog as available, in the unit of their first record. Amounts
+    are converted to the ingredient's unit. The models are passed in so that
+    migrations can use the historical models.
+    Returns the number of items created.
+    """
+    # Only the lists created here, other owners may have the same titles
+    shopping_list_ids = {}
+    ingredient_fields = ["pk", "unit"]
+    if any(field.name == "density" for field in Ingredient._meta.fields):
+        ingredient_fields.append("density")
+    ingredients = {
+        name: values
+        for name, *values in Ingredient.objects.values_list("name", *ingredient_fields)
+    }
+    created = 0
+    for chunk in chunked(records, batch_size):
+        new_titles = list(
+            dict.fromkeys(
+                record["Shopping List"]
+                for record in chunk
+                if record["Shopping List"] not in shopping_list_ids
+            )
+        )
+        if new_titles:
+            user_ids = create_owners(User, len(new_titles))
+            ShoppingList.objects.bulk_create(
+                ShoppingList(title=title, user_id=user_id)
+                for title, user_id in zip(new_titles, user_ids)
+            )
+            shopping_list_ids.update(
+                ShoppingList.objects.filter(user_id__in=user_ids).values_list(
+                    "title", "pk"
+                )
+            )
+
+        new_units = {}
+        for record in chunk:
+            if record["Ingredient"] and record["Ingredient"] not in ingredients:
+                new_units.setdefault(record["Ingredient"], record.get("Unit") or "")
+        new_names = list(new_units)
+        if new_names:
+            Ingredient.objects.bulk_create(
+                Ingredient(name=name, unit=unit, available=True)
+                for name, unit in new_units.items()
+            )
+            ingredients.update(
+                (name, values)
+                for name, *values in Ingredient.objects.filter(
+                    name__in=new_names
+                ).values_list("name", *ingredient_fields)
+            )
+
+        items = []
+        for record in chunk:
+            ingredient_id, *unit_and_density = ingredients.get(
+                record["Ingredient"], [None, ""]
+            )
+            quantity = Decimal(str(record["Amount"]))
+            if ingredient_id is not None:
+                try:
+                    quantity = normalize_quantity(
+                        quantity, record.get("Unit") or None, *unit_and_density
+                    )
+                except UnitConversionError as error:
+                    raise UnitConversionError(
+                        "%s: %s" % (record["Ingredient"], error)
+                    ) from error
+            items.append(
+                ShoppingListItem(
+                    shopping_list_id=shopping_list_ids[record["Shopping List"]],
+                    ingredient_id=ingredient_id,
+                    quantity=quantity,
+                )
+            )
+        ShoppingListItem.objects.bulk_create(items)
+        created += len(chunk)
+    return created
+
+
+def dump_shopping_list_items(ShoppingListItem, batch_size=500):
+    """Yield a record per shopping list item, reading the table in chunks."""
+    rows = (
+        ShoppingListItem.objects.order_by("pk")
+        .values_list(
+            "shopping_list__title", "ingredient__name", "quantity", "ingredient__unit"
+        )
+        .iterator(chunk_size=batch_size)
+    )
+    for title, name, quantity, unit in rows:
+        yield {
+            "Shopping List": title,
+            "Ingredient": name,
+            "Amount": quantity,
+            "Unit": unit,
+        }
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from ingredient.loaders import FORMATS, guess_format, open_stream, write_records
+from shopping.loaders import SHOPPING_LIST_ITEM_COLUMNS, dump_shopping_list_items
+from shopping.models import ShoppingListItem
+
+
+class Command(BaseCommand):
+    help = "Export every shopping list item to an NDJSON, CSV or JSON file."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="File to write, or - for stdout.")
+        parser.add_argument("--format", choices=FORMATS)
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        fmt = options["format"] or guess_format(options["path"])
+        with open_stream(options["path"], "w") as stream:
+            count = write_records(
+                stream,
+                dump_shopping_list_items(ShoppingListItem, options["batch_size"]),
+                fmt,
+                SHOPPING_LIST_ITEM_COLUMNS,
+            )
+        self.stderr.write("Exported %d shopping list items." % count)
@@ -0,0 +1,36 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from ingredient.loaders import FORMATS, guess_format, open_stream, read_records
+from ingredient.models import Ingredient
+from ingredient.units import UnitConversionError
+from shopping.loaders import load_shopping_list_items
+from shopping.models import ShoppingList, ShoppingListItem
+
+
+class Command(BaseCommand):
+    help = "Create shopping list items from an NDJSON, CSV or JSON file."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="File to import, or - for stdin.")
+        parser.add_argument("--format", choices=FORMATS)
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        fmt = options["format"] or guess_format(options["path"])
+        try:
+            with open_stream(options["path"]) as stream, transaction.atomic():
+                created = load_shopping_list_items(
+                    read_records(stream, fmt),
+                    ShoppingList,
+                    ShoppingListItem,
+                    Ingredient,
+                    get_user_model(),
+                    options["batch_size"],
+                )
+        except UnitConversionError as error:
+            raise CommandError(error)
+        self.stdout.write(
+            self.style.SUCCESS("Created %d shopping list items." % created)
+        )
@@ -0,0 +1,103 @@
+import multiprocessing
+import os
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+
+from changefeed.models import Change
+from ingredient.loaders import (
+    FORMATS,
+    deferred_indexes,
+    guess_format,
+    load_ingredients,
+    read_shards,
+)
+from ingredient.models import Ingredient
+from ingredient.units import UnitConversionError
+from shopping.loaders import load_shopping_list_items
+from shopping.models import ShoppingList, ShoppingListItem
+
+SEED_INGREDIENTS = settings.BASE_DIR / "data" / "ingredients.json"
+
+SEED_SHOPPING_LISTS = settings.BASE_DIR / "data" / "shopping_lists.json"
+
+
+class Command(BaseCommand):
+    help = (
+        "Load ingredients and shopping list items from files of NDJSON, CSV or "
+        "JSON, by default the seed data, parsing the files in a process pool."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--ingredients",
+            nargs="*",
+            metavar="PATH",
+            help="Ingredient files to load, loaded before the shopping lists.",
+        )
+        parser.add_argument(
+            "--shopping-lists",
+            nargs="*",
+            metavar="PATH",
+            help="Shopping list item files to load.",
+        )
+        parser.add_argument("--format", choices=FORMATS)
+        parser.add_argument(
+            "--processes",
+            type=int,
+            default=os.cpu_count() or 1,
+            help="Number of processes parsing files, 1 to parse in this one.",
+        )
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        ingredient_paths = options["ingredients"]
+        shopping_list_paths = options["shopping_lists"]
+        if ingredient_paths is None and shopping_list_paths is None:
+            ingredient_paths = [SEED_INGREDIENTS]
+            shopping_list_paths = [SEED_SHOPPING_LISTS]
+        ingredient_shards = self.shards(ingredient_paths or [], options["format"])
+        shopping_list_shards = self.shards(shopping_list_paths or [], options["format"])
+        processes = min(
+            options["processes"], len(ingredient_shards) + len(shopping_list_shards)
+        )
+        pool = None
+        if processes > 1:
+            # Forked workers must not share the parent's connections
+            connections.close_all()
+            pool = multiprocessing.get_context("fork").Pool(processes)
+        try:
+            with transaction.atomic(), deferred_indexes(
+                [Ingredient, ShoppingList, ShoppingListItem, Change]
+            ) as indexes:
+                created, updated = load_ingredients(
+                    read_shards(ingredient_shards, pool, processes),
+                    Ingredient,
+                    options["batch_size"],
+                )
+                items = load_shopping_list_items(
+                    read_shards(shopping_list_shards, pool, processes),
+                    ShoppingList,
+                    ShoppingListItem,
+                    Ingredient,
+                    get_user_model(),
+                    options["batch_size"],
+                )
+        except UnitConversionError as error:
+            raise CommandError(error)
+        finally:
+            if pool is not None:
+                pool.terminate()
+        if indexes:
+            self.stdout.write("Created indexes after loading: %s" % ", ".join(indexes))
+        self.stdout.write(
+            self.style.SUCCESS(
+                "Created %d and updated %d ingredients, and created %d shopping "
+                "list items." % (created, updated, items)
+            )
+        )
+
+    def shards(self, paths, fmt):
+        return [(str(path), fmt or guess_format(str(path))) for path in paths]
@@ -0,0 +1,65 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import F
+
+from jobs.models import Job
+from shopping.models import ShoppingList
+from shopping.tasks import rebuild_total_costs
+
+
+class Command(BaseCommand):
+    help = "Recalculate the stored total cost of every shopping list."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Report lists whose stored total is stale without changing them.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of shopping lists to recalculate per transaction.",
+        )
+        parser.add_argument(
+            "--background",
+            action="store_true",
+            help="Queue the rebuild as a job for the run_jobs workers.",
+        )
+
+    def handle(self, *args, **options):
+        if options["check"]:
+            self.check_totals()
+        elif options["background"]:
+            job = Job.objects.enqueue(
+                "shopping.rebuild_total_costs", batch_size=options["batch_size"]
+            )
+            self.stdout.write(self.style.SUCCESS("Queued job %s." % job.pk))
+        else:
+            self.rebuild_totals(options["batch_size"])
+
+    def rebuild_totals(self, batch_size):
+        rebuilt = rebuild_total_costs(batch_size)
+        self.stdout.write(
+            self.style.SUCCESS("Rebuilt total cost of %d shopping lists." % rebuilt)
+        )
+
+    def check_totals(self):
+        stale = (
+            ShoppingList.objects.with_calculated_total_cost()
+            .exclude(total_cost=F("calculated_total_cost"))
+            .order_by("pk")
+            .values_list("pk", "title", "total_cost", "calculated_total_cost")
+        )
+        count = 0
+        for pk, title, total_cost, expected_total_cost in stale.iterator():
+            count += 1
+            self.stdout.write(
+                "Shopping list %d (%s): stored %s, expected %s"
+                % (pk, title, total_cost, expected_total_cost)
+            )
+        if count:
+            raise CommandError("%d shopping lists have a stale total cost." % count)
+        self.stdout.write(
+            self.style.SUCCESS("All shopping list totals are up to date.")
+        )
@@ -0,0 +1,23 @@
+import json
+
+from django.core.management.base import BaseCommand
+from rest_framework.utils.encoders import JSONEncoder
+
+from shopping.analytics import spend_report
+
+
+class Command(BaseCommand):
+    help = "Print spend by category, unit and user, and the most expensive lists."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--top",
+            type=int,
+            default=10,
+            help="Number of most expensive shopping lists to include.",
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            json.dumps(spend_report(options["top"]), indent=2, cls=JSONEncoder)
+        )
@@ -0,0 +1,56 @@
+# Generated by Django 3.2.7 on 2026-10-18 13:38
+
+from django.db import migrations, models
+from django.db.models import FloatField, Func, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+class RoundCost(Func):
+    """Round a monetary amount to two decimal places in the database."""
+
+    function = "ROUND"
+    template = "%(function)s(%(expressions)s, 2)"
+    output_field = FloatField()
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        # PostgreSQL only offers two-argument ROUND() for numeric
+        return self.as_sql(
+            compiler,
+            connection,
+            template="%(function)s(CAST(%(expressions)s AS numeric), 2)",
+            **extra_context,
+        )
+
+
+def calculate_total_costs(apps, schema_editor):
+    ShoppingList = apps.get_model("shopping", "ShoppingList")
+    ShoppingListItem = apps.get_model("shopping", "ShoppingListItem")
+    item_costs = (
+        ShoppingListItem.objects.filter(
+            shopping_list=OuterRef("pk"), ingredient__available=True
+        )
+        .values("shopping_list")
+        .annotate(total_cost=Sum(F("ingredient__cost_per_unit") * F("quantity")))
+        .values("total_cost")
+    )
+    ShoppingList.objects.update(
+        total_cost=Coalesce(RoundCost(Subquery(item_costs)), Value(0.0))
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shopping", "0002_seed"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="shoppinglist",
+            name="total_cost",
+            field=models.FloatField(
+                default=0, editable=False, verbose_name="Total Cost"
+            ),
+        ),
+        migrations.RunPython(calculate_total_costs, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 3.2.7 on 2026-10-18 13:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shopping", "0003_shoppinglist_total_cost"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="shoppinglistitem",
+            index=models.Index(
+                fields=["ingredient", "shopping_list"],
+                name="shopping_item_ingredient_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 3.2.7 on 2026-10-18 13:44
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def rename_duplicate_titles(apps, schema_editor):
+    # Number every list after the first one a user has with the same title
+    ShoppingList = apps.get_model("shopping", "ShoppingList")
+    duplicates = (
+        ShoppingList.objects.values("user_id", "title")
+        .annotate(count=Count("pk"))
+        .filter(count__gt=1)
+    )
+    for duplicate in duplicates.iterator():
+        shopping_lists = ShoppingList.objects.filter(
+            user_id=duplicate["user_id"], title=duplicate["title"]
+        ).order_by("pk")
+        titles = set(
+            ShoppingList.objects.filter(user_id=duplicate["user_id"]).values_list(
+                "title", flat=True
+            )
+        )
+        number = 1
+        for shopping_list in shopping_lists[1:]:
+            while True:
+                number += 1
+                suffix = " (%d)" % number
+                title = shopping_list.title[: 250 - len(suffix)] + suffix
+                if title not in titles:
+                    break
+            titles.add(title)
+            shopping_list.title = title
+            shopping_list.save(update_fields=["title"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shopping", "0004_shoppinglistitem_ingredient_index"),
+    ]
+
+    operations = [
+        migrations.RunPython(rename_duplicate_titles, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="shoppinglist",
+            constraint=models.UniqueConstraint(
+                fields=("user", "title"), name="shopping_list_unique_user_title"
+            ),
+        ),
+    ]
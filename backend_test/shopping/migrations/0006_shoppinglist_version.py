@@ -0,0 +1,18 @@
+# Generated by Django 3.2.7 on 2026-10-18 13:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shopping", "0005_shoppinglist_unique_user_title"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="shoppinglist",
+            name="version",
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+    ]
@@ -0,0 +1,104 @@
+# Generated by Django 3.2.7 on 2026-10-18 14:07
+
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import DecimalField, F, Func, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+class Cost(Func):
+    """Price times quantity of a row."""
+
+    arg_joiner = " * "
+    template = "(%(expressions)s)"
+    output_field = DecimalField()
+
+    def decimal_places(self):
+        price, quantity = self.get_source_expressions()
+        return price.output_field.decimal_places + quantity.output_field.decimal_places
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        # SQLite keeps decimals as floats, so multiply them as whole numbers
+        # of their smallest units instead, which is exact
+        scaled = []
+        params = []
+        for expression in self.get_source_expressions():
+            sql, expression_params = compiler.compile(expression)
+            scaled.append(
+                "CAST(ROUND(%s * %d) AS INTEGER)"
+                % (sql, 10**expression.output_field.decimal_places)
+            )
+            params.extend(expression_params)
+        return "(%s)" % " * ".join(scaled), params
+
+
+class TotalCost(Func):
+    """
+    Sum of price times quantity over grouped rows, exactly, rounded half away
+    from zero to the penny. NULL when there are no rows.
+    """
+
+    template = "ROUND(%(expressions)s, 2)"
+    output_field = DecimalField(max_digits=14, decimal_places=2)
+
+    def __init__(self, price, quantity):
+        super().__init__(Sum(Cost(price, quantity)))
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        # The sum is in the smallest units of Cost.as_sqlite(), an integer
+        (total,) = self.get_source_expressions()
+        cost = total.get_source_expressions()[0]
+        sql, params = compiler.compile(total)
+        return (
+            "(ROUND(%s / %d.0) / 100)" % (sql, 10 ** (cost.decimal_places() - 2)),
+            params,
+        )
+
+
+def calculate_exact_total_costs(apps, schema_editor):
+    # The columns were converted in place, recalculate the totals from the
+    # decimal prices and quantities instead of keeping the float sums
+    ShoppingList = apps.get_model("shopping", "ShoppingList")
+    ShoppingListItem = apps.get_model("shopping", "ShoppingListItem")
+    item_costs = (
+        ShoppingListItem.objects.filter(
+            shopping_list=OuterRef("pk"), ingredient__available=True
+        )
+        .values("shopping_list")
+        .annotate(total_cost=TotalCost("ingredient__cost_per_unit", "quantity"))
+        .values("total_cost")
+    )
+    ShoppingList.objects.update(
+        total_cost=Coalesce(Subquery(item_costs), Value(Decimal("0.00"))),
+        version=F("version") + 1,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ingredient", "0005_decimal_cost_per_unit"),
+        ("shopping", "0006_shoppinglist_version"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="shoppinglist",
+            name="total_cost",
+            field=models.DecimalField(
+                decimal_places=2,
+                default=Decimal("0.00"),
+                editable=False,
+                max_digits=14,
+                verbose_name="Total Cost",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="shoppinglistitem",
+            name="quantity",
+            field=models.DecimalField(
+                decimal_places=3, max_digits=12, verbose_name="Quantity"
+            ),
+        ),
+        migrations.RunPython(calculate_exact_total_costs, migrations.RunPython.noop),
+    ]
@@ -1,39 +1,221 @@
+from decimal import Decimal
+
 from django.contrib.auth import get_user_model
-from django.db import models
-from django.db.models import Sum, F
+from django.db import models, router, transaction
+from django.db.models import F, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
 from django.utils.translation import ugettext_lazy as _
 
-from ingredient.models import Ingredient
+from changefeed.models import SHOPPING_LIST, SHOPPING_LIST_ITEMS, Change
+from ingredient.catalog import catalog
+from ingredient.models import LOOKUP_BATCH_SIZE, Ingredient
 from rest_framework.exceptions import ValidationError
 
+from .cache import cache_key, invalidate
+from .functions import TotalCost
+
+
+def calculate_total_cost():
+    # Total cost of the available items on the outer shopping list
+    item_costs = (
+        ShoppingListItem.objects.filter(
+            shopping_list=OuterRef("pk"), ingredient__available=True
+        )
+        .values("shopping_list")
+        .annotate(total_cost=TotalCost("ingredient__cost_per_unit", "quantity"))
+        .values("total_cost")
+    )
+    return Coalesce(Subquery(item_costs), Value(Decimal("0.00")))
+
+
+class ShoppingListQuerySet(models.QuerySet):
+    def with_calculated_total_cost(self):
+        # Live totals for every list in one grouped query, rounded and
+        # filtered like calculate_total_cost()
+        item_costs = TotalCost(
+            "items__ingredient__cost_per_unit",
+            "items__quantity",
+            filter=Q(items__ingredient__available=True),
+        )
+        return self.annotate(
+            calculated_total_cost=Coalesce(item_costs, Value(Decimal("0.00")))
+        )
+
+    def update(self, **kwargs):
+        return self._update_and_log(kwargs, [SHOPPING_LIST])
+
+    update.alters_data = True
+
+    def refresh_total_cost(self, items_changed=False):
+        # Recalculate the stored total cost of every list in a single UPDATE,
+        # and log the change with that of their items when they changed too
+        kinds = (
+            [SHOPPING_LIST, SHOPPING_LIST_ITEMS] if items_changed else [SHOPPING_LIST]
+        )
+        return self._update_and_log({"total_cost": calculate_total_cost()}, kinds)
+
+    refresh_total_cost.alters_data = True
+
+    def _update_and_log(self, fields, kinds):
+        fields.setdefault("version", F("version") + 1)
+        self._for_write = True
+        with transaction.atomic(using=self.db, savepoint=False):
+            shopping_lists = list(self.values_list("pk", "user_id", "title"))
+            rows = super().update(**fields)
+            Change.objects.db_manager(self.db).record(
+                (kind, pk) for pk, user_id, title in shopping_lists for kind in kinds
+            )
+        invalidate(
+            [cache_key(user_id, title) for pk, user_id, title in shopping_lists],
+            using=self.db,
+        )
+        return rows
+
+    def bulk_create(self, objs, *args, **kwargs):
+        self._for_write = True
+        with transaction.atomic(using=self.db, savepoint=False):
+            objs = super().bulk_create(objs, *args, **kwargs)
+            shopping_list_ids = [obj.pk for obj in objs]
+            if None in shopping_list_ids:
+                # Only some databases return the ids of the rows they insert
+                shopping_list_ids = []
+                for start in range(0, len(objs), LOOKUP_BATCH_SIZE):
+                    batch = objs[start : start + LOOKUP_BATCH_SIZE]
+                    shopping_list_ids += (
+                        self.model.objects.using(self.db)
+                        .filter(
+                            user_id__in={obj.user_id for obj in batch},
+                            title__in={obj.title for obj in batch},
+                        )
+                        .values_list("pk", flat=True)
+                    )
+            Change.objects.db_manager(self.db).record(
+                (SHOPPING_LIST, pk) for pk in shopping_list_ids
+            )
+        return objs
+
+    bulk_create.alters_data = True
+
 
 class ShoppingList(models.Model):
     user = models.ForeignKey(get_user_model(), on_delete=models.CASCADE)
 
     title = models.CharField(_("Title"), max_length=250)
 
+    # Kept up to date whenever an item or one of its ingredients changes
+    total_cost = models.DecimalField(
+        _("Total Cost"),
+        max_digits=14,
+        decimal_places=2,
+        default=Decimal("0.00"),
+        editable=False,
+    )
+
+    # Bumped with every change to the list or its total, used for ETags
+    version = models.PositiveIntegerField(default=1, editable=False)
+
+    objects = ShoppingListQuerySet.as_manager()
+
     def __str__(self):
         return self.title
 
     class Meta:
         verbose_name = _("Shopping List")
         verbose_name_plural = _("Shopping Lists")
+        constraints = [
+            # Also the index behind retrieving a user's list by title
+            models.UniqueConstraint(
+                fields=["user", "title"], name="shopping_list_unique_user_title"
+            ),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if "user_id" in instance.__dict__ and "title" in instance.__dict__:
+            instance._loaded_cache_key = cache_key(instance.user_id, instance.title)
+        return instance
 
-    @property
-    def total_cost(self):
-        # Calculate the total cost of the shopping list
-        total_cost = round(
-            self.items.filter(ingredient__available=True)
-            .values("ingredient__cost_per_unit", "quantity")
-            .annotate(ingredient_cost=F("ingredient__cost_per_unit") * F("quantity"))
-            .aggregate(
-                total_cost=Sum(
-                    "ingredient_cost",
-                )
-            )["total_cost"],
-            2,
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        loaded_version = self.version
+        if not adding:
+            # A new ETag for the new title or owner, see shopping.cache
+            self.version = F("version") + 1
+            if kwargs.get("update_fields") is not None:
+                kwargs["update_fields"] = {*kwargs["update_fields"], "version"}
+        using = kwargs.get("using") or router.db_for_write(
+            self.__class__, instance=self
         )
-        return total_cost
+        try:
+            with transaction.atomic(using=using, savepoint=False):
+                super().save(*args, **kwargs)
+                if not adding:
+                    self.refresh_from_db(using=using, fields=["version"])
+                Change.objects.db_manager(using).record([(SHOPPING_LIST, self.pk)])
+        except BaseException:
+            self.version = loaded_version
+            raise
+        self._invalidate_cache()
+
+    def delete(self, *args, **kwargs):
+        # Logged by a post_delete receiver, which cascades reach too
+        deleted = super().delete(*args, **kwargs)
+        self._invalidate_cache()
+        return deleted
+
+    def _invalidate_cache(self):
+        keys = {cache_key(self.user_id, self.title)}
+        keys.add(getattr(self, "_loaded_cache_key", None))
+        keys.discard(None)
+        invalidate(keys, using=self._state.db)
+        self._loaded_cache_key = cache_key(self.user_id, self.title)
+
+    def refresh_total_cost(self):
+        ShoppingList.objects.filter(pk=self.pk).refresh_total_cost()
+        self.refresh_from_db(fields=["total_cost", "version"])
+
+
+class ShoppingListItemQuerySet(models.QuerySet):
+    def _refresh_total_cost(self, shopping_list_ids):
+        if shopping_list_ids:
+            ShoppingList.objects.using(self.db).filter(
+                pk__in=shopping_list_ids
+            ).refresh_total_cost(items_changed=True)
+
+    def bulk_create(self, objs, *args, **kwargs):
+        self._for_write = True
+        with transaction.atomic(using=self.db, savepoint=False):
+            objs = super().bulk_create(objs, *args, **kwargs)
+            self._refresh_total_cost({obj.shopping_list_id for obj in objs})
+        return objs
+
+    bulk_create.alters_data = True
+
+    def update(self, **kwargs):
+        # bulk_update() also goes through here, one call per batch
+        self._for_write = True
+        with transaction.atomic(using=self.db, savepoint=False):
+            shopping_list_ids = set(self.values_list("shopping_list_id", flat=True))
+            rows = super().update(**kwargs)
+            for field in ("shopping_list", "shopping_list_id"):
+                if field in kwargs:
+                    shopping_list = kwargs[field]
+                    shopping_list_ids.add(getattr(shopping_list, "pk", shopping_list))
+            self._refresh_total_cost(shopping_list_ids)
+        return rows
+
+    update.alters_data = True
+
+    def delete(self):
+        self._for_write = True
+        with transaction.atomic(using=self.db, savepoint=False):
+            shopping_list_ids = set(self.values_list("shopping_list_id", flat=True))
+            deleted = super().delete()
+            self._refresh_total_cost(shopping_list_ids)
+        return deleted
+
+    delete.alters_data = True
 
 
 class ShoppingListItem(models.Model):
@@ -49,7 +231,9 @@ class ShoppingListItem(models.Model):
         Ingredient, verbose_name=_("Ingredient"), on_delete=models.SET_NULL, null=True
     )
 
-    quantity = models.FloatField(_("Quantity"))
+    quantity = models.DecimalField(_("Quantity"), max_digits=12, decimal_places=3)
+
+    objects = ShoppingListItemQuerySet.as_manager()
 
     def __str__(self):
         return "{}: {}".format(self.shopping_list, self.ingredient)
@@ -57,8 +241,52 @@ class ShoppingListItem(models.Model):
     class Meta:
         verbose_name = _("Shopping List Item")
         verbose_name_plural = _("Shopping List Items")
+        indexes = [
+            # Finds the lists affected by an ingredient change without
+            # touching the item rows
+            models.Index(
+                fields=["ingredient", "shopping_list"],
+                name="shopping_item_ingredient_idx",
+            ),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_shopping_list_id = instance.__dict__.get("shopping_list_id")
+        return instance
 
     def save(self, *args, **kwargs):
-        if not self.ingredient.available:
-            raise ValidationError(_("Ingredient is unavailable"))
-        super().save(*args, **kwargs)
+        if self.ingredient_id is not None:
+            if ShoppingListItem.ingredient.is_cached(self):
+                ingredient = self.ingredient
+            else:
+                ingredient = catalog.get(pk=self.ingredient_id, using=self._state.db)
+            if not ingredient.available:
+                raise ValidationError(_("Ingredient is unavailable"))
+        using = kwargs.get("using") or router.db_for_write(
+            self.__class__, instance=self
+        )
+        with transaction.atomic(using=using, savepoint=False):
+            super().save(*args, **kwargs)
+            self._refresh_total_cost(using)
+
+    def delete(self, *args, **kwargs):
+        using = kwargs.get("using") or router.db_for_write(
+            self.__class__, instance=self
+        )
+        with transaction.atomic(using=using, savepoint=False):
+            deleted = super().delete(*args, **kwargs)
+            self._refresh_total_cost(using)
+        return deleted
+
+    def _refresh_total_cost(self, using):
+        shopping_list_ids = {
+            self.shopping_list_id,
+            getattr(self, "_loaded_shopping_list_id", None),
+        }
+        shopping_list_ids.discard(None)
+        ShoppingList.objects.using(using).filter(
+            pk__in=shopping_list_ids
+        ).refresh_total_cost(items_changed=True)
+        self._loaded_shopping_list_id = self.shopping_list_id
@@ -0,0 +1,10 @@
+from rest_framework.pagination import CursorPagination
+
+
+class ShoppingListCursorPagination(CursorPagination):
+    """Keyset pagination over the unique (user, title) index."""
+
+    ordering = "title"
+    page_size = 100
+    page_size_query_param = "page_size"
+    max_page_size = 1000
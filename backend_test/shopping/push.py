@@ -0,0 +1,160 @@
+"""
+Server-sent events of shopping list changes, served next to Django under
+ASGI (see backend_test.asgi).
+
+GET /events/shopping/<title>/ with a session cookie opens an event stream
+of the user's list with that title. A "shopping_list" event with the list as
+JSON, and its ETag as the event id, comes straight away and again whenever
+the list changes, and "deleted" ends the stream if the list goes. Browsers
+reconnect with the last id in Last-Event-ID, and only get the list again if
+it changed in the meantime.
+
+Django 3.2 reads streaming responses synchronously, which would hold a
+thread per open stream, so this is a plain ASGI app waiting on
+shopping.events. An open stream runs no queries until its list changes.
+"""
+
+import asyncio
+import io
+import json
+import re
+from importlib import import_module
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib import auth
+from django.core.handlers.asgi import ASGIRequest
+from django.db import close_old_connections
+from django.http import Http404
+from rest_framework.utils.encoders import JSONEncoder
+
+from . import cache, events
+from .async_views import FORBIDDEN, load_shopping_list
+
+EVENTS_PATH = re.compile(r"^/events/shopping/(?P<title>[^/]+)/$")
+
+# Seconds between comments that keep idle streams open through proxies
+KEEPALIVE_INTERVAL = 15
+
+
+def run_queries(function, *args):
+    # Outside Django's request handling, so close connections like it does
+    close_old_connections()
+    try:
+        return function(*args)
+    finally:
+        close_old_connections()
+
+
+def authenticate(request):
+    engine = import_module(settings.SESSION_ENGINE)
+    request.session = engine.SessionStore(
+        request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    )
+    request.user = auth.get_user(request)
+    return request.user.is_authenticated
+
+
+def load(request, title):
+    try:
+        return load_shopping_list(request, title)
+    except Http404:
+        return None
+
+
+def event(name, data, event_id=None):
+    lines = ["event: %s" % name]
+    if event_id is not None:
+        lines.append("id: %s" % event_id)
+    lines.append("data: %s" % json.dumps(data, cls=JSONEncoder))
+    return ("\n".join(lines) + "\n\n").encode()
+
+
+async def wait_for_disconnect(receive):
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return
+
+
+class ShoppingListEvents:
+    """Serves shopping list event streams, and passes other requests on."""
+
+    def __init__(self, application):
+        self.application = application
+
+    async def __call__(self, scope, receive, send):
+        match = EVENTS_PATH.match(scope["path"]) if scope["type"] == "http" else None
+        if match is None:
+            return await self.application(scope, receive, send)
+        if scope["method"] != "GET":
+            return await self.respond(
+                send, 405, {"detail": "Method not allowed."}, [(b"allow", b"GET")]
+            )
+        request = ASGIRequest(scope, io.BytesIO())
+        if not await sync_to_async(run_queries)(authenticate, request):
+            return await self.respond(send, 403, FORBIDDEN)
+        title = match["title"]
+        # Subscribe before reading the list, so no change is missed in between
+        channel = cache.cache_key(request.user.pk, title)
+        with events.get_broker().subscribe(channel) as changes:
+            cached = await sync_to_async(run_queries)(load, request, title)
+            if cached is None:
+                return await self.respond(send, 404, {"detail": "Not found."})
+            await send(
+                {
+                    "type": "http.response.start",
+                    "status": 200,
+                    "headers": [
+                        (b"content-type", b"text/event-stream"),
+                        (b"cache-control", b"no-cache"),
+                        # Stops nginx from buffering the stream
+                        (b"x-accel-buffering", b"no"),
+                    ],
+                }
+            )
+            await self.stream(request, title, cached, changes, receive, send)
+
+    async def stream(self, request, title, cached, changes, receive, send):
+        last_etag = request.headers.get("Last-Event-ID")
+        disconnected = asyncio.ensure_future(wait_for_disconnect(receive))
+        try:
+            while True:
+                if cached is None:
+                    await send(
+                        {"type": "http.response.body", "body": event("deleted", None)}
+                    )
+                    return
+                if cached["etag"] != last_etag:
+                    last_etag = cached["etag"]
+                    await self.send_body(
+                        send, event("shopping_list", cached["data"], last_etag)
+                    )
+                change = asyncio.ensure_future(changes.get())
+                done, pending = await asyncio.wait(
+                    {change, disconnected},
+                    timeout=KEEPALIVE_INTERVAL,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                change.cancel()
+                if disconnected in done:
+                    return
+                if change in done:
+                    cached = await sync_to_async(run_queries)(load, request, title)
+                else:
+                    await self.send_body(send, b": keepalive\n\n")
+        finally:
+            disconnected.cancel()
+
+    async def send_body(self, send, body):
+        await send({"type": "http.response.body", "body": body, "more_body": True})
+
+    async def respond(self, send, status, data, headers=()):
+        await send(
+            {
+                "type": "http.response.start",
+                "status": status,
+                "headers": [(b"content-type", b"application/json"), *headers],
+            }
+        )
+        await send({"type": "http.response.body", "body": json.dumps(data).encode()})
@@ -1,9 +1,82 @@
+from django.utils.translation import ugettext_lazy as _
 from rest_framework import serializers
 
-from .models import ShoppingList
+from backend_test.metrics import TimedSerializerMixin
+from ingredient.catalog import catalog
+from ingredient.units import UNIT_CHOICES, UnitConversionError, normalize_quantity
 
+from .models import ShoppingList, ShoppingListItem
 
-class ShoppingListSerializer(serializers.ModelSerializer):
+
+class ShoppingListSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = ShoppingList
         fields = ["user", "title", "total_cost"]
+        read_only_fields = ["total_cost"]
+
+
+class ShoppingListItemListSerializer(serializers.ListSerializer):
+    def to_internal_value(self, data):
+        items = super().to_internal_value(data)
+        # Resolve every ingredient in the batch with at most one IN query
+        ingredients_by_name = catalog.get_many(item["ingredient"] for item in items)
+        errors = []
+        for item in items:
+            ingredient = ingredients_by_name.get(item["ingredient"])
+            if ingredient is None:
+                errors.append({"ingredient": [_("Ingredient does not exist")]})
+            elif not ingredient.available:
+                errors.append({"ingredient": [_("Ingredient is unavailable")]})
+            else:
+                try:
+                    item["quantity"] = normalize_quantity(
+                        item["quantity"],
+                        item.pop("unit", None),
+                        ingredient.unit,
+                        ingredient.density,
+                    )
+                except UnitConversionError as error:
+                    errors.append({"unit": [str(error)]})
+                    continue
+                errors.append({})
+                item["ingredient"] = ingredient
+        if any(errors):
+            raise serializers.ValidationError(errors)
+        return items
+
+    def create(self, validated_data):
+        return ShoppingListItem.objects.bulk_create(
+            ShoppingListItem(**item) for item in validated_data
+        )
+
+
+class ShoppingListItemSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    # Written and shown as the ingredient name
+    ingredient = serializers.CharField(max_length=250)
+    # Quantities are stored in the ingredient's unit, converted from this one
+    unit = serializers.ChoiceField(
+        choices=UNIT_CHOICES, required=False, write_only=True
+    )
+
+    class Meta:
+        model = ShoppingListItem
+        fields = ["id", "ingredient", "quantity", "unit"]
+        list_serializer_class = ShoppingListItemListSerializer
+
+
+class ShoppingListItemQuantitySerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    quantity = serializers.DecimalField(max_digits=12, decimal_places=3)
+    unit = serializers.ChoiceField(choices=UNIT_CHOICES, required=False)
+
+
+class ShoppingListItemIdsSerializer(serializers.Serializer):
+    ids = serializers.ListField(child=serializers.IntegerField(), allow_empty=False)
+
+
+class SpendReportQuerySerializer(serializers.Serializer):
+    top = serializers.IntegerField(min_value=1, max_value=1000, default=10)
+
+
+class PriceSimulationQuerySerializer(serializers.Serializer):
+    top = serializers.IntegerField(min_value=1, max_value=1000, default=100)
@@ -0,0 +1,45 @@
+from django.db.models.signals import post_delete, pre_delete
+from django.dispatch import receiver
+
+from changefeed.models import SHOPPING_LIST, SHOPPING_LIST_ITEMS, Change
+from ingredient.models import Ingredient
+from ingredient.signals import ingredients_changed
+
+from . import fanout
+from .cache import cache_key, invalidate
+from .models import ShoppingList
+
+
+@receiver(ingredients_changed)
+def refresh_total_cost_for_ingredients(sender, ingredient_ids, using=None, **kwargs):
+    fanout.schedule(ingredient_ids, using=using)
+
+
+@receiver(pre_delete, sender=Ingredient)
+def remember_shopping_lists_for_ingredient(sender, instance, **kwargs):
+    # Items lose their ingredient once it is deleted, so find their lists first
+    instance._shopping_list_ids = list(
+        ShoppingList.objects.filter(items__ingredient=instance).values_list(
+            "pk", flat=True
+        )
+    )
+
+
+@receiver(post_delete, sender=Ingredient)
+def refresh_total_cost_for_deleted_ingredient(sender, instance, **kwargs):
+    shopping_list_ids = getattr(instance, "_shopping_list_ids", None)
+    if shopping_list_ids:
+        # Their items lost the ingredient too
+        ShoppingList.objects.filter(pk__in=shopping_list_ids).refresh_total_cost(
+            items_changed=True
+        )
+
+
+@receiver(post_delete, sender=ShoppingList)
+def log_deleted_shopping_list(sender, instance, using, **kwargs):
+    # Also sent for lists deleted by a queryset or along with their owner,
+    # which ShoppingList.delete() never sees
+    Change.objects.db_manager(using).record(
+        [(SHOPPING_LIST, instance.pk), (SHOPPING_LIST_ITEMS, instance.pk)]
+    )
+    invalidate([cache_key(instance.user_id, instance.title)], using=using)
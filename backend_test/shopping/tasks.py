@@ -0,0 +1,42 @@
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from jobs.registry import task
+
+from . import fanout
+from .models import ShoppingList
+
+
+def rebuild_total_costs(batch_size=1000, progress=None):
+    """Recalculate the total cost of every list, a batch per transaction."""
+    if progress is not None:
+        progress(0, ShoppingList.objects.count())
+    last_pk = 0
+    rebuilt = 0
+    while True:
+        pks = list(
+            ShoppingList.objects.filter(pk__gt=last_pk)
+            .order_by("pk")
+            .values_list("pk", flat=True)[:batch_size]
+        )
+        if not pks:
+            return rebuilt
+        with transaction.atomic():
+            rebuilt += ShoppingList.objects.filter(pk__in=pks).refresh_total_cost()
+        last_pk = pks[-1]
+        if progress is not None:
+            progress(rebuilt)
+
+
+@task("shopping.rebuild_total_costs")
+def rebuild_total_costs_job(job, batch_size=1000):
+    return {"rebuilt": rebuild_total_costs(batch_size, job.report_progress)}
+
+
+@task(fanout.RECALCULATE_TASK)
+def recalculate_total_costs_job(job, ingredient_ids, using=DEFAULT_DB_ALIAS):
+    """Recalculate the lists containing these ingredients, see fanout.schedule()."""
+    return {
+        "recalculated": fanout.recalculate(
+            ingredient_ids, using=using, progress=job.report_progress
+        )
+    }
@@ -1,5 +1,24 @@
-from django.test import TestCase
+import asyncio
+import json
+import os
+import threading
+import tempfile
+from decimal import Decimal
+from io import StringIO
 
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from ingredient.models import Ingredient
+from jobs.models import QUEUED, Job
+from jobs.worker import Worker
+
+from . import analytics, events, fanout
+from .models import ShoppingList, ShoppingListItem
 from .serializers import ShoppingListSerializer
 
 
@@ -27,3 +46,450 @@ class ShoppingListSerializerTest(TestCase):
             }
         )
         assert not serializer.is_valid()
+
+
+class ShoppingListTotalCostTest(TestCase):
+    def setUp(self):
+        self.onion = Ingredient.objects.create(
+            category="fresh", name="onion", unit="g", cost_per_unit=0.5, available=True
+        )
+        self.garlic = Ingredient.objects.create(
+            category="fresh",
+            name="garlic",
+            unit="g",
+            cost_per_unit=1.25,
+            available=True,
+        )
+        user = get_user_model().objects.create_user(username="testuser")
+        self.shopping_list = ShoppingList.objects.create(user=user, title="Soup")
+
+    def test_total_cost_follows_item_changes(self):
+        item = ShoppingListItem.objects.create(
+            shopping_list=self.shopping_list, ingredient=self.onion, quantity=2
+        )
+        self.shopping_list.refresh_from_db()
+        assert self.shopping_list.total_cost == 1
+
+        item.quantity = 3
+        item.save()
+        self.shopping_list.refresh_from_db()
+        assert self.shopping_list.total_cost == 1.5
+
+        item.delete()
+        self.shopping_list.refresh_from_db()
+        assert self.shopping_list.total_cost == 0
+
+    def test_total_cost_follows_bulk_item_changes(self):
+        ShoppingListItem.objects.bulk_create(
+            [
+                ShoppingListItem(
+                    shopping_list=self.shopping_list, ingredient=self.onion, quantity=2
+                ),
+                ShoppingListItem(
+                    shopping_list=self.shopping_list, ingredient=self.garlic, quantity=2
+                ),
+            ]
+        )
+        self.shopping_list.refresh_from_db()
+        assert self.shopping_list.total_cost == 3.5
+
+        ShoppingListItem.objects.filter(ingredient=self.garlic).update(quantity=4)
+        self.shopping_list.refresh_from_db()
+        assert self.shopping_list.total_cost == 6
+
+        ShoppingListItem.objects.filter(ingredient=self.onion).delete()
+        self.shopping_list.refresh_from_db()
+        assert self.shopping_list.total_cost == 5
+
+    def test_total_cost_follows_ingredient_changes(self):
+        ShoppingListItem.objects.create(
+            shopping_list=self.shopping_list, ingredient=self.onion, quantity=2
+        )
+        ShoppingListItem.objects.create(
+            shopping_list=self.shopping_list, ingredient=self.garlic, quantity=2
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.onion.cost_per_unit = 1
+            self.onion.save()
+        self.shopping_list.refresh_from_db()
+        assert self.shopping_list.total_cost == 4.5
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Ingredient.objects.filter(name="garlic").update(available=False)
+        self.shopping_list.refresh_from_db()
+        assert self.shopping_list.total_cost == 2
+
+        self.onion.delete()
+        self.shopping_list.refresh_from_db()
+        assert self.shopping_list.total_cost == 0
+
+    def test_total_cost_is_exact(self):
+        # Neither 1.005 nor 0.1 can be held exactly in a float
+        penny_and_a_half = Ingredient.objects.create(
+            category="fresh",
+            name="shallot",
+            unit="g",
+            cost_per_unit=Decimal("1.005"),
+            available=True,
+        )
+        ShoppingListItem.objects.create(
+            shopping_list=self.shopping_list, ingredient=penny_and_a_half, quantity=1
+        )
+        self.shopping_list.refresh_from_db()
+        assert self.shopping_list.total_cost == Decimal("1.01")
+
+        tenth = Ingredient.objects.create(
+            category="fresh",
+            name="chive",
+            unit="g",
+            cost_per_unit=Decimal("0.1"),
+            available=True,
+        )
+        ShoppingListItem.objects.bulk_create(
+            ShoppingListItem(
+                shopping_list=self.shopping_list, ingredient=tenth, quantity=1
+            )
+            for _ in range(11)
+        )
+        self.shopping_list.refresh_from_db()
+        assert self.shopping_list.total_cost == Decimal("2.11")
+        assert ShoppingList.objects.with_calculated_total_cost().get(
+            pk=self.shopping_list.pk
+        ).calculated_total_cost == Decimal("2.11")
+
+    def test_rebuild_total_costs_command(self):
+        ShoppingListItem.objects.create(
+            shopping_list=self.shopping_list, ingredient=self.onion, quantity=2
+        )
+        call_command("rebuild_total_costs", "--check", stdout=StringIO())
+
+        ShoppingList.objects.update(total_cost=99)
+        with self.assertRaises(CommandError):
+            call_command("rebuild_total_costs", "--check", stdout=StringIO())
+
+        call_command("rebuild_total_costs", stdout=StringIO())
+        self.shopping_list.refresh_from_db()
+        assert self.shopping_list.total_cost == 1
+        call_command("rebuild_total_costs", "--check", stdout=StringIO())
+
+    def test_rebuild_total_costs_command_in_background(self):
+        ShoppingListItem.objects.create(
+            shopping_list=self.shopping_list, ingredient=self.onion, quantity=2
+        )
+        ShoppingList.objects.update(total_cost=99)
+        call_command("rebuild_total_costs", "--background", stdout=StringIO())
+        job = Job.objects.get(name="shopping.rebuild_total_costs")
+        assert job.status == QUEUED
+        assert Worker("test").run_next()
+        job.refresh_from_db()
+        rebuilt = ShoppingList.objects.count()
+        assert job.result == {"rebuilt": rebuilt}
+        assert (job.progress, job.total) == (rebuilt, rebuilt)
+        call_command("rebuild_total_costs", "--check", stdout=StringIO())
+
+    def test_calculates_total_costs_in_one_query(self):
+        user = self.shopping_list.user
+        stew = ShoppingList.objects.create(user=user, title="Stew")
+        ShoppingList.objects.create(user=user, title="Empty")
+        ShoppingListItem.objects.create(
+            shopping_list=self.shopping_list, ingredient=self.onion, quantity=3
+        )
+        ShoppingListItem.objects.create(
+            shopping_list=stew, ingredient=self.garlic, quantity=1.333
+        )
+        ShoppingListItem.objects.create(
+            shopping_list=stew, ingredient=self.onion, quantity=1
+        )
+        Ingredient.objects.filter(pk=self.onion.pk).update(cost_per_unit=0.25)
+        Ingredient.objects.filter(pk=self.garlic.pk).update(available=False)
+        with self.assertNumQueries(1):
+            totals = dict(
+                ShoppingList.objects.filter(user=user)
+                .with_calculated_total_cost()
+                .values_list("title", "calculated_total_cost")
+            )
+        assert totals == {"Soup": 0.75, "Stew": 0.25, "Empty": 0}
+        call_command("rebuild_total_costs", stdout=StringIO())
+        assert (
+            dict(
+                ShoppingList.objects.filter(user=user).values_list(
+                    "title", "total_cost"
+                )
+            )
+            == totals
+        )
+
+
+class ShoppingListAdminTest(TestCase):
+    def test_changelist_queries_do_not_grow_with_lists(self):
+        admin = get_user_model().objects.create_superuser(
+            username="admin", password="12345"
+        )
+        self.client.force_login(admin)
+        for i in range(10):
+            user = get_user_model().objects.create_user(username="user %d" % i)
+            ShoppingList.objects.create(user=user, title="List %d" % i)
+        with self.assertNumQueries(5):
+            response = self.client.get("/admin/shopping/shoppinglist/")
+        assert response.status_code == 200
+
+
+class SpendReportTest(TestCase):
+    def setUp(self):
+        ShoppingList.objects.all().delete()
+        onion = Ingredient.objects.create(
+            category="fresh", name="onion", unit="g", cost_per_unit=0.5, available=True
+        )
+        olive_oil = Ingredient.objects.create(
+            category="staple",
+            name="olive oil",
+            unit="ml",
+            cost_per_unit=2,
+            available=True,
+        )
+        saffron = Ingredient.objects.create(
+            category="staple", name="saffron", unit="g", cost_per_unit=9, available=True
+        )
+        alice = get_user_model().objects.create_user(username="alice")
+        bob = get_user_model().objects.create_user(username="bob")
+        soup = ShoppingList.objects.create(user=alice, title="Soup")
+        paella = ShoppingList.objects.create(user=bob, title="Paella")
+        ShoppingListItem.objects.bulk_create(
+            [
+                ShoppingListItem(shopping_list=soup, ingredient=onion, quantity=4),
+                ShoppingListItem(shopping_list=paella, ingredient=onion, quantity=1),
+                ShoppingListItem(
+                    shopping_list=paella, ingredient=olive_oil, quantity=1.5
+                ),
+                ShoppingListItem(shopping_list=paella, ingredient=saffron, quantity=1),
+            ]
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            saffron.available = False
+            saffron.save()
+
+    def test_groups_spend_on_available_items(self):
+        assert analytics.spend_by("category") == [
+            {"category": "staple", "items": 1, "spend": 3},
+            {"category": "fresh", "items": 2, "spend": 2.5},
+        ]
+        assert analytics.spend_by("unit") == [
+            {"unit": "ml", "items": 1, "spend": 3},
+            {"unit": "g", "items": 2, "spend": 2.5},
+        ]
+        assert analytics.spend_by("user") == [
+            {"user": "bob", "items": 2, "spend": 3.5},
+            {"user": "alice", "items": 1, "spend": 2},
+        ]
+        assert analytics.most_expensive_lists(1) == [
+            {"user": "bob", "title": "Paella", "total_cost": 3.5}
+        ]
+
+    def test_spend_report_command(self):
+        stdout = StringIO()
+        call_command("spend_report", "--top", "5", stdout=stdout)
+        report = json.loads(stdout.getvalue())
+        assert report["lists"] == 2
+        assert report["spend"] == 5.5
+        assert [row["title"] for row in report["most_expensive_lists"]] == [
+            "Paella",
+            "Soup",
+        ]
+
+    def test_simulates_prices_without_saving_them(self):
+        statuses, simulation = analytics.simulate_prices(
+            {"onion": 1, "olive oil": 2, "saffron": 1, "truffle": 5}
+        )
+        assert statuses == {
+            "onion": "changed",
+            "olive oil": "unchanged",
+            "saffron": "unavailable",
+            "truffle": "not_found",
+        }
+        assert simulation == {
+            "lists": 2,
+            "total_cost": 5.5,
+            "simulated_total_cost": 8,
+            "delta": 2.5,
+            "shopping_lists": [
+                {
+                    "user": "alice",
+                    "title": "Soup",
+                    "total_cost": 2,
+                    "simulated_total_cost": 4,
+                    "delta": 2,
+                },
+                {
+                    "user": "bob",
+                    "title": "Paella",
+                    "total_cost": 3.5,
+                    "simulated_total_cost": 4,
+                    "delta": 0.5,
+                },
+            ],
+        }
+        assert Ingredient.objects.get(name="onion").cost_per_unit == 0.5
+        assert ShoppingList.objects.get(title="Soup").total_cost == 2
+
+    def test_simulates_totals_rounded_once(self):
+        # 1.004 stored as 1.00, plus 0.001 is 1.005, which rounds up
+        leek = Ingredient.objects.create(
+            category="fresh",
+            name="leek",
+            unit="g",
+            cost_per_unit=Decimal("1.004"),
+            available=True,
+        )
+        soup = ShoppingList.objects.get(title="Soup")
+        soup.items.all().delete()
+        ShoppingListItem.objects.create(shopping_list=soup, ingredient=leek, quantity=1)
+        assert ShoppingList.objects.get(title="Soup").total_cost == Decimal("1.00")
+        statuses, simulation = analytics.simulate_prices({"leek": Decimal("1.005")})
+        [shopping_list] = simulation["shopping_lists"]
+        assert shopping_list["simulated_total_cost"] == Decimal("1.01")
+
+
+class FanOutTest(TestCase):
+    def setUp(self):
+        self.onion = Ingredient.objects.create(
+            category="fresh", name="onion", unit="g", cost_per_unit=0.5, available=True
+        )
+        user = get_user_model().objects.create_user(username="testuser")
+        ShoppingList.objects.bulk_create(
+            [ShoppingList(user=user, title="List %d" % i) for i in range(5)]
+        )
+        self.shopping_lists = ShoppingList.objects.filter(user=user)
+        ShoppingListItem.objects.bulk_create(
+            [
+                ShoppingListItem(
+                    shopping_list=shopping_list, ingredient=self.onion, quantity=2
+                )
+                for shopping_list in self.shopping_lists
+            ]
+        )
+
+    def test_merges_changes_within_a_transaction(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            for price in (1, 2, 3):
+                self.onion.cost_per_unit = price
+                self.onion.save()
+        recalculations = [
+            callback
+            for callback in callbacks
+            if isinstance(callback, fanout.PendingRecalculation)
+        ]
+        assert len(recalculations) == 1
+        assert recalculations[0].ingredient_ids == {self.onion.pk}
+        recalculations[0]()
+        assert set(self.shopping_lists.values_list("total_cost", flat=True)) == {6}
+
+    @override_settings(SHOPPING_FANOUT_IN_BACKGROUND=True, SHOPPING_FANOUT_DELAY=0)
+    def test_recalculates_in_background(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.onion.cost_per_unit = 1
+            self.onion.save()
+        assert set(self.shopping_lists.values_list("total_cost", flat=True)) == {1}
+        job = Job.objects.get()
+        assert job.arguments == {"ingredient_ids": [self.onion.pk], "using": "default"}
+        assert Worker("test").run_next()
+        job.refresh_from_db()
+        assert job.result == {"recalculated": 5}
+        assert set(self.shopping_lists.values_list("total_cost", flat=True)) == {2}
+
+    @override_settings(SHOPPING_FANOUT_IN_BACKGROUND=True)
+    def test_merges_changes_across_transactions(self):
+        for price in (1, 2):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.onion.cost_per_unit = price
+                self.onion.save()
+        job = Job.objects.get()
+        assert job.run_after > timezone.now()
+        Job.objects.update(run_after=timezone.now())
+        assert Worker("test").run_next()
+        assert not Worker("test").run_next()
+        assert set(self.shopping_lists.values_list("total_cost", flat=True)) == {4}
+
+    def test_recalculates_in_batches(self):
+        Ingredient.objects.filter(pk=self.onion.pk).update(cost_per_unit=1)
+        recalculated = fanout.recalculate([self.onion.pk], batch_size=2)
+        assert recalculated == 5
+        assert set(self.shopping_lists.values_list("total_cost", flat=True)) == {2}
+
+
+class LoadersTest(TestCase):
+    def test_import_creates_lists_owners_and_ingredients(self):
+        Ingredient.objects.create(
+            category="staple",
+            name="salt",
+            unit="g",
+            cost_per_unit=Decimal("0.001"),
+            available=True,
+        )
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "items.ndjson")
+            with open(path, "w") as output:
+                output.write(
+                    '{"Shopping List": "Picnic", "Ingredient": "salt", "Amount": 10}\n'
+                    '{"Shopping List": "Picnic", "Ingredient": "unicorn", "Amount": 1}\n'
+                )
+            call_command("import_shopping_lists", path, stdout=StringIO())
+        shopping_list = ShoppingList.objects.get(title="Picnic")
+        assert not shopping_list.user.has_usable_password()
+        assert sorted(
+            shopping_list.items.values_list("ingredient__name", "quantity")
+        ) == [("salt", 10), ("unicorn", 1)]
+        assert Ingredient.objects.get(name="unicorn").available
+        assert shopping_list.total_cost == Decimal("0.01")
+
+    def test_import_keeps_other_owners_lists(self):
+        other = get_user_model().objects.create_user(username="other")
+        ShoppingList.objects.create(user=other, title="Picnic")
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "items.ndjson")
+            with open(path, "w") as output:
+                output.write(
+                    '{"Shopping List": "Picnic", "Ingredient": "", "Amount": 1}\n'
+                    '{"Shopping List": "Picnic", "Ingredient": "", "Amount": 2}\n'
+                )
+            call_command(
+                "import_shopping_lists", path, "--batch-size", "1", stdout=StringIO()
+            )
+        assert not ShoppingListItem.objects.filter(shopping_list__user=other)
+        imported = ShoppingList.objects.exclude(user=other).get(title="Picnic")
+        assert sorted(imported.items.values_list("quantity", flat=True)) == [1, 2]
+
+    def test_load_data_command(self):
+        stdout = StringIO()
+        call_command("load_data", "--processes", "2", stdout=stdout)
+        assert "Created 174 and updated 0 ingredients" in stdout.getvalue()
+        assert ShoppingListItem.objects.count() == 190
+        assert not ShoppingList.objects.filter(user__password__startswith="pbkdf2")
+        constraints = connection.introspection.get_constraints(
+            connection.cursor(), ShoppingListItem._meta.db_table
+        )
+        assert "shopping_item_ingredient_idx" in constraints
+        call_command("rebuild_total_costs", "--check", stdout=StringIO())
+
+
+class LocalBrokerTest(SimpleTestCase):
+    def test_delivers_messages_from_other_threads(self):
+        broker = events.LocalBroker()
+
+        async def subscribe():
+            with broker.subscribe("soup") as soup:
+                with broker.subscribe("stew") as stew:
+                    publisher = threading.Thread(
+                        target=broker.publish, args=("soup", "changed")
+                    )
+                    publisher.start()
+                    assert await soup.get(timeout=5) == "changed"
+                    publisher.join()
+                    with self.assertRaises(asyncio.TimeoutError):
+                        await stew.get(timeout=0.01)
+                    for _ in range(events.QUEUE_SIZE + 1):
+                        broker.publish("stew", "changed")
+                    await asyncio.sleep(0)
+                    assert stew._queue.qsize() == events.QUEUE_SIZE
+            assert not broker._subscriptions
+
+        asyncio.run(subscribe())
@@ -1,11 +1,15 @@
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
-from . import views
+from . import async_views, views
 
 router = DefaultRouter()
 router.register(r"shopping", views.ShoppingViewSet)
 
 urlpatterns = [
     path("", include(router.urls)),
+    path("async/shopping/<str:title>/", async_views.shopping_list_detail),
+    path("async/shopping/<str:title>/changes/", async_views.shopping_list_changes),
+    path("reports/spend/", views.SpendReportView.as_view()),
+    path("reports/price-simulation/", views.PriceSimulationView.as_view()),
 ]
@@ -1,16 +1,212 @@
-from rest_framework import mixins, viewsets, permissions
+from django.db import transaction
+from django.utils.translation import ugettext_lazy as _
+from rest_framework import mixins, viewsets, permissions, status
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import JSONParser
+from rest_framework.response import Response
+from rest_framework.views import APIView
 
-from .models import ShoppingList
+from backend_test.routers import use_replica
+from ingredient.parsers import CSVParser
+from ingredient.serializers import read_price_sheet
+from ingredient.units import UnitConversionError, normalize_quantity
+
+from . import cache
+from .analytics import simulate_prices, spend_report
+from .models import ShoppingList, ShoppingListItem
+from .pagination import ShoppingListCursorPagination
 from .permissions import IsOwner
-from .serializers import ShoppingListSerializer
+from .serializers import (
+    PriceSimulationQuerySerializer,
+    ShoppingListItemIdsSerializer,
+    ShoppingListItemQuantitySerializer,
+    ShoppingListItemSerializer,
+    ShoppingListSerializer,
+    SpendReportQuerySerializer,
+)
 
 
 class ShoppingViewSet(
+    mixins.ListModelMixin,
     mixins.RetrieveModelMixin,
     viewsets.GenericViewSet,
 ):
+    """
+    Shopping lists belonging to the authenticated user.
+
+    list:
+    Page through the user's lists ordered by title. Follow the "next" link to
+    get the following page, and size pages with ?page_size= (max 1000).
+
+    retrieve:
+    Return the list with the given title and its total cost. Lists owned by
+    other users are not found. Responses carry an ETag; send it back in
+    If-None-Match to get a 304 Not Modified while the list is unchanged.
+    """
+
     queryset = ShoppingList.objects.all()
     serializer_class = ShoppingListSerializer
     lookup_field = "title"
     permission_classes = [permissions.IsAuthenticated, IsOwner]
-    pass
+    pagination_class = ShoppingListCursorPagination
+    # Most queries each action may run, see backend_test.metrics. Session
+    # authentication accounts for two of them, and writes include logging
+    # them to the change feed.
+    query_budgets = {
+        "list": 3,
+        "retrieve": 3,
+        "items": 4,
+        "add_items": 10,
+        "update_items": 13,
+        "remove_items": 9,
+    }
+
+    def get_queryset(self):
+        # Served by the unique (user, title) index
+        return super().get_queryset().filter(user=self.request.user)
+
+    def list(self, request, *args, **kwargs):
+        with use_replica():
+            return super().list(request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        # The key includes the requesting user, so a hit is always their list
+        cached = cache.get_or_set(
+            request.user.pk, kwargs[self.lookup_field], self.load_cached_object
+        )
+        headers = {"ETag": cached["etag"]}
+        if cache.is_not_modified(request, cached["etag"]):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        return Response(cached["data"], headers=headers)
+
+    def load_cached_object(self):
+        instance = self.get_object()
+        return {
+            "data": self.get_serializer(instance).data,
+            "etag": cache.etag(instance),
+        }
+
+    def items_response(self, shopping_list, status_code=status.HTTP_200_OK):
+        items = shopping_list.items.select_related("ingredient").order_by("pk")
+        serializer = ShoppingListItemSerializer(items, many=True)
+        return Response(serializer.data, status=status_code)
+
+    @action(detail=True, methods=["get"])
+    def items(self, request, **kwargs):
+        """Return the items on the list."""
+        with use_replica():
+            return self.items_response(self.get_object())
+
+    @items.mapping.post
+    def add_items(self, request, **kwargs):
+        """
+        Add a batch of items, given as a list of {"ingredient": <name>,
+        "quantity": <number>}. Either every item is added or none are.
+        Responds with all the items on the list.
+
+        Quantities are in the ingredient's unit unless they give another
+        "unit", such as "kg" or "cup", and are stored converted to it. Mass
+        and volume convert through the ingredient's density.
+        """
+        shopping_list = self.get_object()
+        serializer = ShoppingListItemSerializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+        with transaction.atomic():
+            serializer.save(shopping_list=shopping_list)
+        return self.items_response(shopping_list, status.HTTP_201_CREATED)
+
+    @items.mapping.patch
+    def update_items(self, request, **kwargs):
+        """
+        Change the quantity of a batch of items, given as a list of
+        {"id": <item id>, "quantity": <number>}. Responds with all the items
+        on the list. Quantities may give a "unit", see add_items.
+        """
+        shopping_list = self.get_object()
+        serializer = ShoppingListItemQuantitySerializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+        rows = {row["id"]: row for row in serializer.validated_data}
+        items = list(
+            shopping_list.items.filter(pk__in=rows)
+            .select_related("ingredient")
+            .only("pk", "ingredient__unit", "ingredient__density")
+        )
+        missing = set(rows) - {item.pk for item in items}
+        if missing:
+            raise ValidationError(
+                {"id": [_("Items not on this list: %s") % sorted(missing)]}
+            )
+        errors = {}
+        for item in items:
+            row = rows[item.pk]
+            try:
+                item.quantity = normalize_quantity(
+                    row["quantity"],
+                    row.get("unit"),
+                    item.ingredient.unit,
+                    item.ingredient.density,
+                )
+            except UnitConversionError as error:
+                errors[item.pk] = str(error)
+        if errors:
+            raise ValidationError(
+                {"unit": ["%s: %s" % (pk, errors[pk]) for pk in sorted(errors)]}
+            )
+        with transaction.atomic():
+            ShoppingListItem.objects.bulk_update(items, ["quantity"])
+        return self.items_response(shopping_list)
+
+    @items.mapping.delete
+    def remove_items(self, request, **kwargs):
+        """Remove a batch of items, given as {"ids": [<item id>, ...]}."""
+        shopping_list = self.get_object()
+        serializer = ShoppingListItemIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        with transaction.atomic():
+            shopping_list.items.filter(pk__in=serializer.validated_data["ids"]).delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class SpendReportView(APIView):
+    """
+    Spend on available ingredients across every user's lists, grouped by
+    category, unit and user, with the ?top= (default 10) most expensive
+    lists. Staff only.
+    """
+
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        query_params = SpendReportQuerySerializer(data=request.query_params)
+        query_params.is_valid(raise_exception=True)
+        with use_replica():
+            return Response(spend_report(query_params.validated_data["top"]))
+
+
+class PriceSimulationView(APIView):
+    """
+    Show how a price sheet would change list totals without applying it.
+
+    The body is a price sheet in any format accepted by
+    /ingredient/bulk_cost_per_unit/. Responds with the number of lists
+    affected, their current and simulated totals, the ?top= (default 100)
+    lists that change the most, and a status per row of "changed",
+    "unchanged", "unavailable", "not_found" or "invalid". Staff only.
+    """
+
+    permission_classes = [permissions.IsAdminUser]
+    parser_classes = [JSONParser, CSVParser]
+
+    def post(self, request):
+        query_params = PriceSimulationQuerySerializer(data=request.query_params)
+        query_params.is_valid(raise_exception=True)
+        results, prices = read_price_sheet(request.data)
+        statuses, simulation = simulate_prices(
+            prices, query_params.validated_data["top"]
+        )
+        for result in results:
+            if "status" not in result:
+                result["cost_per_unit"] = prices[result["name"]]
+                result["status"] = statuses[result["name"]]
+        return Response({**simulation, "results": results})